@@ -0,0 +1,73 @@
+import json
+import logging
+import os
+from typing import Dict, Any, Optional
+from blob_store import externalize_figures, get_default_blob_store
+from page_store import get_default_page_store, should_page, split_html_pages
+from table_extractor import extract_assessment_tables
+
+logger = logging.getLogger("upthon.analyze")
+
+# 디버그 로그에 남길 API 응답의 최대 길이 (문자)
+DEBUG_LOG_MAX_CHARS = int(os.getenv("DEBUG_LOG_MAX_CHARS", 2000))
+
+FIGURE_URL_PREFIX = "/api/figures"
+
+
+def log_api_result(filename: str, api_result: Dict[str, Any]) -> None:
+    """
+    문서 분석 결과를 로그로 남깁니다.
+    요약은 INFO, 응답 본문은 DEBUG 레벨에서 DEBUG_LOG_MAX_CHARS 길이까지만 기록합니다.
+    """
+    if not api_result.get('success'):
+        logger.warning("📄 %s: API 오류 %s - %s", filename, api_result.get('error'), str(api_result.get('message', ''))[:DEBUG_LOG_MAX_CHARS])
+        return
+
+    data = api_result.get('data') or {}
+    html = (data.get('content') or {}).get('html', '')
+    logger.info("📄 %s: cached=%s chunks=%s pages=%s elements=%d html=%d자",
+                filename, api_result.get('cached', False), api_result.get('chunks', 1), (data.get('usage') or {}).get('pages'),
+                len(data.get('elements') or []), len(html))
+
+    if logger.isEnabledFor(logging.DEBUG):
+        dump = json.dumps(api_result, ensure_ascii=False)
+        if len(dump) > DEBUG_LOG_MAX_CHARS:
+            dump = f"{dump[:DEBUG_LOG_MAX_CHARS]}... (총 {len(dump)}자 중 일부)"
+        logger.debug("🔍 Document Digitization API 응답: %s", dump)
+
+
+def build_analysis_response(api_result: Dict[str, Any], original_filename: str, file_info: Dict[str, Any], include_full: bool = False,
+                            paged: Optional[bool] = None) -> Dict[str, Any]:
+    """
+    /api/analyze-document 응답 본문을 만듭니다.
+    base64 그림은 BlobStore에 한 번만 저장하고 URL로 바꾸며, 전체 API 응답은 요청한 경우에만 포함합니다.
+    paged: True면 HTML 대신 페이지 목록(pages)만 넣고 조각은 /api/documents/<doc_id>/pages로 나눠 받게 합니다.
+           None이면 페이지 수나 HTML 크기가 기준(PAGED_MIN_PAGES, PAGED_MIN_BYTES)을 넘을 때만 나눕니다.
+    """
+    data = externalize_figures(api_result.get('data') or {}, get_default_blob_store(), FIGURE_URL_PREFIX)
+
+    # HTML 콘텐츠 추출
+    html_content = (data.get('content') or {}).get('html', '')
+
+    response = {
+        'success': True,
+        'html_content': html_content,
+        'tables': extract_assessment_tables(html_content),  # 평가요소/평가기준 표 구조
+        'figures': [
+            {'id': element.get('id'), 'page': element.get('page'), 'url': element['figure_url']}
+            for element in data.get('elements') or [] if element.get('figure_url')
+        ],
+        'file_info': file_info,
+        'original_filename': original_filename,
+        'cached': api_result.get('cached', False),
+        'local': api_result.get('local', False)  # 원격 API 없이 직접 읽은 HWP 문서
+    }
+
+    # 큰 문서는 페이지 목록만 먼저 보내고, 보이는 페이지의 HTML만 따로 받게 함 (페이지를 나눌 수 없으면 전체 HTML)
+    fragments = split_html_pages(data) if (should_page(data) if paged is None else paged) else None
+    if fragments:
+        response['html_content'] = ''
+        response['pages'] = get_default_page_store().put(fragments)
+    if include_full:
+        response['full_api_response'] = dict(api_result, data=data)
+    return response
@@ -1,17 +1,43 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Request, request, g, jsonify, render_template, Response, stream_with_context, send_file, abort
 from flask_cors import CORS
+import io
+import functools
 import os
-import tempfile
+import logging
+import time
 from dotenv import load_dotenv
 from document_analyzer import DocumentAnalyzer
 from text_improver import TextImprover
+from batch_improver import BatchImprover
+from analysis_response import build_analysis_response, log_api_result
+from blob_store import get_default_blob_store, CONTENT_TYPES
+from page_store import parse_paged_flag, read_page_range, get_default_page_store
+import http_encoding
+from scheduler import set_schedule, get_scheduler
+from parse_cache import get_default_cache
+from completion_cache import get_default_text_cache
+from job_queue import get_default_job_queue
+from prefetch import get_default_prefetcher
+from resilience import upstream_stats
+from generation_tiers import policy_summary
+import metrics
+from sse import sse_event, SSE_HEADERS
 
 # .env 파일 로드
 load_dotenv()
 
+class InMemoryUploadRequest(Request):
+    """업로드 파일을 디스크 임시 파일 대신 메모리(BytesIO)에 받는 요청 클래스 (MAX_CONTENT_LENGTH로 크기 제한)"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return io.BytesIO()
+
 app = Flask(__name__)
+app.request_class = InMemoryUploadRequest
 CORS(app)
 
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+
 # 업로드 폴더 설정
 UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER):
@@ -20,86 +46,200 @@ if not os.path.exists(UPLOAD_FOLDER):
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB 제한
 
+metrics.install_default_collectors()
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+@app.before_request
+def assign_schedule():
+    """
+    이 요청에서 보내는 업스트림 요청을 세션별 대기열에 넣습니다.
+    화면에서 누른 요청은 interactive, 프로그램 클라이언트는 X-Priority: bulk 로 낮출 수 있음
+    (일괄 생성/미리 생성은 각자 bulk/prefetch 대기열 사용)
+    """
+    set_schedule(request.headers.get('X-Priority', 'interactive'), request.headers.get('X-Session-Id') or request.remote_addr)
+
+@app.after_request
+def encode_response(response):
+    """
+    JSON 응답의 표현을 요청에 맞춥니다. (record_request_metrics 다음에 실행되므로 지표는 압축 전 크기)
+    - Accept가 MessagePack을 원하면 MessagePack으로 인코딩 (msgpack 설치 시)
+    - 본문 해시로 강한 ETag를 붙이고, GET/HEAD 요청의 If-None-Match가 같으면 304
+      (조건부 응답은 작업 상태/페이지 조각 같은 GET 라우트에만 적용됨.
+       /api/analyze-document와 문장/평가기준 생성 같은 POST 응답은 ETag만 붙고 항상 본문을 보냄)
+    - COMPRESS_MIN_BYTES 이상이면 Accept-Encoding에 따라 zstd/br/gzip으로 조각마다 압축해 스트리밍
+    """
+    if response.is_streamed or response.mimetype != http_encoding.JSON_MIMETYPE or response.status_code < 200 or response.status_code >= 300:
+        return response
+    response.vary.add('Accept')
+    response.vary.add('Accept-Encoding')
+
+    mimetype = http_encoding.negotiate_mimetype(request.accept_mimetypes)
+    if mimetype != http_encoding.JSON_MIMETYPE:
+        response.set_data(http_encoding.pack_msgpack(response.get_json()))
+        response.mimetype = mimetype
+
+    body = response.get_data()
+    etag, _ = response.get_etag()
+    etag = etag or http_encoding.content_etag(body)
+    encoding = http_encoding.negotiate_encoding(request.accept_encodings) if len(body) >= http_encoding.COMPRESS_MIN_BYTES else None
+    response.set_etag(http_encoding.encoded_etag(etag, encoding))
+
+    if request.method in ('GET', 'HEAD') and any(http_encoding.etag_base(tag) == etag for tag in request.if_none_match.as_set()):
+        response.status_code = 304
+        response.set_data(b'')
+        del response.headers['Content-Type']
+        return response
+
+    if encoding:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        response.response = http_encoding.compress_chunks(
+            body, encoding, lambda size: metrics.COMPRESSED_BYTES.inc(route, encoding, amount=size))
+        response.headers['Content-Encoding'] = encoding
+        del response.headers['Content-Length']
+    return response
+
+@app.after_request
+def record_request_metrics(response):
+    """요청 처리 시간과 응답 크기를 기록합니다. (스트리밍 응답은 첫 응답까지의 시간만 기록)"""
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    started = g.get('request_started')
+    if started is not None:
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, route, request.method, response.status_code)
+    if not response.is_streamed:
+        metrics.RESPONSE_BYTES.inc(route, amount=response.calculate_content_length() or 0)
+    return response
+
 @app.route('/')
 def index():
     """메인 페이지"""
     return render_template('index.html')
 
+def get_uploaded_file():
+    """업로드된 문서 파일을 확인하고 (파일, None) 또는 (None, 오류 응답)을 반환합니다."""
+    # 파일이 업로드되었는지 확인
+    if 'file' not in request.files:
+        return None, (jsonify({'error': '파일이 업로드되지 않았습니다.'}), 400)
+    
+    file = request.files['file']
+    if file.filename == '':
+        return None, (jsonify({'error': '파일이 선택되지 않았습니다.'}), 400)
+    
+    # HWP 또는 PDF 파일인지 확인
+    allowed_extensions = ['.hwp', '.pdf']
+    file_extension = os.path.splitext(file.filename.lower())[1]
+    if file_extension not in allowed_extensions:
+        return None, (jsonify({'error': 'HWP 또는 PDF 파일만 업로드 가능합니다.'}), 400)
+    
+    return file, None
+
+def get_session_id() -> str:
+    """미리 생성 작업과 업스트림 요청 대기열을 묶는 브라우저 세션 ID (없으면 접속 주소)"""
+    return request.headers.get('X-Session-Id') or request.form.get('session_id') or request.remote_addr or 'anonymous'
+
 @app.route('/api/analyze-document', methods=['POST'])
 def analyze_document():
     """문서 분석 API - HTML만 반환"""
     try:
-        # 파일이 업로드되었는지 확인
-        if 'file' not in request.files:
-            return jsonify({'error': '파일이 업로드되지 않았습니다.'}), 400
-        
-        file = request.files['file']
-        if file.filename == '':
-            return jsonify({'error': '파일이 선택되지 않았습니다.'}), 400
+        # 단계별 시간: upload(요청 본문 수신/파싱) → parse(캐시 조회 + 원격 분석) → build(표 추출/그림 저장) → serialize(JSON 변환)
+        stage = functools.partial(metrics.STAGE_SECONDS.time, '/api/analyze-document')
+        with stage('upload'):
+            file, error_response = get_uploaded_file()
+        if error_response:
+            return error_response
         
-        # HWP 또는 PDF 파일인지 확인
-        allowed_extensions = ['.hwp', '.pdf']
-        file_extension = os.path.splitext(file.filename.lower())[1]
-        if file_extension not in allowed_extensions:
-            return jsonify({'error': 'HWP 또는 PDF 파일만 업로드 가능합니다.'}), 400
+        # 같은 세션에서 새 문서를 올리면 이전 문서의 미리 생성 작업은 취소
+        session_id = get_session_id()
+        get_default_prefetcher().cancel(session_id)
+
+        # 임시 파일 없이 메모리의 업로드 버퍼를 그대로 분석 API로 전송 (여러 페이지 PDF는 조각으로 나누어 병렬 분석)
+        analyzer = DocumentAnalyzer()
+        with stage('parse'):
+            api_result = analyzer.analyze_document_chunked(file.stream, file.filename)
         
-        # 임시 파일로 저장 (확장자에 맞게)
-        suffix = file_extension
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
-            file.save(temp_file.name)
-            temp_path = temp_file.name
+        # 요약만 로그로 남김 (전체 응답은 DEBUG 레벨에서 길이 제한)
+        log_api_result(file.filename, api_result)
         
-        try:
-            # Document Digitization API 분석
-            analyzer = DocumentAnalyzer()
-            api_result = analyzer.analyze_document(temp_path)
-            
-            # API 응답을 콘솔에 출력
-            print("=" * 50)
-            print(f"📄 파일: {file.filename}")
-            print("🔍 Document Digitization API 응답:")
-            print("=" * 50)
-            
-            if api_result.get('success'):
-                import json
-                print(json.dumps(api_result, indent=2, ensure_ascii=False))
-            else:
-                print(f"❌ API 오류: {api_result.get('error')}")
-                print(f"메시지: {api_result.get('message')}")
-            
-            print("=" * 50)
-            
-            if not api_result.get('success'):
-                return jsonify({
-                    'success': False,
-                    'error': api_result.get('error', 'API 분석에 실패했습니다.'),
-                    'message': api_result.get('message', '')
-                })
-            
-            # HTML 콘텐츠 추출
-            html_content = ""
-            if api_result.get('data') and api_result['data'].get('content'):
-                html_content = api_result['data']['content'].get('html', '')
-            
-            # 파일 정보
-            file_info = analyzer.get_file_info(temp_path)
-            
+        if not api_result.get('success'):
             return jsonify({
-                'success': True,
-                'html_content': html_content,
-                'file_info': file_info,
-                'original_filename': file.filename,
-                'full_api_response': api_result  # 전체 API 응답도 함께 전달
+                'success': False,
+                'error': api_result.get('error', 'API 분석에 실패했습니다.'),
+                'message': api_result.get('message', '')
             })
         
-        finally:
-            # 임시 파일 삭제
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
+        # 전체 API 응답은 ?full=1 로 요청한 경우에만 포함, 페이지 나눠 보내기는 ?paged=1/0 (없으면 문서 크기로 결정)
+        include_full = request.args.get('full', '').lower() in ('1', 'true')
+        with stage('build'):
+            response = build_analysis_response(api_result, file.filename, api_result['file_info'], include_full,
+                                               parse_paged_flag(request.args.get('paged')))
+
+        # 앞쪽 평가요소의 문장 옵션/평가기준을 백그라운드에서 미리 생성 (버튼을 누르면 캐시에서 바로 응답)
+        get_default_prefetcher().schedule(session_id, response['tables'])
+        with stage('serialize'):
+            return jsonify(response)
     
     except Exception as e:
         return jsonify({'error': f'처리 중 오류가 발생했습니다: {str(e)}'}), 500
 
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """문서 분석 작업 등록 API - 분석을 기다리지 않고 작업 ID를 바로 반환"""
+    try:
+        file, error_response = get_uploaded_file()
+        if error_response:
+            return error_response
+
+        session_id = get_session_id()
+        get_default_prefetcher().cancel(session_id)
+
+        job, deduplicated = get_default_job_queue().submit(file.stream, file.filename, session_id)
+        return jsonify({
+            'success': True,
+            'job_id': job['job_id'],
+            'status': job['status'],
+            'deduplicated': deduplicated  # 같은 문서의 작업이 이미 진행 중이면 그 작업을 반환
+        }), 202
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'처리 중 오류가 발생했습니다: {str(e)}'}), 500
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """문서 분석 작업 상태 API - 끝난 작업은 /api/analyze-document와 같은 형식의 결과(result) 포함"""
+    job = get_default_job_queue().get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': '작업을 찾을 수 없습니다.'}), 404
+    return jsonify({'success': True, **job})
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET', 'POST'])
+def job_events(job_id):
+    """문서 분석 작업 구독 API (SSE 스트리밍) - 진행 상황(status)과 결과(done/error) 전송"""
+    job_queue = get_default_job_queue()
+    if job_queue.get(job_id) is None:
+        return jsonify({'success': False, 'error': '작업을 찾을 수 없습니다.'}), 404
+    return sse_response(job_queue.events(job_id))
+
+@app.route('/api/figures/<name>')
+def get_figure(name):
+    """문서 그림 API - 내용 해시로 저장된 그림을 오래 캐시 가능한 응답으로 반환"""
+    path = get_default_blob_store().path_for(name)
+    if path is None:
+        abort(404)
+    response = send_file(path, mimetype=CONTENT_TYPES[name.rsplit('.', 1)[1]], etag=name.split('.')[0], conditional=True, max_age=31536000)
+    # 내용이 바뀌면 이름(해시)도 바뀌므로 변경되지 않는 리소스로 표시
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@app.route('/api/documents/<doc_id>/pages')
+def get_document_pages(doc_id):
+    """문서 페이지 조각 API - 큰 문서의 HTML을 요청한 페이지 범위(Range: pages=3-7 또는 ?range=3-7)만 반환"""
+    body, status, headers = read_page_range(doc_id, request.headers.get('Range'), request.args.get('range'))
+    if status < 300 and request.if_none_match.contains(headers['ETag'].strip('"')):
+        return Response(status=304, headers=headers)
+    return jsonify(body), status, headers
+
 @app.route('/api/generate-text-options', methods=['POST'])
 def generate_text_options():
     """문장 옵션 생성 API"""
@@ -108,16 +248,41 @@ def generate_text_options():
         text = data.get("text", "")
         context = data.get("context", None)
         num_options = data.get("num_options", 3)
+        regenerate = data.get("regenerate", False)  # True이면 캐시를 건너뛰고 새로 생성
+        tier = data.get("tier")  # "draft"/"full" (지정하지 않으면 입력 길이에 따른 정책)
         
         if not text:
             return jsonify({'success': False, 'error': '문장이 비어 있습니다.'}), 400
 
         improver = TextImprover()
-        result = improver.generate_text_options(text, context, num_options)
+        result = improver.generate_text_options(text, context, num_options, regenerate, tier)
         return jsonify(result)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def sse_response(events) -> Response:
+    """이벤트 제너레이터를 text/event-stream 응답으로 감싸기"""
+    body = stream_with_context(sse_event(event) for event in events)
+    return Response(body, mimetype='text/event-stream', headers=SSE_HEADERS)
+
+@app.route('/api/generate-text-options/stream', methods=['POST'])
+def generate_text_options_stream():
+    """문장 옵션 생성 API (SSE 스트리밍) - 옵션이 한 줄씩 완성될 때마다 전송"""
+    try:
+        data = request.get_json()
+        text = data.get("text", "")
+        context = data.get("context", None)
+        num_options = data.get("num_options", 3)
+        regenerate = data.get("regenerate", False)  # True이면 캐시를 건너뛰고 새로 생성
+
+        if not text:
+            return jsonify({'success': False, 'error': '문장이 비어 있습니다.'}), 400
+
+        improver = TextImprover()
+        return sse_response(improver.stream_text_options(text, context, num_options, regenerate, data.get("tier")))
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/improve-text', methods=['POST'])
 def improve_text():
     """문장 개선 API (기존 호환성 유지)"""
@@ -125,12 +290,13 @@ def improve_text():
         data = request.get_json()
         text = data.get("text", "")
         context = data.get("context", None)
+        regenerate = data.get("regenerate", False)
         
         if not text:
             return jsonify({'success': False, 'error': '문장이 비어 있습니다.'}), 400
 
         improver = TextImprover()
-        result = improver.improve_text(text, context)
+        result = improver.improve_text(text, context, regenerate, data.get("tier"))
         return jsonify(result)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -143,16 +309,35 @@ def generate_evaluation_criteria():
         evaluation_element = data.get("evaluationElement", "")
         original_criteria = data.get("originalCriteria", {})
         context = data.get("context", None)
+        regenerate = data.get("regenerate", False)
         
         if not evaluation_element:
             return jsonify({'success': False, 'error': '평가요소가 비어 있습니다.'}), 400
 
         improver = TextImprover()
-        result = improver.generate_evaluation_criteria(evaluation_element, original_criteria, context)
+        result = improver.generate_evaluation_criteria(evaluation_element, original_criteria, context, regenerate, data.get("tier"))
         return jsonify(result)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/generate-evaluation-criteria/stream', methods=['POST'])
+def generate_evaluation_criteria_stream():
+    """평가기준 4단계 생성 API (SSE 스트리밍) - 수준별 기준이 파싱되는 즉시 전송"""
+    try:
+        data = request.get_json()
+        evaluation_element = data.get("evaluationElement", "")
+        original_criteria = data.get("originalCriteria", {})
+        context = data.get("context", None)
+        regenerate = data.get("regenerate", False)
+
+        if not evaluation_element:
+            return jsonify({'success': False, 'error': '평가요소가 비어 있습니다.'}), 400
+
+        improver = TextImprover()
+        return sse_response(improver.stream_evaluation_criteria(evaluation_element, original_criteria, context, regenerate, data.get("tier")))
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/generate-single-criteria', methods=['POST'])
 def generate_single_criteria():
     """단일 평가기준 생성 API"""
@@ -162,20 +347,79 @@ def generate_single_criteria():
         evaluation_element = data.get("evaluationElement", "")
         original_text = data.get("originalText", "")
         context = data.get("context", None)
+        regenerate = data.get("regenerate", False)
         
         if not level or not evaluation_element:
             return jsonify({'success': False, 'error': '필수 정보가 누락되었습니다.'}), 400
 
         improver = TextImprover()
-        result = improver.generate_single_criteria(level, evaluation_element, original_text, context)
+        result = improver.generate_single_criteria(level, evaluation_element, original_text, context, regenerate, data.get("tier"))
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/generate-structured', methods=['POST'])
+def generate_structured():
+    """문장 옵션 + 옵션별 4단계 평가기준 동시 생성 API (JSON 스키마 구조화 출력, 토큰 사용량 포함)"""
+    try:
+        data = request.get_json()
+        text = data.get("text", "")
+        original_criteria = data.get("originalCriteria", {})
+        context = data.get("context", None)
+        num_options = data.get("num_options", 3)
+        regenerate = data.get("regenerate", False)
+
+        if not text:
+            return jsonify({'success': False, 'error': '문장이 비어 있습니다.'}), 400
+
+        improver = TextImprover()
+        result = improver.generate_structured(text, original_criteria, context, num_options, regenerate)
         return jsonify(result)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/batch-improve', methods=['POST'])
+def batch_improve():
+    """평가요소 일괄 생성 API (SSE 스트리밍) - 문서의 모든 평가요소를 동시에 처리하고 끝나는 순서대로 전송"""
+    try:
+        data = request.get_json()
+        items = data.get("items", [])
+        concurrency = data.get("concurrency", None)
+        num_options = data.get("num_options", 3)
+        structured = data.get("structured", False)  # True이면 평가요소마다 LLM 호출 한 번
+
+        if not items:
+            return jsonify({'success': False, 'error': '처리할 평가요소가 없습니다.'}), 400
+
+        batch = BatchImprover(concurrency=concurrency, structured=structured)
+        return sse_response(batch.run(items, num_options))
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/health')
 def health_check():
     """서버 상태 확인"""
-    return jsonify({'status': 'healthy', 'message': 'HTML 뷰어 서버가 정상 작동 중입니다.'})
+    upstreams = upstream_stats()
+    # 회로가 차단된 업스트림이 있으면 degraded로 표시
+    degraded = any(upstream['circuit'] != 'closed' for upstream in upstreams.values())
+    return jsonify({
+        'status': 'degraded' if degraded else 'healthy',
+        'message': 'HTML 뷰어 서버가 정상 작동 중입니다.',
+        'parse_cache': get_default_cache().stats(),
+        'blob_store': get_default_blob_store().stats(),
+        'page_store': get_default_page_store().stats(),
+        'text_cache': get_default_text_cache().stats(),
+        'jobs': get_default_job_queue().stats(),
+        'prefetch': get_default_prefetcher().stats(),
+        'scheduler': get_scheduler().stats() if get_scheduler() else None,
+        'upstreams': upstreams,
+        'generation': policy_summary()
+    })
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus 형식 지표"""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5002)
\ No newline at end of file
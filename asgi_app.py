@@ -0,0 +1,451 @@
+"""
+비동기(ASGI) 서버 모드
+
+app_simple.py와 같은 API를 제공하지만 업스트림 호출을 기다리는 동안 워커 스레드를 점유하지 않습니다.
+한 프로세스에서 수백 개의 문서 분석/문장 생성 요청을 동시에 처리할 수 있습니다.
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5002
+"""
+import asyncio
+import functools
+import os
+import time
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+from starlette.applications import Starlette
+from starlette.formparsers import MultiPartParser
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from async_document_analyzer import AsyncDocumentAnalyzer
+from async_text_improver import AsyncTextImprover
+from async_clients import close_async_clients, ASYNC_MAX_CONNECTIONS
+from batch_improver import AsyncBatchImprover
+from analysis_response import build_analysis_response, log_api_result
+from blob_store import get_default_blob_store, CONTENT_TYPES
+from page_store import parse_paged_flag, read_page_range, get_default_page_store
+from scheduler import scheduled, get_scheduler, configure_scheduler
+from parse_cache import get_default_cache
+from completion_cache import get_default_text_cache
+from job_queue import get_default_job_queue
+from prefetch import get_default_prefetcher
+from resilience import upstream_stats
+from generation_tiers import policy_summary
+import metrics
+import http_encoding
+from sse import sse_event, SSE_HEADERS
+
+# .env 파일 로드
+load_dotenv()
+
+MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB 제한
+ALLOWED_EXTENSIONS = ['.hwp', '.pdf']
+# 업로드 파일을 디스크에 쓰지 않도록 최대 크기까지는 메모리에 보관
+MultiPartParser.spool_max_size = MAX_CONTENT_LENGTH
+# 업스트림 동시 요청 수를 비동기 HTTP 연결 풀 크기에 맞춤 (SCHEDULER_CONCURRENCY를 지정하면 그 값 사용)
+configure_scheduler(ASYNC_MAX_CONNECTIONS)
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'index.html')
+
+
+def sse_response(events) -> StreamingResponse:
+    """비동기 이벤트 제너레이터를 text/event-stream 응답으로 감싸기"""
+    async def body():
+        async for event in events:
+            yield sse_event(event)
+    return StreamingResponse(body(), media_type='text/event-stream', headers=SSE_HEADERS)
+
+
+async def read_json(request: Request) -> dict:
+    try:
+        return await request.json()
+    except ValueError:
+        return {}
+
+
+def get_session_id(request: Request, form) -> str:
+    """미리 생성 작업과 업스트림 요청 대기열을 묶는 브라우저 세션 ID (없으면 접속 주소)"""
+    session_id = request.headers.get('x-session-id') or form.get('session_id')
+    if isinstance(session_id, str) and session_id:
+        return session_id
+    return request.client.host if request.client else 'anonymous'
+
+
+async def index(request: Request):
+    """메인 페이지"""
+    return FileResponse(TEMPLATE_PATH, media_type='text/html')
+
+
+async def analyze_document(request: Request):
+    """문서 분석 API - HTML만 반환"""
+    try:
+        # 단계별 시간: upload(요청 본문 수신/파싱) → parse(캐시 조회 + 원격 분석) → build(표 추출/그림 저장) → serialize(JSON 변환)
+        stage = functools.partial(metrics.STAGE_SECONDS.time, '/api/analyze-document')
+        with stage('upload'):
+            form = await request.form()
+        file = form.get('file')
+        if file is None or isinstance(file, str):
+            return JSONResponse({'error': '파일이 업로드되지 않았습니다.'}, status_code=400)
+        if not file.filename:
+            return JSONResponse({'error': '파일이 선택되지 않았습니다.'}, status_code=400)
+
+        # HWP 또는 PDF 파일인지 확인
+        file_extension = os.path.splitext(file.filename.lower())[1]
+        if file_extension not in ALLOWED_EXTENSIONS:
+            return JSONResponse({'error': 'HWP 또는 PDF 파일만 업로드 가능합니다.'}, status_code=400)
+
+        file_bytes = await file.read()
+        if len(file_bytes) > MAX_CONTENT_LENGTH:
+            return JSONResponse({'error': '파일 크기는 16MB를 초과할 수 없습니다.'}, status_code=413)
+
+        # 같은 세션에서 새 문서를 올리면 이전 문서의 미리 생성 작업은 취소
+        session_id = get_session_id(request, form)
+        get_default_prefetcher().cancel(session_id)
+
+        # 임시 파일 없이 메모리의 바이트를 그대로 분석 API로 전송 (여러 페이지 PDF는 조각으로 나누어 병렬 분석)
+        analyzer = AsyncDocumentAnalyzer()
+        with stage('parse'):
+            api_result = await analyzer.analyze_document_chunked(file_bytes, file.filename)
+
+        log_api_result(file.filename, api_result)
+
+        if not api_result.get('success'):
+            return JSONResponse({
+                'success': False,
+                'error': api_result.get('error', 'API 분석에 실패했습니다.'),
+                'message': api_result.get('message', '')
+            })
+
+        # 전체 API 응답은 ?full=1 로 요청한 경우에만 포함, 페이지 나눠 보내기는 ?paged=1/0 (없으면 문서 크기로 결정)
+        include_full = request.query_params.get('full', '').lower() in ('1', 'true')
+        with stage('build'):
+            response = await asyncio.to_thread(
+                build_analysis_response, api_result, file.filename, api_result['file_info'], include_full,
+                parse_paged_flag(request.query_params.get('paged')))
+
+        # 앞쪽 평가요소의 문장 옵션/평가기준을 백그라운드 스레드에서 미리 생성
+        get_default_prefetcher().schedule(session_id, response['tables'])
+        with stage('serialize'):
+            return JSONResponse(response)
+
+    except Exception as e:
+        return JSONResponse({'error': f'처리 중 오류가 발생했습니다: {str(e)}'}, status_code=500)
+
+
+async def submit_job(request: Request):
+    """문서 분석 작업 등록 API - 분석을 기다리지 않고 작업 ID를 바로 반환"""
+    try:
+        form = await request.form()
+        file = form.get('file')
+        if file is None or isinstance(file, str):
+            return JSONResponse({'error': '파일이 업로드되지 않았습니다.'}, status_code=400)
+        if not file.filename:
+            return JSONResponse({'error': '파일이 선택되지 않았습니다.'}, status_code=400)
+
+        file_extension = os.path.splitext(file.filename.lower())[1]
+        if file_extension not in ALLOWED_EXTENSIONS:
+            return JSONResponse({'error': 'HWP 또는 PDF 파일만 업로드 가능합니다.'}, status_code=400)
+
+        file_bytes = await file.read()
+        if len(file_bytes) > MAX_CONTENT_LENGTH:
+            return JSONResponse({'error': '파일 크기는 16MB를 초과할 수 없습니다.'}, status_code=413)
+
+        session_id = get_session_id(request, form)
+        get_default_prefetcher().cancel(session_id)
+
+        # 작업 큐는 스레드 워커로 동작하므로 등록(해시, SQLite 기록)도 스레드에서 처리
+        job, deduplicated = await asyncio.to_thread(
+            lambda: get_default_job_queue().submit(file_bytes, file.filename, session_id))
+        return JSONResponse({
+            'success': True,
+            'job_id': job['job_id'],
+            'status': job['status'],
+            'deduplicated': deduplicated
+        }, status_code=202)
+    except Exception as e:
+        return JSONResponse({'success': False, 'error': f'처리 중 오류가 발생했습니다: {str(e)}'}, status_code=500)
+
+
+async def get_job(request: Request):
+    """문서 분석 작업 상태 API"""
+    job = await asyncio.to_thread(lambda: get_default_job_queue().get(request.path_params['job_id']))
+    if job is None:
+        return JSONResponse({'success': False, 'error': '작업을 찾을 수 없습니다.'}, status_code=404)
+    return JSONResponse({'success': True, **job})
+
+
+async def job_events(request: Request):
+    """문서 분석 작업 구독 API (SSE 스트리밍)"""
+    job_id = request.path_params['job_id']
+    job_queue = await asyncio.to_thread(get_default_job_queue)
+    if await asyncio.to_thread(job_queue.get, job_id) is None:
+        return JSONResponse({'success': False, 'error': '작업을 찾을 수 없습니다.'}, status_code=404)
+
+    # 구독자마다 스레드를 잡아 두지 않도록 이벤트 루프에서 기다림
+    return sse_response(job_queue.aevents(job_id))
+
+
+async def get_figure(request: Request):
+    """문서 그림 API - 내용 해시로 저장된 그림을 오래 캐시 가능한 응답으로 반환"""
+    name = request.path_params['name']
+    path = get_default_blob_store().path_for(name)
+    if path is None:
+        return JSONResponse({'error': '그림을 찾을 수 없습니다.'}, status_code=404)
+
+    etag = f'"{name.split(".")[0]}"'
+    headers = {'ETag': etag, 'Cache-Control': 'public, max-age=31536000, immutable'}
+    if http_encoding.etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=CONTENT_TYPES[name.rsplit('.', 1)[1]], headers=headers)
+
+
+async def get_document_pages(request: Request):
+    """문서 페이지 조각 API - 큰 문서의 HTML을 요청한 페이지 범위(Range: pages=3-7 또는 ?range=3-7)만 반환"""
+    body, status, headers = await asyncio.to_thread(
+        read_page_range, request.path_params['doc_id'], request.headers.get('range'), request.query_params.get('range'))
+    if status < 300 and http_encoding.etag_matches(request.headers.get('if-none-match'), headers['ETag']):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(body, status_code=status, headers=headers)
+
+
+async def generate_text_options(request: Request):
+    """문장 옵션 생성 API"""
+    try:
+        data = await read_json(request)
+        text = data.get("text", "")
+        if not text:
+            return JSONResponse({'success': False, 'error': '문장이 비어 있습니다.'}, status_code=400)
+
+        result = await AsyncTextImprover().generate_text_options(
+            text, data.get("context"), data.get("num_options", 3), data.get("regenerate", False), data.get("tier"))
+        return JSONResponse(result)
+    except Exception as e:
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=500)
+
+
+async def generate_text_options_stream(request: Request):
+    """문장 옵션 생성 API (SSE 스트리밍)"""
+    try:
+        data = await read_json(request)
+        text = data.get("text", "")
+        if not text:
+            return JSONResponse({'success': False, 'error': '문장이 비어 있습니다.'}, status_code=400)
+
+        improver = AsyncTextImprover()
+        return sse_response(improver.stream_text_options(
+            text, data.get("context"), data.get("num_options", 3), data.get("regenerate", False), data.get("tier")))
+    except Exception as e:
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=500)
+
+
+async def improve_text(request: Request):
+    """문장 개선 API (기존 호환성 유지)"""
+    try:
+        data = await read_json(request)
+        text = data.get("text", "")
+        if not text:
+            return JSONResponse({'success': False, 'error': '문장이 비어 있습니다.'}, status_code=400)
+
+        result = await AsyncTextImprover().improve_text(text, data.get("context"), data.get("regenerate", False), data.get("tier"))
+        return JSONResponse(result)
+    except Exception as e:
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=500)
+
+
+async def generate_evaluation_criteria(request: Request):
+    """평가기준 4단계 생성 API"""
+    try:
+        data = await read_json(request)
+        evaluation_element = data.get("evaluationElement", "")
+        if not evaluation_element:
+            return JSONResponse({'success': False, 'error': '평가요소가 비어 있습니다.'}, status_code=400)
+
+        result = await AsyncTextImprover().generate_evaluation_criteria(
+            evaluation_element, data.get("originalCriteria", {}), data.get("context"), data.get("regenerate", False), data.get("tier"))
+        return JSONResponse(result)
+    except Exception as e:
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=500)
+
+
+async def generate_evaluation_criteria_stream(request: Request):
+    """평가기준 4단계 생성 API (SSE 스트리밍)"""
+    try:
+        data = await read_json(request)
+        evaluation_element = data.get("evaluationElement", "")
+        if not evaluation_element:
+            return JSONResponse({'success': False, 'error': '평가요소가 비어 있습니다.'}, status_code=400)
+
+        improver = AsyncTextImprover()
+        return sse_response(improver.stream_evaluation_criteria(
+            evaluation_element, data.get("originalCriteria", {}), data.get("context"), data.get("regenerate", False), data.get("tier")))
+    except Exception as e:
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=500)
+
+
+async def generate_single_criteria(request: Request):
+    """단일 평가기준 생성 API"""
+    try:
+        data = await read_json(request)
+        level = data.get("level", "")
+        evaluation_element = data.get("evaluationElement", "")
+        if not level or not evaluation_element:
+            return JSONResponse({'success': False, 'error': '필수 정보가 누락되었습니다.'}, status_code=400)
+
+        result = await AsyncTextImprover().generate_single_criteria(
+            level, evaluation_element, data.get("originalText", ""), data.get("context"), data.get("regenerate", False), data.get("tier"))
+        return JSONResponse(result)
+    except Exception as e:
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=500)
+
+
+async def generate_structured(request: Request):
+    """문장 옵션 + 옵션별 4단계 평가기준 동시 생성 API"""
+    try:
+        data = await read_json(request)
+        text = data.get("text", "")
+        if not text:
+            return JSONResponse({'success': False, 'error': '문장이 비어 있습니다.'}, status_code=400)
+
+        result = await AsyncTextImprover().generate_structured(
+            text, data.get("originalCriteria", {}), data.get("context"), data.get("num_options", 3), data.get("regenerate", False))
+        return JSONResponse(result)
+    except Exception as e:
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=500)
+
+
+async def batch_improve(request: Request):
+    """평가요소 일괄 생성 API (SSE 스트리밍)"""
+    try:
+        data = await read_json(request)
+        items = data.get("items", [])
+        if not items:
+            return JSONResponse({'success': False, 'error': '처리할 평가요소가 없습니다.'}, status_code=400)
+
+        batch = AsyncBatchImprover(concurrency=data.get("concurrency"), structured=data.get("structured", False))
+        return sse_response(batch.run(items, data.get("num_options", 3)))
+    except Exception as e:
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=500)
+
+
+async def health_check(request: Request):
+    """서버 상태 확인"""
+    parse_cache = await asyncio.to_thread(lambda: get_default_cache().stats())
+    upstreams = upstream_stats()
+    # 회로가 차단된 업스트림이 있으면 degraded로 표시
+    degraded = any(upstream['circuit'] != 'closed' for upstream in upstreams.values())
+    return JSONResponse({
+        'status': 'degraded' if degraded else 'healthy',
+        'message': 'HTML 뷰어 서버가 정상 작동 중입니다.',
+        'mode': 'asgi',
+        'parse_cache': parse_cache,
+        'blob_store': await asyncio.to_thread(lambda: get_default_blob_store().stats()),
+        'page_store': await asyncio.to_thread(lambda: get_default_page_store().stats()),
+        'text_cache': get_default_text_cache().stats(),
+        'jobs': await asyncio.to_thread(lambda: get_default_job_queue().stats()),
+        'prefetch': get_default_prefetcher().stats(),
+        'scheduler': get_scheduler().stats() if get_scheduler() else None,
+        'upstreams': upstreams,
+        'generation': policy_summary()
+    })
+
+
+async def metrics_endpoint(request: Request):
+    """Prometheus 형식 지표"""
+    body = await asyncio.to_thread(metrics.render)
+    return Response(body, media_type=metrics.CONTENT_TYPE)
+
+
+class MetricsMiddleware:
+    """요청 처리 시간과 응답 크기를 기록하는 ASGI 미들웨어 (스트리밍 응답은 첫 응답까지의 시간만 기록)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        response = {'status': 500, 'bytes': 0, 'streamed': False}
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                # Content-Length가 없으면 스트리밍 응답
+                response['streamed'] = not any(name == b'content-length' for name, _ in message.get('headers', []))
+                route = scope.get('route')
+                metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, route.path if route else 'unmatched',
+                                                scope['method'], message['status'])
+            elif message['type'] == 'http.response.body' and not response['streamed']:
+                response['bytes'] += len(message.get('body', b''))
+                if not message.get('more_body'):
+                    route = scope.get('route')
+                    metrics.RESPONSE_BYTES.inc(route.path if route else 'unmatched', amount=response['bytes'])
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await close_async_clients()
+
+
+class ScheduleMiddleware:
+    """
+    요청 안에서 보내는 업스트림 요청을 세션별 대기열에 넣는 ASGI 미들웨어
+    화면에서 누른 요청은 interactive, 프로그램 클라이언트는 X-Priority: bulk 로 낮출 수 있음
+    (일괄 생성/미리 생성은 각자 bulk/prefetch 대기열 사용)
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get('headers') or [])
+        session_id = headers.get(b'x-session-id', b'').decode('latin-1') or (scope['client'][0] if scope.get('client') else None)
+        with scheduled(headers.get(b'x-priority', b'interactive').decode('latin-1'), session_id):
+            await self.app(scope, receive, send)
+
+
+routes = [
+    Route('/', index),
+    Route('/api/analyze-document', analyze_document, methods=['POST']),
+    Route('/api/jobs', submit_job, methods=['POST']),
+    Route('/api/jobs/{job_id}', get_job),
+    Route('/api/jobs/{job_id}/events', job_events, methods=['GET', 'POST']),
+    Route('/api/figures/{name}', get_figure),
+    Route('/api/documents/{doc_id}/pages', get_document_pages),
+    Route('/api/generate-text-options', generate_text_options, methods=['POST']),
+    Route('/api/generate-text-options/stream', generate_text_options_stream, methods=['POST']),
+    Route('/api/improve-text', improve_text, methods=['POST']),
+    Route('/api/generate-evaluation-criteria', generate_evaluation_criteria, methods=['POST']),
+    Route('/api/generate-evaluation-criteria/stream', generate_evaluation_criteria_stream, methods=['POST']),
+    Route('/api/generate-single-criteria', generate_single_criteria, methods=['POST']),
+    Route('/api/generate-structured', generate_structured, methods=['POST']),
+    Route('/api/batch-improve', batch_improve, methods=['POST']),
+    Route('/api/health', health_check),
+    Route('/metrics', metrics_endpoint),
+]
+
+metrics.install_default_collectors()
+
+app = Starlette(
+    routes=routes,
+    middleware=[
+        Middleware(MetricsMiddleware),
+        Middleware(ScheduleMiddleware),
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])
+    ],
+    lifespan=lifespan
+)
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=5002)
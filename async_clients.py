@@ -0,0 +1,54 @@
+import asyncio
+import os
+import weakref
+import httpx
+from openai import AsyncOpenAI
+from http_clients import UPSTAGE_BASE_URL
+
+# 한 프로세스에서 동시에 유지할 수 있는 업스트림 연결 수
+# (ASGI 서버는 업스트림 요청 대기열의 동시 요청 수도 이 값으로 맞춤, scheduler.configure_scheduler 참고)
+ASYNC_MAX_CONNECTIONS = int(os.getenv("ASYNC_MAX_CONNECTIONS", 500))
+ASYNC_MAX_KEEPALIVE = int(os.getenv("ASYNC_MAX_KEEPALIVE", 100))
+
+# 비동기 클라이언트는 이벤트 루프에 묶이므로 루프별로 하나씩 보관
+_http_clients = weakref.WeakKeyDictionary()
+_openai_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """현재 이벤트 루프에서 공유하는 httpx.AsyncClient를 반환합니다."""
+    loop = asyncio.get_running_loop()
+    client = _http_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=ASYNC_MAX_CONNECTIONS,
+                max_keepalive_connections=ASYNC_MAX_KEEPALIVE
+            ),
+            timeout=None
+        )
+        _http_clients[loop] = client
+    return client
+
+
+def get_async_openai_client(api_key: str, base_url: str = None) -> AsyncOpenAI:
+    """현재 이벤트 루프에서 API 키/주소별로 공유하는 AsyncOpenAI 클라이언트를 반환합니다."""
+    loop = asyncio.get_running_loop()
+    clients = _openai_clients.setdefault(loop, {})
+    key = (api_key, base_url or UPSTAGE_BASE_URL)
+    client = clients.get(key)
+    if client is None:
+        # 재시도는 resilience 계층에서 처리하므로 SDK 자체 재시도는 끔
+        client = AsyncOpenAI(api_key=key[0], base_url=key[1], max_retries=0)
+        clients[key] = client
+    return client
+
+
+async def close_async_clients() -> None:
+    """현재 이벤트 루프의 공유 클라이언트를 모두 닫습니다. (ASGI 종료 시 사용)"""
+    loop = asyncio.get_running_loop()
+    client = _http_clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
+    for client in _openai_clients.pop(loop, {}).values():
+        await client.close()
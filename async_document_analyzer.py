@@ -0,0 +1,177 @@
+import asyncio
+from typing import Dict, Any, Callable, Optional, Union
+import httpx
+from document_analyzer import DocumentAnalyzer
+from parse_cache import ParseCache
+from upload_buffer import UploadBuffer, MultipartStream, DocumentSource
+from pdf_splitter import PageChunk, merge_chunk_results, PDF_CHUNK_WORKERS
+from async_clients import get_async_http_client
+from resilience import CONNECT_TIMEOUT, UpstreamError, get_upstream
+from single_flight import get_single_flight
+
+
+class AsyncDocumentAnalyzer(DocumentAnalyzer):
+    def __init__(self, api_key: str = None, cache: ParseCache = None, use_cache: bool = True, client: httpx.AsyncClient = None,
+                 local_parse: bool = None):
+        """
+        DocumentAnalyzer의 비동기 버전 (httpx.AsyncClient 사용)
+        업스트림 응답을 기다리는 동안 워커 스레드를 점유하지 않습니다.
+        """
+        super().__init__(api_key, cache, use_cache, local_parse=local_parse)
+        self.client = client
+
+    async def _afetch(self, buffer: UploadBuffer, filename: str, cache_key: Optional[str]) -> Dict[str, Any]:
+        """DocumentAnalyzer._fetch의 비동기 버전"""
+        if cache_key is not None:
+            # analyze_document에서 이미 미적중으로 센 요청이므로 다시 세지 않음
+            cached = await asyncio.to_thread(self.cache.get, cache_key, False)
+            if cached is not None:
+                return {"success": True, "data": cached, "status_code": 200, "cached": True}
+
+        client = self.client or get_async_http_client()
+        body = MultipartStream(self.data, "document", filename, buffer.data)
+
+        async def post(timeout: float) -> httpx.Response:
+            # 재시도할 때마다 새 비동기 이터레이터로 본문을 처음부터 다시 보냄
+            return await client.post(self.url, headers={**self.headers, **body.headers}, content=body.aiter_chunks(),
+                                     timeout=httpx.Timeout(timeout, connect=CONNECT_TIMEOUT))
+
+        response = await get_upstream("document").acall(post)
+
+        if response.status_code == 200:
+            result = response.json()
+            if self.cache is not None:
+                await asyncio.to_thread(self.cache.set, cache_key, result)
+            return {
+                "success": True,
+                "data": result,
+                "status_code": response.status_code,
+                "cached": False
+            }
+        return {
+            "success": False,
+            "error": f"API 오류: {response.status_code}",
+            "message": response.text,
+            "status_code": response.status_code
+        }
+
+    async def analyze_document(self, source: Union[str, DocumentSource], filename: str = None) -> Dict[str, Any]:
+        """
+        문서를 분석하고 결과를 반환합니다. (DocumentAnalyzer.analyze_document와 같은 형식)
+        """
+        try:
+            if isinstance(source, str):
+                # 디스크 I/O는 이벤트 루프를 막지 않도록 스레드에서 처리
+                buffer, filename = await asyncio.to_thread(self._load, source, filename)
+            else:
+                buffer, filename = self._load(source, filename)
+            file_info = self._file_info(buffer, filename)
+
+            local = await asyncio.to_thread(self._local_result, buffer, file_info)
+            if local is not None:
+                return local
+
+            cache_key, cached = await asyncio.to_thread(self._cache_lookup, buffer)
+            if cached is not None:
+                return {
+                    "success": True,
+                    "data": cached,
+                    "status_code": 200,
+                    "cached": True,
+                    "file_info": file_info
+                }
+
+            # 같은 문서를 동시에 분석하면 (다른 워커 프로세스 포함) 원격 API는 한 번만 호출
+            flight = get_single_flight("document")
+
+            def fetch():
+                return self._afetch(buffer, filename, cache_key)
+
+            result = await (flight.ado(self._flight_key(buffer), fetch) if flight else fetch())
+            return {**result, "file_info": file_info} if result["success"] else result
+
+        except FileNotFoundError:
+            return {
+                "success": False,
+                "error": "파일을 찾을 수 없습니다.",
+                "message": f"파일 경로: {source}"
+            }
+        except UpstreamError as e:
+            return self._upstream_failed(e)
+        except Exception as e:
+            return {
+                "success": False,
+                "error": "문서 분석 중 오류가 발생했습니다.",
+                "message": str(e)
+            }
+
+    async def _analyze_chunk(self, chunk: PageChunk, filename: str, semaphore: asyncio.Semaphore,
+                             on_done: Callable[[], None] = None) -> Dict[str, Any]:
+        # 일시적인 실패는 Upstream.acall이 이미 다시 시도함
+        async with semaphore:
+            result = await self.analyze_document(chunk.data, self._chunk_filename(filename, chunk))
+        if on_done:
+            on_done()
+        return result
+
+    async def analyze_document_chunked(self, source: Union[str, DocumentSource], filename: str = None,
+                                       pages_per_chunk: int = None, max_workers: int = None,
+                                       on_progress: Callable[[int, int], None] = None) -> Dict[str, Any]:
+        """
+        PDF를 페이지 조각으로 나누어 병렬로 분석합니다. (DocumentAnalyzer.analyze_document_chunked와 같은 형식)
+        """
+        try:
+            if isinstance(source, str):
+                buffer, filename = await asyncio.to_thread(self._load, source, filename)
+            else:
+                buffer, filename = self._load(source, filename)
+        except FileNotFoundError:
+            return {
+                "success": False,
+                "error": "파일을 찾을 수 없습니다.",
+                "message": f"파일 경로: {source}"
+            }
+
+        cache_key, cached = await asyncio.to_thread(self._cache_lookup, buffer)
+        plan = None if cached is not None else await asyncio.to_thread(self._plan_pages, buffer, pages_per_chunk)
+        if plan is None or plan.chunks is None:
+            result = await self.analyze_document(buffer.data, filename)
+            if plan is not None and result["success"]:
+                await asyncio.to_thread(self._store_pages, plan, [(plan.whole, result["data"])])
+            if on_progress:
+                on_progress(1, 1)
+            return result
+        chunks = plan.chunks
+
+        finished = 0
+
+        def on_done():
+            nonlocal finished
+            finished += 1
+            if on_progress:
+                on_progress(finished, len(chunks))
+
+        semaphore = asyncio.Semaphore(max(1, max_workers or PDF_CHUNK_WORKERS))
+        chunk_results = await asyncio.gather(*(
+            self._analyze_chunk(chunk, filename, semaphore, on_done) for chunk in chunks
+        ))
+        results = {chunk.index: result for chunk, result in zip(chunks, chunk_results)}
+
+        failed = [chunk for chunk in chunks if not results[chunk.index]["success"]]
+        if failed:
+            return self._chunks_failed(failed, results)
+
+        fresh = [(chunk, results[chunk.index]["data"]) for chunk in chunks]
+        await asyncio.to_thread(self._store_pages, plan, fresh)
+        merged = await asyncio.to_thread(merge_chunk_results, fresh + plan.reused_segments())
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.set, cache_key, merged)
+        return {
+            "success": True,
+            "data": merged,
+            "status_code": 200,
+            "cached": all(results[chunk.index]["cached"] for chunk in chunks),
+            "file_info": self._file_info(buffer, filename),
+            "chunks": len(chunks),
+            "reused_pages": len(plan.reused)
+        }
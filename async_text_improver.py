@@ -0,0 +1,267 @@
+import time
+from typing import Dict, Any, AsyncIterator, Awaitable, Callable
+from openai import AsyncOpenAI
+from text_improver import TextImprover, completion_flight_key
+from completion_cache import CompletionCache, CompletionKey
+from async_clients import get_async_openai_client
+from resilience import get_upstream
+from metrics import timed_method, record_usage, TIER_SECONDS
+from generation_tiers import tier_params
+from single_flight import get_single_flight
+
+
+class AsyncTextImprover(TextImprover):
+    def __init__(self, api_key: str = None, client: AsyncOpenAI = None, cache: CompletionCache = None, use_cache: bool = True):
+        """
+        TextImprover의 비동기 버전 (AsyncOpenAI 사용)
+        프롬프트, 결과 파싱, 생성 결과 캐시는 TextImprover와 동일합니다.
+        """
+        super().__init__(api_key, cache, use_cache)
+        self.async_client = client
+
+    def _client(self) -> AsyncOpenAI:
+        return self.async_client or get_async_openai_client(self.api_key)
+
+    async def _create(self, endpoint: str = "unknown", tier: str = "full", **kwargs):
+        client = self._client()
+
+        async def create():
+            response = await get_upstream("chat").acall(lambda timeout: client.chat.completions.create(timeout=timeout, **kwargs),
+                                                        stream=bool(kwargs.get("stream")))
+            record_usage(getattr(response, "usage", None), endpoint, tier)
+            return response
+
+        flight = None if kwargs.get("stream") else get_single_flight("chat")
+        return await (flight.ado(completion_flight_key(client.base_url, kwargs), create) if flight else create())
+
+    async def _complete(self, prompt: str, temperature: float, max_tokens: int = 1024,
+                        cache_key: CompletionKey = None, regenerate: bool = False,
+                        endpoint: str = "unknown", tier: str = "full") -> str:
+        cached = self._cached(cache_key, regenerate)
+        if cached is not None:
+            return cached
+
+        started = time.perf_counter()
+        response = await self._create(
+            endpoint, tier,
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            temperature=temperature,
+            stream=False,
+            **tier_params(tier, max_tokens)
+        )
+        TIER_SECONDS.observe(time.perf_counter() - started, endpoint, tier)
+        text = response.choices[0].message.content.strip()
+        self._store(cache_key, text)
+        return text
+
+    async def _complete_json(self, prompt: str, schema: Dict[str, Any], temperature: float, max_tokens: int = 2048):
+        """JSON 스키마를 지정해 응답을 받고 (응답 문자열, 토큰 사용량)을 반환합니다."""
+        started = time.perf_counter()
+        response = await self._create(
+            "structured", "full",
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            temperature=temperature,
+            stream=False,
+            response_format={
+                "type": "json_schema",
+                "json_schema": {"name": "evaluation_element", "strict": True, "schema": schema}
+            },
+            **tier_params("full", max_tokens)
+        )
+        TIER_SECONDS.observe(time.perf_counter() - started, "structured", "full")
+        return response.choices[0].message.content or "", response.usage
+
+    async def _stream_lines(self, prompt: str, temperature: float, max_tokens: int = 1024,
+                            cache_key: CompletionKey = None, regenerate: bool = False,
+                            endpoint: str = "unknown", tier: str = "full") -> AsyncIterator[str]:
+        """스트리밍 응답을 받아 완성된 줄 단위로 돌려줍니다. 캐시에 있으면 저장된 응답을 줄 단위로 돌려줍니다."""
+        cached = self._cached(cache_key, regenerate)
+        if cached is not None:
+            for line in cached.split("\n"):
+                if line.strip():
+                    yield line.strip()
+            return
+
+        started = time.perf_counter()
+        stream = await self._create(
+            endpoint, tier,
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            temperature=temperature,
+            stream=True,
+            **tier_params(tier, max_tokens)
+        )
+
+        buffer = ""
+        lines = []
+        try:
+            async for chunk in stream:
+                record_usage(getattr(chunk, "usage", None), endpoint, tier)
+                if not chunk.choices:
+                    continue
+                buffer += chunk.choices[0].delta.content or ""
+                while "\n" in buffer:
+                    line, buffer = buffer.split("\n", 1)
+                    if line.strip():
+                        lines.append(line.strip())
+                        yield line.strip()
+        finally:
+            await stream.aclose()
+        if buffer.strip():
+            lines.append(buffer.strip())
+            yield buffer.strip()
+        TIER_SECONDS.observe(time.perf_counter() - started, endpoint, tier)
+        self._store(cache_key, "\n".join(lines))
+
+    @staticmethod
+    async def _arefined_event(refine: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """TextImprover._refined_event의 비동기 버전"""
+        try:
+            return {"type": "refined", "success": True, "tier": "full", **(await refine())}
+        except Exception as e:
+            return {"type": "refined", "success": False, "tier": "full", "error": str(e)}
+
+    @timed_method("generate_text_options")
+    async def generate_text_options(self, original_text: str, context: Dict[str, str] = None, num_options: int = 3, regenerate: bool = False,
+                                    tier: str = None) -> Dict[str, Any]:
+        """원문을 받아서 여러 개의 개선된 문장 옵션들을 반환"""
+        try:
+            selected, _, request, _ = self._text_options_request(original_text, context, num_options, tier, regenerate)
+            return {
+                "success": True,
+                "original": original_text,
+                "options": self._parse_options(await self._complete(**request), original_text, num_options),
+                "tier": selected
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+
+    @timed_method("stream_text_options")
+    async def stream_text_options(self, original_text: str, context: Dict[str, str] = None, num_options: int = 3, regenerate: bool = False,
+                                  tier: str = None) -> AsyncIterator[Dict[str, Any]]:
+        """generate_text_options의 스트리밍 버전 (이벤트 형식은 TextImprover.stream_text_options와 동일)"""
+        try:
+            selected, refine, request, full_request = self._text_options_request(original_text, context, num_options, tier, regenerate,
+                                                                                 stream=True)
+            options = []
+            async for line in self._stream_lines(**request):
+                event = self._option_event(options, line, num_options)
+                if event:
+                    yield event
+
+            yield self._options_done_event(original_text, options, num_options, selected, refine)
+
+            if refine:
+                async def refined():
+                    return {"options": self._parse_options(await self._complete(**full_request), original_text, num_options)}
+                yield await self._arefined_event(refined)
+
+        except Exception as e:
+            yield {"type": "error", "success": False, "error": str(e)}
+
+    @timed_method("improve_text")
+    async def improve_text(self, original_text: str, context: Dict[str, str] = None, regenerate: bool = False,
+                           tier: str = None) -> Dict[str, Any]:
+        """원문을 받아서 더 명확하고 자연스럽게 개선된 문장 반환"""
+        try:
+            selected, _, request, _ = self._improve_text_request(original_text, context, tier, regenerate)
+            return {
+                "success": True,
+                "original": original_text,
+                "improved": await self._complete(**request),
+                "tier": selected
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+
+    @timed_method("generate_evaluation_criteria")
+    async def generate_evaluation_criteria(self, evaluation_element: str, original_criteria: Dict[str, str], context: Dict[str, str] = None,
+                                           regenerate: bool = False, tier: str = None) -> Dict[str, Any]:
+        """평가요소를 기반으로 4단계 평가기준을 생성"""
+        try:
+            selected, _, request, _ = self._evaluation_criteria_request(evaluation_element, original_criteria, context, tier, regenerate)
+            return {
+                "success": True,
+                "criteria": self._parse_criteria(await self._complete(**request)),
+                "tier": selected
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+
+    @timed_method("stream_evaluation_criteria")
+    async def stream_evaluation_criteria(self, evaluation_element: str, original_criteria: Dict[str, str], context: Dict[str, str] = None,
+                                         regenerate: bool = False, tier: str = None) -> AsyncIterator[Dict[str, Any]]:
+        """generate_evaluation_criteria의 스트리밍 버전 (이벤트 형식은 TextImprover.stream_evaluation_criteria와 동일)"""
+        try:
+            selected, refine, request, full_request = self._evaluation_criteria_request(evaluation_element, original_criteria, context,
+                                                                                        tier, regenerate, stream=True)
+            criteria = {}
+            async for line in self._stream_lines(**request):
+                event = self._criteria_event(criteria, line)
+                if event:
+                    yield event
+
+            yield {"type": "done", "success": True, "criteria": criteria, "tier": selected, "refining": refine}
+
+            if refine:
+                async def refined():
+                    return {"criteria": self._parse_criteria(await self._complete(**full_request))}
+                yield await self._arefined_event(refined)
+
+        except Exception as e:
+            yield {"type": "error", "success": False, "error": str(e)}
+
+    @timed_method("generate_single_criteria")
+    async def generate_single_criteria(self, level: str, evaluation_element: str, original_text: str, context: Dict[str, str] = None,
+                                       regenerate: bool = False, tier: str = None) -> Dict[str, Any]:
+        """특정 평가 수준에 대한 단일 평가기준 생성"""
+        try:
+            selected, _, request, _ = self._single_criteria_request(level, evaluation_element, original_text, context, tier, regenerate)
+            return {
+                "success": True,
+                "criteria": await self._complete(**request),
+                "tier": selected
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+
+    @timed_method("generate_structured")
+    async def generate_structured(self, original_text: str, original_criteria: Dict[str, str] = None, context: Dict[str, str] = None,
+                                  num_options: int = 3, regenerate: bool = False) -> Dict[str, Any]:
+        """문장 옵션과 옵션별 4단계 평가기준을 한 번에 생성 (순서는 TextImprover._structured_calls를 따르고 요청만 비동기로 보냄)"""
+        try:
+            prompt, cache_key = self._structured_request(original_text, original_criteria or {}, context, num_options)
+            cached = self._structured_cached(original_text, cache_key, regenerate, num_options)
+            if cached is not None:
+                return cached
+
+            calls = self._structured_calls(original_text, prompt, cache_key, num_options)
+            request = next(calls)
+            while True:
+                try:
+                    request = calls.send(await self._complete_json(*request, temperature=0.7))
+                except StopIteration as done:
+                    return done.value
+
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
@@ -0,0 +1,298 @@
+"""
+HWP/PDF 평가 계획 문서를 한꺼번에 HTML과 표 JSONL로 바꾸는 일괄 변환기
+
+    python batch_convert.py 문서폴더 -o out
+    python batch_convert.py manifest.jsonl -o out --workers 4 --upstream-concurrency 6
+
+manifest.jsonl은 한 줄에 {"path": "문서 경로", "output": "결과 이름(선택)"} 형식이며,
+상대 경로는 manifest 파일 위치 기준입니다.
+결과:
+    out/<이름>.html        변환된 HTML (그림 포함)
+    out/tables.jsonl       문서별 평가요소/평가기준 표와 생성한 문장 옵션/평가기준 (한 줄에 표 하나)
+    out/checkpoint.sqlite3 진행 상황 (중단 후 같은 명령으로 다시 실행하면 끝난 문서는 건너뜀)
+"""
+import argparse
+import base64
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from dotenv import load_dotenv
+
+logger = logging.getLogger("upthon.batch")
+
+SUPPORTED_EXTENSIONS = (".hwp", ".pdf")
+
+# 기본 프로세스 수와 모든 프로세스를 합친 동시 업스트림 요청 수
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", 2))
+BATCH_UPSTREAM_CONCURRENCY = int(os.getenv("BATCH_UPSTREAM_CONCURRENCY", 4))
+
+CHECKPOINT_NAME = "checkpoint.sqlite3"
+TABLES_NAME = "tables.jsonl"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    source TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    status TEXT NOT NULL,
+    output TEXT,
+    result TEXT,
+    error TEXT,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+def file_digest(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def _output_name(relative_path: str) -> str:
+    """입력 경로에서 확장자를 뺀 결과 이름 (하위 폴더 구조는 유지)"""
+    return os.path.splitext(relative_path)[0].replace(os.sep, "/")
+
+
+def collect_inputs(source: str) -> List[Dict[str, str]]:
+    """
+    폴더(하위 폴더 포함) 또는 JSONL 목록에서 변환할 문서를 찾아 [{"path", "output"}]로 반환합니다.
+    """
+    if os.path.isdir(source):
+        inputs = []
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(SUPPORTED_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    inputs.append({"path": path, "output": _output_name(os.path.relpath(path, source))})
+        return inputs
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    inputs = []
+    with open(source, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            path = entry.get("path") or entry.get("file")
+            if not path:
+                raise ValueError(f"{source}:{line_number}: 'path'가 없습니다.")
+            path = path if os.path.isabs(path) else os.path.join(base_dir, path)
+            inputs.append({"path": path, "output": entry.get("output") or _output_name(os.path.basename(path))})
+    return inputs
+
+
+class Checkpoint:
+    def __init__(self, db_path: str):
+        """
+        문서별 변환 상태와 결과를 SQLite에 저장합니다. (메인 프로세스에서만 사용)
+        같은 경로의 문서가 바뀌면(해시가 다르면) 다시 변환합니다.
+        """
+        self._conn = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def is_done(self, source: str, digest: str) -> bool:
+        row = self._conn.execute("SELECT digest, status FROM files WHERE source = ?", (source,)).fetchone()
+        return row is not None and row["digest"] == digest and row["status"] == "done"
+
+    def record(self, source: str, digest: str, status: str, output: str = None,
+               result: Dict[str, Any] = None, error: str = None) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO files (source, digest, status, output, result, error, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (source, digest, status, output, json.dumps(result, ensure_ascii=False) if result is not None else None, error, time.time()))
+
+    def results(self, sources: List[str]) -> Iterator[sqlite3.Row]:
+        """sources 순서대로 끝난 문서의 기록을 반환합니다."""
+        for source in sources:
+            row = self._conn.execute("SELECT * FROM files WHERE source = ? AND status = 'done'", (source,)).fetchone()
+            if row is not None:
+                yield row
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def inline_figures(data: Dict[str, Any]) -> str:
+    """API 응답의 base64 그림을 data: URI로 HTML에 넣어, 서버 없이 열 수 있는 HTML을 만듭니다."""
+    from blob_store import CONTENT_TYPES, fill_figure_sources, sniff_extension
+
+    figure_urls = {}
+    for element in data.get("elements") or []:
+        encoded = element.get("base64_encoding")
+        if encoded:
+            content_type = CONTENT_TYPES.get(sniff_extension(base64.b64decode(encoded[:64])), "image/png")
+            figure_urls[str(element.get("id"))] = f"data:{content_type};base64,{encoded}"
+    return fill_figure_sources((data.get("content") or {}).get("html", ""), figure_urls)
+
+
+def _worker_init(limit, upstream_rates: Dict[str, float]) -> None:
+    """작업 프로세스 시작 시 동시 요청 제한과 프로세스별 속도 제한을 설정합니다."""
+    for name, rate in upstream_rates.items():
+        os.environ[f"UPSTREAM_{name.upper()}_RATE"] = str(rate)
+    from resilience import set_concurrency_limit
+    set_concurrency_limit(limit)
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING"))
+
+
+def convert_file(path: str, html_path: str, generate: bool, num_options: int, concurrency: int) -> Dict[str, Any]:
+    """
+    작업 프로세스에서 문서 하나를 분석해 HTML을 쓰고, 표마다 문장 옵션과 평가기준을 생성합니다.
+    반환값은 JSON으로 저장할 수 있는 결과 (HTML 본문 제외)
+    """
+    from document_analyzer import DocumentAnalyzer
+    from scheduler import scheduled
+    from table_extractor import extract_assessment_tables
+
+    with scheduled("bulk", "batch_convert"):
+        api_result = DocumentAnalyzer().analyze_document_chunked(path, os.path.basename(path))
+    if not api_result.get("success"):
+        return {"success": False, "error": str(api_result.get("error") or api_result.get("message"))}
+
+    data = api_result.get("data") or {}
+    html = inline_figures(data)
+    os.makedirs(os.path.dirname(html_path) or ".", exist_ok=True)
+    tmp_path = f"{html_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(html)
+    os.replace(tmp_path, html_path)
+
+    tables = extract_assessment_tables(html)
+    if generate:
+        from batch_improver import BatchImprover
+        items = [{
+            "id": index,
+            "evaluationElement": table["evaluation_element"],
+            "context": table["context"],
+            "originalCriteria": table["criteria"]
+        } for index, table in enumerate(tables) if table["evaluation_element"]]
+        if items:
+            for event in BatchImprover(concurrency=concurrency, structured=True, session_id="batch_convert").run(items, num_options):
+                if event["type"] == "result":
+                    event.pop("type")
+                    tables[event.pop("id")]["generated"] = event
+
+    return {
+        "success": True,
+        "pages": (data.get("usage") or {}).get("pages"),
+        "cached": api_result.get("cached", False),
+        "local": api_result.get("local", False),
+        "tables": tables
+    }
+
+
+def write_tables(checkpoint: Checkpoint, sources: List[str], output_dir: str) -> int:
+    """끝난 문서의 표를 입력 순서대로 tables.jsonl에 씁니다. (다시 실행해도 중복 없이 새로 씀)"""
+    path = os.path.join(output_dir, TABLES_NAME)
+    count = 0
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        for row in checkpoint.results(sources):
+            result = json.loads(row["result"])
+            for table in result["tables"]:
+                f.write(json.dumps(dict(source=row["source"], html=row["output"], **table), ensure_ascii=False) + "\n")
+                count += 1
+    os.replace(f"{path}.tmp", path)
+    return count
+
+
+def _upstream_rates(workers: int) -> Dict[str, float]:
+    """서버 한 대와 같은 전체 속도가 되도록 업스트림별 초당 요청 수를 프로세스 수로 나눕니다."""
+    from resilience import UPSTREAM_DEFAULTS, get_upstream
+    return {name: get_upstream(name).bucket.rate / workers for name in UPSTREAM_DEFAULTS}
+
+
+def run(source: str, output_dir: str, workers: int = None, upstream_concurrency: int = None,
+        generate: bool = True, num_options: int = 3) -> Dict[str, int]:
+    """
+    문서를 프로세스 풀에서 변환합니다. 끝난 문서는 체크포인트에 기록하므로 중단 후 다시 실행하면 이어서 진행합니다.
+    upstream_concurrency: 모든 프로세스를 합쳐 동시에 보내는 Upstage 요청 수
+    """
+    workers = max(1, workers or BATCH_WORKERS)
+    upstream_concurrency = max(1, upstream_concurrency or BATCH_UPSTREAM_CONCURRENCY)
+    os.makedirs(output_dir, exist_ok=True)
+
+    inputs = collect_inputs(source)
+    checkpoint = Checkpoint(os.path.join(output_dir, CHECKPOINT_NAME))
+    summary = {"total": len(inputs), "skipped": 0, "succeeded": 0, "failed": 0}
+
+    pending: List[Tuple[Dict[str, str], str]] = []
+    for entry in inputs:
+        try:
+            digest = file_digest(entry["path"])
+        except OSError as e:
+            logger.error("❌ %s: %s", entry["path"], e)
+            checkpoint.record(entry["path"], "", "failed", error=str(e))
+            summary["failed"] += 1
+            continue
+        if checkpoint.is_done(entry["path"], digest):
+            summary["skipped"] += 1
+        else:
+            pending.append((entry, digest))
+
+    # 스레드를 쓰는 모듈을 fork로 복사하지 않도록 spawn으로 시작
+    context = multiprocessing.get_context("spawn")
+    limit = context.BoundedSemaphore(upstream_concurrency)
+    # 프로세스 하나가 생성 요청을 보낼 스레드 수 (전체 제한은 세마포어가 담당)
+    per_process = max(1, -(-upstream_concurrency // workers))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_worker_init,
+                             initargs=(limit, _upstream_rates(workers))) as executor:
+        futures = {}
+        for entry, digest in pending:
+            html_path = os.path.join(output_dir, f"{entry['output']}.html")
+            checkpoint.record(entry["path"], digest, "running", html_path)
+            future = executor.submit(convert_file, entry["path"], html_path, generate, num_options, per_process)
+            futures[future] = (entry, digest, html_path)
+
+        for future in as_completed(futures):
+            entry, digest, html_path = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"success": False, "error": str(e)}
+            if result.pop("success"):
+                checkpoint.record(entry["path"], digest, "done", html_path, result)
+                summary["succeeded"] += 1
+                logger.info("✅ %s → %s (표 %d개)", entry["path"], html_path, len(result["tables"]))
+            else:
+                checkpoint.record(entry["path"], digest, "failed", html_path, error=result.get("error"))
+                summary["failed"] += 1
+                logger.error("❌ %s: %s", entry["path"], result.get("error"))
+
+    summary["tables"] = write_tables(checkpoint, [entry["path"] for entry in inputs], output_dir)
+    checkpoint.close()
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="HWP/PDF 평가 계획 일괄 변환기")
+    parser.add_argument("source", help="문서 폴더 또는 JSONL 목록 파일")
+    parser.add_argument("-o", "--output", default="batch_output", help="결과 폴더")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="작업 프로세스 수")
+    parser.add_argument("--upstream-concurrency", type=int, default=BATCH_UPSTREAM_CONCURRENCY,
+                        help="모든 프로세스를 합친 동시 Upstage 요청 수")
+    parser.add_argument("--num-options", type=int, default=3, help="평가요소마다 만들 문장 옵션 수")
+    parser.add_argument("--no-generate", action="store_true", help="문장 옵션/평가기준을 생성하지 않고 변환만 함")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(message)s")
+    summary = run(args.source, args.output, args.workers, args.upstream_concurrency,
+                  not args.no_generate, args.num_options)
+    print(f"전체 {summary['total']}개: 성공 {summary['succeeded']}, 건너뜀 {summary['skipped']}, "
+          f"실패 {summary['failed']} (표 {summary['tables']}개 → {os.path.join(args.output, TABLES_NAME)})")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, Iterator, AsyncIterator, List
+from text_improver import TextImprover
+from async_text_improver import AsyncTextImprover
+from scheduler import current_schedule, scheduled
+
+# 동시에 보낼 수 있는 최대 LLM 요청 수 (Upstage 속도 제한 이하로 유지)
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", 4))
+
+
+class BatchImprover:
+    def __init__(self, improver: TextImprover = None, concurrency: int = None, structured: bool = False,
+                 session_id: str = None, priority: str = "bulk"):
+        """
+        문서 안의 모든 평가요소에 대해 문장 옵션과 평가기준을 동시에 생성하는 일괄 처리기
+        concurrency: 동시 처리 개수 (BATCH_MAX_CONCURRENCY를 넘을 수 없음)
+        structured: True이면 평가요소마다 구조화 출력 한 번으로 옵션과 옵션별 평가기준을 함께 생성
+        session_id, priority: 업스트림 요청 대기열 (지정하지 않은 세션은 만든 쪽의 세션, 우선순위는 bulk)
+        """
+        self.improver = improver or TextImprover()
+        self.concurrency = max(1, min(concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+        self.structured = structured
+        self.session_id = session_id or current_schedule()[1]
+        self.priority = priority
+
+    def _scheduled_item(self, item: Dict[str, Any], num_options: int) -> Dict[str, Any]:
+        with scheduled(self.priority, self.session_id):
+            return self.process_item(item, num_options)
+
+    def process_item(self, item: Dict[str, Any], num_options: int = 3) -> Dict[str, Any]:
+        """
+        평가요소 하나에 대해 문장 옵션을 만들고, 첫 번째 옵션 기준으로 4단계 평가기준을 생성
+        """
+        evaluation_element = item.get("evaluationElement", "")
+        context = item.get("context")
+        original_criteria = item.get("originalCriteria", {}) or {}
+
+        result = {"id": item.get("id"), "evaluationElement": evaluation_element}
+        if not evaluation_element:
+            result.update({"success": False, "error": "평가요소가 비어 있습니다."})
+            return result
+
+        if self.structured:
+            structured_result = self.improver.generate_structured(evaluation_element, original_criteria, context, num_options)
+            result.update(self._structured_fields(structured_result))
+            return result
+
+        options_result = self.improver.generate_text_options(evaluation_element, context, num_options, tier="full")
+        if not options_result.get("success"):
+            result.update({"success": False, "error": options_result.get("error")})
+            return result
+
+        options = options_result["options"]
+        criteria_result = self.improver.generate_evaluation_criteria(options[0], original_criteria, context, tier="full")
+
+        result.update(self._success_fields(options, criteria_result))
+        return result
+
+    @staticmethod
+    def _success_fields(options: List[str], criteria_result: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "success": True,
+            "options": options,
+            "criteria_for": options[0],
+            "criteria": criteria_result.get("criteria", {}) if criteria_result.get("success") else {},
+            "criteria_error": None if criteria_result.get("success") else criteria_result.get("error")
+        }
+
+    @staticmethod
+    def _structured_fields(structured_result: Dict[str, Any]) -> Dict[str, Any]:
+        if not structured_result.get("success"):
+            return {"success": False, "error": structured_result.get("error")}
+        return {
+            "success": True,
+            "options": structured_result["options"],
+            "criteria_for": structured_result["criteria_for"],
+            "criteria": structured_result["criteria"],
+            "criteria_by_option": structured_result["criteria_by_option"],
+            "criteria_error": "일부 평가기준을 생성하지 못했습니다." if structured_result.get("missing") else None,
+            "usage": structured_result.get("usage"),
+            "calls": structured_result.get("calls")
+        }
+
+    def run(self, items: List[Dict[str, Any]], num_options: int = 3) -> Iterator[Dict[str, Any]]:
+        """
+        모든 항목을 스레드 풀에서 처리하고, 끝나는 순서대로 결과 이벤트를 돌려줍니다.
+        """
+        succeeded = 0
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch-improver")
+        try:
+            futures = {
+                executor.submit(self._scheduled_item, item, num_options): index
+                for index, item in enumerate(items)
+            }
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {"id": items[futures[future]].get("id"), "success": False, "error": str(e)}
+                if result.get("success"):
+                    succeeded += 1
+                yield {"type": "result", **result}
+
+            yield {
+                "type": "done",
+                "total": len(items),
+                "succeeded": succeeded,
+                "failed": len(items) - succeeded
+            }
+        finally:
+            # 클라이언트 연결이 끊겨 제너레이터가 닫히면 남은 작업은 취소
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+class AsyncBatchImprover(BatchImprover):
+    def __init__(self, improver: AsyncTextImprover = None, concurrency: int = None, structured: bool = False,
+                 session_id: str = None, priority: str = "bulk"):
+        """
+        BatchImprover의 비동기 버전 (스레드 대신 세마포어로 동시 처리 개수 제한)
+        """
+        super().__init__(improver or AsyncTextImprover(), concurrency, structured, session_id, priority)
+
+    async def process_item(self, item: Dict[str, Any], num_options: int = 3) -> Dict[str, Any]:
+        evaluation_element = item.get("evaluationElement", "")
+        context = item.get("context")
+        original_criteria = item.get("originalCriteria", {}) or {}
+
+        result = {"id": item.get("id"), "evaluationElement": evaluation_element}
+        if not evaluation_element:
+            result.update({"success": False, "error": "평가요소가 비어 있습니다."})
+            return result
+
+        if self.structured:
+            structured_result = await self.improver.generate_structured(evaluation_element, original_criteria, context, num_options)
+            result.update(self._structured_fields(structured_result))
+            return result
+
+        options_result = await self.improver.generate_text_options(evaluation_element, context, num_options, tier="full")
+        if not options_result.get("success"):
+            result.update({"success": False, "error": options_result.get("error")})
+            return result
+
+        options = options_result["options"]
+        criteria_result = await self.improver.generate_evaluation_criteria(options[0], original_criteria, context, tier="full")
+
+        result.update(self._success_fields(options, criteria_result))
+        return result
+
+    async def run(self, items: List[Dict[str, Any]], num_options: int = 3) -> AsyncIterator[Dict[str, Any]]:
+        """모든 항목을 동시에 처리하고, 끝나는 순서대로 결과 이벤트를 돌려줍니다."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def limited(index: int, item: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    with scheduled(self.priority, self.session_id):
+                        return await self.process_item(item, num_options)
+                except Exception as e:
+                    return {"id": items[index].get("id"), "success": False, "error": str(e)}
+
+        succeeded = 0
+        tasks = [asyncio.create_task(limited(index, item)) for index, item in enumerate(items)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                if result.get("success"):
+                    succeeded += 1
+                yield {"type": "result", **result}
+
+            yield {
+                "type": "done",
+                "total": len(items),
+                "succeeded": succeeded,
+                "failed": len(items) - succeeded
+            }
+        finally:
+            # 클라이언트 연결이 끊기면 남은 작업은 취소
+            for task in tasks:
+                task.cancel()
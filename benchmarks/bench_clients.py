@@ -0,0 +1,77 @@
+"""
+요청마다 클라이언트를 새로 만드는 방식과 공용 클라이언트를 재사용하는 방식의
+호출당 지연 시간을 로컬 스텁 서버로 비교합니다.
+
+    python benchmarks/bench_clients.py --calls 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import requests
+from openai import OpenAI
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_server import start_stub_server
+from http_clients import get_http_session, get_openai_client
+
+
+def measure(label, func, calls):
+    """func를 calls번 호출해 호출당 지연 시간(ms)을 출력하고 평균을 반환합니다."""
+    func()  # 워밍업
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    mean = statistics.mean(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{label:<28} mean {mean:7.3f} ms   p50 {statistics.median(samples):7.3f} ms   p95 {p95:7.3f} ms")
+    return mean
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP/LLM 클라이언트 재사용 벤치마크")
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    server = start_stub_server()
+    base_url = f"http://127.0.0.1:{server.server_port}/v1"
+    parse_url = f"{base_url}/document-digitization"
+    files = {"document": ("exam_sample.hwp", b"x" * 64 * 1024)}
+    messages = [{"role": "user", "content": "평가요소 문장"}]
+
+    print(f"스텁 서버: {base_url}, 호출 {args.calls}회\n")
+
+    def parse_fresh():
+        requests.post(parse_url, files=files).json()
+
+    def parse_shared():
+        get_http_session().post(parse_url, files=files).json()
+
+    def chat_fresh():
+        client = OpenAI(api_key="stub", base_url=base_url)
+        client.chat.completions.create(model="solar-pro2", messages=messages)
+        client.close()
+
+    def chat_shared():
+        get_openai_client("stub", base_url).chat.completions.create(model="solar-pro2", messages=messages)
+
+    fresh = measure("document-parse (매번 연결)", parse_fresh, args.calls)
+    shared = measure("document-parse (공용 세션)", parse_shared, args.calls)
+    print(f"  → 호출당 {fresh - shared:.3f} ms 절약\n")
+
+    fresh = measure("chat (매번 클라이언트 생성)", chat_fresh, args.calls)
+    shared = measure("chat (공용 클라이언트)", chat_shared, args.calls)
+    print(f"  → 호출당 {fresh - shared:.3f} ms 절약")
+    print("\n※ 스텁은 평문 HTTP이므로 실제 HTTPS 환경에서는 TLS 핸드셰이크만큼 차이가 더 커집니다.")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
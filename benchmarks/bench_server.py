@@ -0,0 +1,271 @@
+"""
+app_simple.py 서버를 로컬 스텁 Upstage API에 연결해 부하 시나리오별 지연 시간, 처리량, 최대 메모리를 측정합니다.
+API 키나 네트워크 없이 실행할 수 있습니다.
+
+    python benchmarks/bench_server.py
+    python benchmarks/bench_server.py --scenarios upload,options --requests 200 --concurrency 16
+    python benchmarks/bench_server.py --latency 0.2 --error-rate 0.05 --save baseline.json
+    python benchmarks/bench_server.py --compare baseline.json --tolerance 0.2   # p95/처리량이 20% 넘게 나빠지면 종료 코드 1
+
+시나리오
+  upload   exam_sample.hwp 크기의 문서를 동시에 업로드 (/api/analyze-document)
+  options  평가요소마다 '새로운 문장 생성'을 동시에 요청 (/api/generate-text-options)
+  figures  그림이 많은 큰 분석 결과를 동시에 업로드 (스텁 응답에 --big-figures개 x --big-figure-bytes 바이트 그림)
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.stub_server import start_stub_server
+
+SAMPLE_PATH = os.path.join(ROOT, "exam_sample.hwp")
+SCENARIOS = ("upload", "options", "figures")
+
+# 서버 프로세스 실행 코드 (디버그 리로더 없이 스레드 모드로 실행)
+SERVER_CODE = "import app_simple; app_simple.app.run(host='127.0.0.1', port={port}, threaded=True, debug=False)"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def read_rss(pid: int, field: str) -> int:
+    """/proc에서 프로세스 메모리(KB)를 읽습니다. (VmRSS: 현재, VmHWM: 최대) 리눅스가 아니면 0"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+class ServerProcess:
+    def __init__(self, stub_url: str, workdir: str, upstream_rate: float = 0.0, local_hwp: bool = False):
+        """
+        스텁 서버를 바라보는 app_simple.py를 별도 프로세스로 실행합니다. 캐시/작업 DB는 임시 폴더를 사용
+        upstream_rate: 업스트림 초당 요청 제한 (0이면 제한 없음 - 서버 자체의 처리량을 측정)
+        local_hwp: HWP 문서를 직접 읽을지 여부 (기본은 원격 API 경로를 측정)
+        """
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        env = dict(
+            os.environ,
+            UPSTAGE_BASE_URL=stub_url,
+            UPSTAGE_API_KEY="stub",
+            PARSE_CACHE_DIR=os.path.join(workdir, "parse_cache"),
+            BLOB_STORE_DIR=os.path.join(workdir, "blobs"),
+            JOB_DB_PATH=os.path.join(workdir, "jobs.sqlite3"),
+            PREFETCH_TABLES="0",
+            UPSTREAM_DOCUMENT_RATE=str(upstream_rate),
+            UPSTREAM_CHAT_RATE=str(upstream_rate),
+            HWP_LOCAL_PARSE=str(local_hwp).lower(),
+            LOG_LEVEL="WARNING"
+        )
+        self.process = subprocess.Popen([sys.executable, "-c", SERVER_CODE.format(port=self.port)],
+                                        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self._wait_ready()
+
+    def _wait_ready(self, timeout: float = 30.0) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError("서버 프로세스가 시작하지 못했습니다.")
+            try:
+                requests.get(f"{self.url}/api/health", timeout=1)
+                return
+            except requests.RequestException:
+                time.sleep(0.1)
+        raise RuntimeError("서버가 제한 시간 안에 준비되지 않았습니다.")
+
+    def rss_kb(self) -> int:
+        return read_rss(self.process.pid, "VmRSS")
+
+    def peak_rss_kb(self) -> int:
+        return read_rss(self.process.pid, "VmHWM")
+
+    def stop(self) -> None:
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def percentile(samples, fraction: float) -> float:
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, max(0, int(round(fraction * len(samples))) - 1))
+    return samples[index]
+
+
+def run_load(name: str, server: ServerProcess, make_request, total: int, concurrency: int):
+    """make_request(session, i)를 total번, concurrency개 스레드로 실행하고 지연 시간 통계를 반환합니다."""
+    local = threading.local()
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def one(i):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            response = make_request(session, i)
+            ok = response.status_code < 400 and response.json().get("success", True) is not False
+        except (requests.RequestException, ValueError):
+            ok = False
+        elapsed = time.perf_counter() - started
+        with lock:
+            (latencies if ok else errors).append(elapsed)
+
+    peak = [server.rss_kb()]
+    stop = threading.Event()
+
+    def sample_rss():
+        while not stop.wait(0.05):
+            peak[0] = max(peak[0], server.rss_kb())
+
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    sampler.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(total)))
+    wall = time.perf_counter() - started
+    stop.set()
+    sampler.join()
+
+    latencies.sort()
+    return {
+        "scenario": name,
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "throughput_rps": round(total / wall, 2) if wall else 0.0,
+        "peak_rss_mb": round(max(peak[0], server.peak_rss_kb()) / 1024, 1)
+    }
+
+
+def upload_request(server: ServerProcess, sample: bytes):
+    def make_request(session, i):
+        # 매번 다른 문서가 되도록 끝에 요청 번호를 붙여 분석 캐시를 피함
+        document = sample + f"\n#bench-{time.time_ns()}-{i}".encode()
+        files = {"file": ("exam_sample.hwp", document, "application/octet-stream")}
+        return session.post(f"{server.url}/api/analyze-document", files=files, timeout=300)
+    return make_request
+
+
+def options_request(server: ServerProcess):
+    context = {"grade": "3", "semester": "1", "subject": "국어"}
+
+    def make_request(session, i):
+        # 평가요소 문장이 모두 달라 생성 결과 캐시에 적중하지 않음
+        body = {"text": f"비유하는 표현의 특징을 알고 표현의 효과를 설명하기 {time.time_ns()}-{i}", "context": context}
+        return session.post(f"{server.url}/api/generate-text-options", json=body, timeout=300)
+    return make_request
+
+
+def print_report(results):
+    header = f"{'scenario':<10}{'requests':>9}{'conc':>6}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}{'peak RSS MB':>13}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['scenario']:<10}{r['requests']:>9}{r['concurrency']:>6}{r['errors']:>8}{r['p50_ms']:>10.2f}"
+              f"{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['throughput_rps']:>9.2f}{r['peak_rss_mb']:>13.1f}")
+
+
+def compare(results, baseline_path: str, tolerance: float) -> bool:
+    """기준 결과보다 p95 지연 시간이나 처리량이 tolerance 비율 넘게 나빠진 시나리오가 있으면 False"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {r["scenario"]: r for r in json.load(f)["results"]}
+    ok = True
+    for r in results:
+        base = baseline.get(r["scenario"])
+        if base is None:
+            continue
+        checks = [
+            ("p95_ms", r["p95_ms"] > base["p95_ms"] * (1 + tolerance)),
+            ("throughput_rps", r["throughput_rps"] < base["throughput_rps"] * (1 - tolerance)),
+            ("peak_rss_mb", r["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance))
+        ]
+        for field, regressed in checks:
+            if regressed:
+                ok = False
+                print(f"⚠️  {r['scenario']} {field}: {base[field]} → {r[field]}")
+    print("기준 대비 회귀 없음" if ok else f"기준 대비 회귀 발견 (허용 {tolerance:.0%})")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="app_simple.py 부하 벤치마크 (로컬 스텁 API 사용)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"실행할 시나리오 ({', '.join(SCENARIOS)})")
+    parser.add_argument("--requests", type=int, default=100, help="시나리오별 요청 수")
+    parser.add_argument("--concurrency", type=int, default=8, help="동시 요청 수")
+    parser.add_argument("--latency", type=float, default=0.05, help="스텁 응답 지연(초)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="스텁 오류 응답 비율 (0~1)")
+    parser.add_argument("--upstream-rate", type=float, default=0.0,
+                        help="서버의 업스트림 초당 요청 제한 (기본 0: 제한 없음, 실제 설정을 재현하려면 지정)")
+    parser.add_argument("--local-hwp", action="store_true", help="HWP 문서를 서버에서 직접 읽는 경로로 측정")
+    parser.add_argument("--big-figures", type=int, default=40, help="figures 시나리오의 그림 개수")
+    parser.add_argument("--big-figure-bytes", type=int, default=200 * 1024, help="figures 시나리오의 그림 하나 크기(바이트)")
+    parser.add_argument("--save", help="결과를 JSON으로 저장할 경로")
+    parser.add_argument("--compare", help="비교할 기준 결과 JSON 경로")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="회귀로 판단할 비율")
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"알 수 없는 시나리오: {', '.join(sorted(unknown))}")
+
+    with open(SAMPLE_PATH, "rb") as f:
+        sample = f.read()
+
+    results = []
+    for name in scenarios:
+        # 시나리오마다 스텁/서버/캐시를 새로 만들어 서로 영향을 주지 않게 함
+        big = name == "figures"
+        stub = start_stub_server(latency=args.latency, error_rate=args.error_rate,
+                                 figures=args.big_figures if big else 1, figure_bytes=args.big_figure_bytes if big else 0)
+        workdir = tempfile.mkdtemp(prefix="upthon-bench-")
+        server = ServerProcess(f"http://127.0.0.1:{stub.server_port}/v1", workdir, args.upstream_rate, args.local_hwp)
+        try:
+            make_request = options_request(server) if name == "options" else upload_request(server, sample)
+            results.append(run_load(name, server, make_request, args.requests, args.concurrency))
+        finally:
+            server.stop()
+            stub.shutdown()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\n스텁 지연 {args.latency}s, 오류 비율 {args.error_rate:.0%}, 요청 {args.requests}회 x 동시 {args.concurrency}\n")
+    print_report(results)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"\n결과 저장: {args.save}")
+    if args.compare and not compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
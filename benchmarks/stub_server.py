@@ -0,0 +1,225 @@
+"""
+Upstage API를 흉내 내는 로컬 스텁 서버 (벤치마크용)
+
+    python benchmarks/stub_server.py --port 8089 --latency 0.05
+    python benchmarks/stub_server.py --error-rate 0.05 --figures 40 --figure-bytes 200000 --html-bytes 500000
+"""
+import argparse
+import base64
+import json
+import random
+import re
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CRITERIA_LEVELS = ['매우잘함', '잘함', '보통', '노력요함']
+
+# 1x1 PNG (그림 요소용)
+STUB_FIGURE = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=="
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # keep-alive 연결 재사용이 가능하도록 HTTP/1.1 사용
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    stream_interval = 0.0
+    # 이 비율만큼 error_status로 응답 (Retry-After: 0 포함)
+    error_rate = 0.0
+    error_status = 503
+    # 문서 분석 응답 크기: 그림 개수, 그림 하나의 크기(바이트), HTML 본문에 덧붙일 길이(문자)
+    figures = 1
+    figure_bytes = 0
+    html_bytes = 0
+    _document_payloads = None
+    # 받은 문서의 페이지 번호 목록 (증분 분석 확인용)
+    received_pages = None
+
+    def setup(self):
+        super().setup()
+        # 헤더/본문 분할 전송 시 Nagle + delayed ACK로 40ms 지연이 생기지 않도록 설정
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length)
+        time.sleep(self.latency)
+
+        if self.error_rate and random.random() < self.error_rate:
+            self._send_error_status()
+            return
+
+        if self.path.endswith("/document-digitization"):
+            pages = self._count_pages(raw)
+            if self.received_pages is not None:
+                self.received_pages.append(pages)
+            self._send_json(self._document_body(pages))
+            return
+        if self.path.endswith("/chat/completions"):
+            request_body = json.loads(raw or b"{}")
+            content = self._chat_content(request_body)
+            if request_body.get("stream"):
+                self._send_chat_stream(content)
+                return
+            body = {
+                "id": "stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": "solar-pro2",
+                "choices": [{
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": content}
+                }],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20}
+            }
+        else:
+            self.send_error(404)
+            return
+
+        self._send_json(json.dumps(body, ensure_ascii=False).encode("utf-8"))
+
+    def _send_json(self, payload: bytes, status: int = 200, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_error_status(self):
+        payload = json.dumps({"error": {"message": "stub error", "code": self.error_status}}).encode("utf-8")
+        self._send_json(payload, self.error_status, {"Retry-After": "0"})
+
+    @staticmethod
+    def _count_pages(raw: bytes) -> int:
+        """업로드된 PDF의 페이지 수 (PDF가 아니면 1)"""
+        return max(1, len(re.findall(rb"/Type\s*/Page(?![a-zA-Z])", raw)))
+
+    @classmethod
+    def _document_body(cls, pages: int = 1) -> bytes:
+        """문서 분석 응답 (설정과 페이지 수가 같으면 매번 같으므로 한 번만 만들어 재사용)"""
+        if cls._document_payloads is None:
+            cls._document_payloads = {}
+        if pages not in cls._document_payloads:
+            figure = base64.b64decode(STUB_FIGURE)
+            # PNG 뒤에 채움 바이트를 붙여 원하는 크기의 그림을 만듦
+            figure_base64 = base64.b64encode(figure + b"\0" * max(0, cls.figure_bytes - len(figure))).decode("ascii")
+            figure_ids = range(2, 2 + cls.figures)
+            elements = [{"id": 0, "page": 1, "category": "heading1", "content": {"html": "<h1 id='0'>stub</h1>"}},
+                        {"id": 1, "page": 1, "category": "table",
+                         "content": {"html": "<table id='1'><tr><td>평가요소</td><td>비유하는 표현 알기</td></tr></table>"}}]
+            elements += [{"id": i, "page": 1, "category": "figure", "base64_encoding": figure_base64,
+                          "content": {"html": f"<figure id='{i}'><img alt='그림'/></figure>"}} for i in figure_ids]
+            if cls.html_bytes:
+                elements.append({"id": len(elements), "page": 1, "category": "paragraph",
+                                 "content": {"html": f"<p id='{len(elements)}'>{'가' * cls.html_bytes}</p>"}})
+            for page in range(2, pages + 1):
+                elements.append({"id": len(elements), "page": page, "category": "paragraph",
+                                 "content": {"html": f"<p id='{len(elements)}'>{page}쪽</p>"}})
+            body = {
+                "api": "2.0",
+                "model": "document-parse-stub",
+                "content": {"html": "\n".join(element["content"]["html"] for element in elements)},
+                "elements": elements,
+                "usage": {"pages": pages}
+            }
+            cls._document_payloads[pages] = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        return cls._document_payloads[pages]
+
+    @staticmethod
+    def _fake_from_schema(schema, name=""):
+        """JSON 스키마를 만족하는 가짜 값을 만듭니다. (구조화 출력용)"""
+        kind = schema.get("type")
+        if kind == "object":
+            # 배열 안의 객체는 문장(text)에 몇 번째 항목인지 표시
+            return {key: StubHandler._fake_from_schema(value, name if key == "text" else key)
+                    for key, value in schema.get("properties", {}).items()}
+        if kind == "array":
+            count = schema.get("minItems", 1)
+            return [StubHandler._fake_from_schema(schema.get("items", {}), f"{name} {i + 1}") for i in range(count)]
+        if kind in ("integer", "number"):
+            return 1
+        if kind == "boolean":
+            return True
+        if name in CRITERIA_LEVELS:
+            return f"비유하는 표현을 {name} 수준으로 이해함"
+        return f"비유하는 표현을 이해하기 ({name})"
+
+    @staticmethod
+    def _chat_content(request_body):
+        """프롬프트 종류에 맞는 형식의 가짜 응답 문장을 만듭니다."""
+        response_format = request_body.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            schema = response_format.get("json_schema", {}).get("schema", {})
+            return json.dumps(StubHandler._fake_from_schema(schema), ensure_ascii=False)
+        prompt = request_body.get("messages", [{}])[-1].get("content", "")
+        if "4단계 평가기준" in prompt:
+            return "\n".join(f"{level}: 비유하는 표현을 {level} 수준으로 이해함" for level in CRITERIA_LEVELS)
+        if "가지 서로 다른 버전" in prompt:
+            return "\n".join(f"비유하는 표현을 이해하기 {i}" for i in range(1, 4))
+        return "비유하는 표현을 이해하기"
+
+    def _send_chat_stream(self, content):
+        """chat.completion.chunk 형식의 SSE 스트림으로 응답을 몇 글자씩 나누어 보냅니다."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write_chunk(data: bytes):
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        for start in range(0, len(content), 8):
+            chunk = {
+                "id": "stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": "solar-pro2",
+                "choices": [{"index": 0, "delta": {"content": content[start:start + 8]}, "finish_reason": None}]
+            }
+            write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            time.sleep(self.stream_interval)
+        write_chunk(b"data: [DONE]\n\n")
+        write_chunk(b"")
+
+
+def start_stub_server(port: int = 0, latency: float = 0.0, error_rate: float = 0.0, error_status: int = 503,
+                      figures: int = 1, figure_bytes: int = 0, html_bytes: int = 0) -> ThreadingHTTPServer:
+    """백그라운드 스레드에서 스텁 서버를 시작하고 서버 객체를 반환합니다."""
+    handler = type("ConfiguredStubHandler", (StubHandler,), {
+        "latency": latency, "error_rate": error_rate, "error_status": error_status,
+        "figures": figures, "figure_bytes": figure_bytes, "html_bytes": html_bytes,
+        "_document_payloads": None, "received_pages": []
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upstage API 스텁 서버")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.0, help="응답 지연(초)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="오류로 응답할 비율 (0~1)")
+    parser.add_argument("--error-status", type=int, default=503, help="오류 응답 상태 코드")
+    parser.add_argument("--figures", type=int, default=1, help="문서 분석 응답의 그림 개수")
+    parser.add_argument("--figure-bytes", type=int, default=0, help="그림 하나의 크기(바이트)")
+    parser.add_argument("--html-bytes", type=int, default=0, help="HTML 본문에 덧붙일 길이(문자)")
+    args = parser.parse_args()
+
+    server = start_stub_server(args.port, args.latency, args.error_rate, args.error_status,
+                               args.figures, args.figure_bytes, args.html_bytes)
+    print(f"스텁 서버 실행 중: http://127.0.0.1:{server.server_port}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
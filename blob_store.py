@@ -0,0 +1,162 @@
+import base64
+import copy
+import hashlib
+import os
+import re
+import threading
+import time
+from typing import Dict, Any, Optional
+from disk_budget import DiskBudget
+
+DEFAULT_BLOB_DIR = os.getenv("BLOB_STORE_DIR", os.path.join(".cache", "blobs"))
+DEFAULT_BLOB_MAX_BYTES = int(os.getenv("BLOB_STORE_MAX_BYTES", 1024 * 1024 * 1024))  # 1GB
+# 마지막으로 분석 결과에 쓰인 뒤 보관하는 기간 (초, 분석 결과 캐시보다 짧으면 캐시된 결과의 그림이 사라짐)
+DEFAULT_BLOB_MAX_AGE = int(os.getenv("BLOB_STORE_MAX_AGE", 7 * 24 * 60 * 60))  # 7일
+
+# 이미지 확장자 ↔ MIME 타입
+CONTENT_TYPES = {
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "gif": "image/gif",
+    "webp": "image/webp",
+    "bmp": "image/bmp"
+}
+
+DATA_URI_RE = re.compile(r'data:(image/[a-zA-Z0-9.+-]+);base64,([A-Za-z0-9+/=\s]+)')
+# src가 없는 <figure id=N><img> (그룹 1: img 태그 이름까지, 그룹 2: figure의 id)
+FIGURE_IMG_RE = re.compile(r'(<figure\b[^>]*?\sid=[\'"]?([^\'"\s>]+)[\'"]?[^>]*>\s*<img\b)(?![^>]*\bsrc=)')
+
+
+def sniff_extension(data: bytes) -> str:
+    """이미지 바이트의 시그니처로 확장자를 추정합니다."""
+    if data.startswith(b"\x89PNG"):
+        return "png"
+    if data.startswith(b"\xff\xd8"):
+        return "jpg"
+    if data.startswith(b"GIF8"):
+        return "gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    if data.startswith(b"BM"):
+        return "bmp"
+    return "png"
+
+
+class BlobStore:
+    def __init__(self, blob_dir: str = None, max_bytes: int = DEFAULT_BLOB_MAX_BYTES, max_age: int = DEFAULT_BLOB_MAX_AGE):
+        """
+        내용의 SHA-256 해시를 이름으로 파일을 한 번만 저장하는 저장소 (문서 속 그림 등)
+        max_bytes: 전체 용량 상한 (넘으면 오래 안 쓴 파일부터 삭제), max_age: 마지막으로 저장(참조)된 뒤 보관하는 기간(초)
+        """
+        self.blob_dir = blob_dir or DEFAULT_BLOB_DIR
+        self.budget = DiskBudget(self.blob_dir, max_bytes, max_age,
+                                 suffixes=tuple(f".{extension}" for extension in CONTENT_TYPES))
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+    def _path(self, digest: str, extension: str) -> str:
+        return os.path.join(self.blob_dir, digest[:2], f"{digest}.{extension}")
+
+    def put(self, data: bytes, extension: str = None) -> str:
+        """
+        바이트를 저장하고 '해시.확장자' 형태의 이름을 반환합니다.
+        이미 있으면 다시 쓰지 않고 보관 기간만 새로 시작합니다. (새 분석 결과가 다시 참조하므로)
+        """
+        extension = extension or sniff_extension(data)
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest, extension)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self.budget.added(len(data))
+        return f"{digest}.{extension}"
+
+    def path_for(self, name: str) -> Optional[str]:
+        """'해시.확장자' 이름에 해당하는 파일 경로를 반환합니다. 없거나 이름이 잘못되었으면 None"""
+        match = re.fullmatch(r'([0-9a-f]{64})\.([a-z]+)', name or "")
+        if not match or match.group(2) not in CONTENT_TYPES:
+            return None
+        path = self._path(match.group(1), match.group(2))
+        try:
+            # 최근 사용 시각 갱신 (용량 초과 시 오래 안 쓴 파일부터 삭제)
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+        except FileNotFoundError:
+            return None
+        return path
+
+    def stats(self) -> Dict[str, Any]:
+        """저장된 파일 수와 용량(추정치)을 반환합니다."""
+        return self.budget.usage()
+
+
+def fill_figure_sources(html: str, figure_urls: Dict[str, str]) -> str:
+    """
+    HTML의 <figure id=N><img>에 src가 없으면 {요소 id: 그림 주소}의 주소를 채웁니다.
+    HTML을 한 번만 훑으며, 같은 id의 figure가 여러 번 나오면 처음 것만 채웁니다.
+    """
+    if not figure_urls:
+        return html
+    remaining = dict(figure_urls)
+
+    def fill(match):
+        url = remaining.pop(match.group(2), None)
+        return match.group(0) if url is None else f'{match.group(1)} src="{url}"'
+
+    return FIGURE_IMG_RE.sub(fill, html)
+
+
+def externalize_figures(data: Dict[str, Any], store: BlobStore, url_prefix: str) -> Dict[str, Any]:
+    """
+    API 응답 속 base64 그림을 BlobStore에 저장하고 URL로 바꾼 사본을 반환합니다.
+    - elements[*].base64_encoding → elements[*].figure_url
+    - HTML 안의 data: URI → 그림 URL
+    - HTML의 <figure id=N><img>에 src가 없으면 해당 그림 URL을 채움
+    """
+    data = copy.copy(data)
+    figure_urls = {}
+
+    elements = []
+    for element in data.get("elements") or []:
+        encoded = element.get("base64_encoding")
+        if encoded:
+            element = dict(element)
+            name = store.put(base64.b64decode(encoded))
+            element.pop("base64_encoding")
+            element["figure_url"] = f"{url_prefix}/{name}"
+            figure_urls[str(element.get("id"))] = element["figure_url"]
+        elements.append(element)
+    if "elements" in data:
+        data["elements"] = elements
+
+    content = data.get("content")
+    if content and content.get("html"):
+        html = content["html"]
+
+        def replace_data_uri(match):
+            raw = base64.b64decode(re.sub(r'\s+', '', match.group(2)))
+            extension = match.group(1).split('/')[-1].replace('jpeg', 'jpg')
+            return f"{url_prefix}/{store.put(raw, extension if extension in CONTENT_TYPES else None)}"
+
+        html = DATA_URI_RE.sub(replace_data_uri, html)
+
+        data["content"] = dict(content, html=fill_figure_sources(html, figure_urls))
+
+    return data
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_default_blob_store() -> BlobStore:
+    """프로세스 전체에서 공유하는 기본 저장소를 반환합니다."""
+    global _default_store
+    if _default_store is None:
+        with _default_store_lock:
+            if _default_store is None:
+                _default_store = BlobStore()
+    return _default_store
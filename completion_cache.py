@@ -0,0 +1,266 @@
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from typing import Dict, Any, Optional, FrozenSet, Tuple
+
+# 기본 캐시 설정 (환경변수로 변경 가능)
+DEFAULT_MAX_ENTRIES = int(os.getenv("TEXT_CACHE_MAX_ENTRIES", 4096))
+DEFAULT_TTL = int(os.getenv("TEXT_CACHE_TTL", 24 * 60 * 60))  # 1일
+# 유사 문장 단계는 기본적으로 띄어쓰기/문장부호만 다른 같은 문장일 때만 적중
+# 이 값(0~1)을 주면 n-gram 자카드 유사도가 그 이상인 다른 문장도 적중으로 인정 (선택, 기본 0 = 사용 안 함)
+#   주의: 한 단어만 다른 문장(예: '읽고' ↔ '쓰고')도 0.9 이상이 나오므로, 다른 문장의 결과를 돌려줄 수 있음
+DEFAULT_NEAR_THRESHOLD = float(os.getenv("TEXT_CACHE_NEAR_THRESHOLD", 0.0))
+# 한글은 음절 하나가 정보량이 많아 2글자 단위 n-gram을 사용
+DEFAULT_NGRAM = int(os.getenv("TEXT_CACHE_NGRAM", 2))
+
+# MinHash 서명 길이와 LSH 밴드 수 (밴드당 4개 값)
+MINHASH_PERMUTATIONS = 32
+LSH_BANDS = 8
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240901)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(MINHASH_PERMUTATIONS)]
+
+
+def normalize_prompt(text: str) -> str:
+    """유니코드 정규화(NFC) 후 연속된 공백을 하나로 줄입니다."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text or "")).strip()
+
+
+def compact_text(text: str) -> str:
+    """띄어쓰기 차이를 무시하도록 공백을 모두 지웁니다. ('영 역' → '영역')"""
+    return re.sub(r"\s+", "", unicodedata.normalize("NFC", text or ""))
+
+
+def canonical_text(text: str) -> str:
+    """띄어쓰기와 문장부호 차이를 무시하도록 공백/문장부호를 모두 지웁니다. ('영역, 읽기.' → '영역읽기')"""
+    return "".join(ch for ch in compact_text(text) if not unicodedata.category(ch).startswith("P"))
+
+
+def shingles(text: str, n: int = DEFAULT_NGRAM) -> FrozenSet[str]:
+    """공백을 지운 문자열의 글자 n-gram 집합"""
+    text = compact_text(text)
+    if len(text) <= n:
+        return frozenset([text])
+    return frozenset(text[i:i + n] for i in range(len(text) - n + 1))
+
+
+def minhash_bands(grams: FrozenSet[str]) -> Tuple[Tuple[int, ...], ...]:
+    """n-gram 집합의 MinHash 서명을 LSH 밴드로 나누어 반환합니다."""
+    hashes = [zlib.crc32(gram.encode("utf-8")) for gram in grams]
+    signature = [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+    rows = MINHASH_PERMUTATIONS // LSH_BANDS
+    return tuple(tuple(signature[i:i + rows]) for i in range(0, MINHASH_PERMUTATIONS, rows))
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class CompletionKey:
+    def __init__(self, method: str, key: str, scope: str = None, grams: FrozenSet[str] = None, canonical: str = None):
+        """
+        캐시 조회 키
+        key: 정규화한 프롬프트와 모델/파라미터의 해시 (정확히 일치하는 단계)
+        scope, canonical: 유사 문장 단계에서 쓰는 범위 해시(프롬프트 중 입력 문장을 뺀 부분)와 입력 문장의 공백/문장부호를 뺀 해시
+        grams: 입력 문장의 n-gram (near_threshold를 켠 경우에만)
+        """
+        self.method = method
+        self.key = key
+        self.scope = scope
+        self.grams = grams
+        self.canonical = canonical
+
+
+class _Entry:
+    __slots__ = ("value", "expires_at", "scope", "grams", "bands", "canonical")
+
+    def __init__(self, value: str, expires_at: float, scope: str, grams: FrozenSet[str], bands, canonical: str):
+        self.value = value
+        self.expires_at = expires_at
+        self.scope = scope
+        self.grams = grams
+        self.bands = bands
+        self.canonical = canonical
+
+
+class CompletionCache:
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: int = DEFAULT_TTL,
+                 near_threshold: float = DEFAULT_NEAR_THRESHOLD, ngram: int = DEFAULT_NGRAM):
+        """
+        LLM 응답을 프롬프트 기준으로 저장하는 메모리 캐시 (TTL + LRU)
+        1단계: 정규화한 프롬프트, 모델, 파라미터가 정확히 같으면 적중
+        2단계: 같은 범위(교육과정 정보, 수준 등)에서 입력 문장이 띄어쓰기/문장부호만 다르면 적중
+               near_threshold > 0이면 n-gram 유사도가 그 이상인 다른 문장도 적중 (선택)
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.near_threshold = near_threshold
+        self.ngram = ngram
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._index: Dict[Tuple[str, int, Tuple[int, ...]], set] = {}
+        # (범위, 공백/문장부호를 뺀 입력 문장) → 항목 키
+        self._canonical: Dict[Tuple[str, str], str] = {}
+        self._metrics: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def make_key(self, method: str, prompt: str, params: Dict[str, Any],
+                 similar_text: str = None, scope: str = None) -> CompletionKey:
+        """
+        조회 키를 만듭니다.
+        similar_text: 유사 문장 단계에서 비교할 입력 문장, scope: 그 문장을 뺀 나머지 프롬프트
+        """
+        hasher = hashlib.sha256(method.encode("utf-8"))
+        hasher.update(json.dumps(params, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        hasher.update(normalize_prompt(prompt).encode("utf-8"))
+        if similar_text is None:
+            return CompletionKey(method, hasher.hexdigest())
+
+        scope_hasher = hashlib.sha256(method.encode("utf-8"))
+        scope_hasher.update(json.dumps(params, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        scope_hasher.update(compact_text(scope or "").encode("utf-8"))
+        canonical = hashlib.sha256(canonical_text(similar_text).encode("utf-8")).hexdigest()
+        grams = shingles(similar_text, self.ngram) if self.near_threshold > 0 else None
+        return CompletionKey(method, hasher.hexdigest(), scope_hasher.hexdigest(), grams, canonical)
+
+    def _count(self, method: str, field: str) -> None:
+        metrics = self._metrics.setdefault(method, {"exact_hits": 0, "near_hits": 0, "misses": 0, "bypassed": 0})
+        metrics[field] += 1
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        if entry.canonical is not None and self._canonical.get((entry.scope, entry.canonical)) == key:
+            del self._canonical[(entry.scope, entry.canonical)]
+        if entry.bands is None:
+            return
+        for band_index, band in enumerate(entry.bands):
+            bucket = self._index.get((entry.scope, band_index, band))
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._index[(entry.scope, band_index, band)]
+
+    def _live(self, key: str, now: float) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at < now:
+            self._remove(key)
+            return None
+        return entry
+
+    def _find_similar(self, completion_key: CompletionKey, now: float) -> Optional[str]:
+        key = self._canonical.get((completion_key.scope, completion_key.canonical))
+        if key is not None and self._live(key, now) is not None:
+            return key
+        if completion_key.grams is None:
+            return None
+
+        candidates = set()
+        for band_index, band in enumerate(minhash_bands(completion_key.grams)):
+            candidates |= self._index.get((completion_key.scope, band_index, band), set())
+
+        best_key, best_score = None, self.near_threshold
+        for key in candidates:
+            entry = self._live(key, now)
+            if entry is None:
+                continue
+            score = jaccard(completion_key.grams, entry.grams)
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    def get(self, completion_key: CompletionKey, count: bool = True) -> Optional[str]:
+        """
+        캐시된 응답을 반환합니다. 없거나 만료되었으면 None
+        count: False이면 적중/미적중 횟수에 넣지 않음 (같은 요청에서 다시 조회할 키를 미리 확인할 때)
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._live(completion_key.key, now)
+            if entry is not None:
+                self._entries.move_to_end(completion_key.key)
+                if count:
+                    self._count(completion_key.method, "exact_hits")
+                return entry.value
+
+            if completion_key.canonical is not None:
+                similar_key = self._find_similar(completion_key, now)
+                if similar_key is not None:
+                    self._entries.move_to_end(similar_key)
+                    if count:
+                        self._count(completion_key.method, "near_hits")
+                    return self._entries[similar_key].value
+
+            if count:
+                self._count(completion_key.method, "misses")
+            return None
+
+    def bypass(self, completion_key: CompletionKey) -> None:
+        """'다시 생성' 요청처럼 캐시를 건너뛴 호출을 기록합니다."""
+        with self._lock:
+            self._count(completion_key.method, "bypassed")
+
+    def set(self, completion_key: CompletionKey, value: str) -> None:
+        """응답을 저장하고 용량을 넘으면 가장 오래 사용하지 않은 항목부터 삭제합니다."""
+        bands = minhash_bands(completion_key.grams) if completion_key.grams is not None else None
+        with self._lock:
+            self._remove(completion_key.key)
+            self._entries[completion_key.key] = _Entry(
+                value, time.time() + self.ttl, completion_key.scope, completion_key.grams, bands, completion_key.canonical)
+            if completion_key.canonical is not None:
+                self._canonical[(completion_key.scope, completion_key.canonical)] = completion_key.key
+            if bands is not None:
+                for band_index, band in enumerate(bands):
+                    self._index.setdefault((completion_key.scope, band_index, band), set()).add(completion_key.key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._index.clear()
+            self._canonical.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """메서드별 적중률과 현재 항목 수를 반환합니다."""
+        with self._lock:
+            methods = {}
+            for method, metrics in self._metrics.items():
+                lookups = metrics["exact_hits"] + metrics["near_hits"] + metrics["misses"]
+                methods[method] = dict(
+                    metrics,
+                    hit_rate=round((metrics["exact_hits"] + metrics["near_hits"]) / lookups, 4) if lookups else 0.0
+                )
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "near_threshold": self.near_threshold,
+                "methods": methods
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_text_cache() -> CompletionCache:
+    """프로세스 전체에서 공유하는 기본 캐시를 반환합니다."""
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = CompletionCache()
+    return _default_cache
@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+# 파일을 몇 번 쓸 때마다 디렉터리 전체를 다시 훑어 만료 항목을 지우고 용량 추정치를 맞출지
+# (그 사이에는 메모리의 추정치로만 용량을 확인하므로, 다른 워커 프로세스가 쓴 파일은 이때 반영됨)
+DISK_EVICT_EVERY = int(os.getenv("DISK_EVICT_EVERY", 200))
+# 용량을 넘었을 때 상한의 이 비율까지 줄임 (상한 근처에서 쓸 때마다 다시 정리하지 않도록 여유를 둠)
+DISK_EVICT_TARGET = float(os.getenv("DISK_EVICT_TARGET", 0.9))
+
+
+class DiskBudget:
+    def __init__(self, root: str, max_bytes: int, max_age: int, suffixes: Tuple[str, ...] = (".json",),
+                 companions: Tuple[str, ...] = (), evict_every: int = None):
+        """
+        디스크 캐시/저장소 디렉터리의 용량 상한과 보관 기간을 지킵니다.
+        전체 용량은 메모리에서 추정하고, 추정치가 max_bytes를 넘거나 evict_every번 쓸 때마다만 디렉터리를 훑어 정리합니다.
+        suffixes: 항목을 대표하는 파일의 확장자 (이 파일의 수정 시각으로 보관 기간을, 접근 시각으로 최근 사용을 판단)
+        companions: 항목과 같은 이름으로 함께 저장되어 함께 지우는 파일의 확장자 (예: 페이지 목록 .json과 조각 .html)
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.suffixes = suffixes
+        self.companions = companions
+        self.evict_every = max(1, evict_every or DISK_EVICT_EVERY)
+        self._entries: Optional[int] = None
+        self._bytes: Optional[int] = None
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+
+    def _companion_paths(self, path: str) -> List[str]:
+        stem = os.path.splitext(path)[0]
+        return [stem + suffix for suffix in self.companions]
+
+    def _scan(self) -> Iterator[Tuple[str, os.stat_result, int]]:
+        """(대표 파일 경로, 대표 파일 stat, 함께 저장된 파일을 합친 크기)"""
+        for root, _, files in os.walk(self.root):
+            for name in files:
+                if not name.endswith(self.suffixes):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                size = stat.st_size
+                for companion in self._companion_paths(path):
+                    try:
+                        size += os.stat(companion).st_size
+                    except FileNotFoundError:
+                        pass
+                yield path, stat, size
+
+    def remove(self, path: str) -> int:
+        """항목(대표 파일과 함께 저장된 파일)을 지우고 지운 바이트 수를 반환합니다."""
+        freed = 0
+        for target in [path] + self._companion_paths(path):
+            try:
+                size = os.stat(target).st_size
+                os.unlink(target)
+                freed += size
+            except FileNotFoundError:
+                continue
+        return freed
+
+    def added(self, size: int, new: bool = True) -> None:
+        """
+        항목을 쓴 뒤 호출합니다. (size: 늘어난 바이트 수, new: 새 항목인지)
+        추정 용량이 상한을 넘었거나 쓴 횟수가 evict_every에 이르면 정리합니다.
+        """
+        if self._bytes is None:
+            self.evict()
+            return
+        with self._lock:
+            self._bytes += size
+            self._entries += 1 if new else 0
+            self._writes += 1
+            due = self._bytes > self.max_bytes or self._writes >= self.evict_every
+        if due:
+            self.evict()
+
+    def discarded(self, size: int) -> None:
+        """정리 외의 곳에서 항목을 지운 뒤 호출합니다. (예: 읽다가 만료된 항목)"""
+        with self._lock:
+            if self._bytes is not None:
+                self._bytes = max(0, self._bytes - size)
+                self._entries = max(0, self._entries - 1)
+
+    def evict(self) -> int:
+        """만료 항목과 용량 초과분을 삭제하고 삭제된 개수를 반환합니다. (다른 스레드가 정리 중이면 0)"""
+        if not self._evict_lock.acquire(blocking=False):
+            return 0
+        try:
+            now = time.time()
+            removed = 0
+            alive = []
+            total = 0
+            for path, stat, size in self._scan():
+                if now - stat.st_mtime > self.max_age:
+                    self.remove(path)
+                    removed += 1
+                else:
+                    alive.append((stat.st_atime, size, path))
+                    total += size
+
+            entries = len(alive)
+            if total > self.max_bytes:
+                # 가장 오래 사용하지 않은 항목부터 삭제
+                target = self.max_bytes * DISK_EVICT_TARGET
+                alive.sort()
+                for _, size, path in alive:
+                    if total <= target:
+                        break
+                    self.remove(path)
+                    removed += 1
+                    entries -= 1
+                    total -= size
+
+            with self._lock:
+                self._entries = entries
+                self._bytes = total
+                self._writes = 0
+            return removed
+        finally:
+            self._evict_lock.release()
+
+    def usage(self) -> Dict[str, Any]:
+        """현재 항목 수와 용량 (추정치, 처음 한 번만 디렉터리를 훑음)"""
+        if self._bytes is None:
+            self.evict()
+        with self._lock:
+            return {"entries": self._entries or 0, "bytes": self._bytes or 0,
+                    "max_bytes": self.max_bytes, "max_age": self.max_age}
@@ -1,61 +1,194 @@
 import requests
 import os
-from typing import Dict, Any
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, List, Optional, Tuple, Union
 from dotenv import load_dotenv
+from parse_cache import ParseCache, get_default_cache
+from http_clients import UPSTAGE_BASE_URL, get_http_session
+from upload_buffer import UploadBuffer, MultipartStream, DocumentSource
+from pdf_splitter import (PageChunk, PagePlan, open_pdf, split_pages, page_fingerprints, split_result_pages, merge_chunk_results,
+                          PDF_PAGES_PER_CHUNK, PDF_CHUNK_WORKERS, PDF_INCREMENTAL)
+from resilience import CONNECT_TIMEOUT, CircuitOpenError, UpstreamError, get_upstream
+from hwp_reader import HWP_LOCAL_PARSE, is_hwp, read_hwp
+from single_flight import get_single_flight
+from scheduler import current_schedule, scheduled
 
 # .env 파일 로드
 load_dotenv()
 
 class DocumentAnalyzer:
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, cache: ParseCache = None, use_cache: bool = True, session: requests.Session = None,
+                 local_parse: bool = None):
         """
         Upstage Document Digitization API를 사용한 문서 분석기
+        cache: 분석 결과 캐시 (지정하지 않으면 프로세스 공용 캐시 사용)
+        session: HTTP 세션 (지정하지 않으면 프로세스 공용 세션 사용)
+        local_parse: HWP 5.0 문서를 직접 읽을지 여부 (지정하지 않으면 HWP_LOCAL_PARSE 설정)
         """
         self.api_key = api_key or os.getenv("UPSTAGE_API_KEY")
         if not self.api_key:
             raise ValueError("UPSTAGE_API_KEY가 설정되지 않았습니다.")
             
-        self.url = "https://api.upstage.ai/v1/document-digitization"
+        self.url = f"{UPSTAGE_BASE_URL}/document-digitization"
+        self.session = session or get_http_session()
         self.headers = {"Authorization": f"Bearer {self.api_key}"}
+        self.cache = (cache or get_default_cache()) if use_cache else None
+        self.local_parse = HWP_LOCAL_PARSE if local_parse is None else local_parse
+        self.data = {
+            "model": "document-parse-250618",
+            "ocr": "auto",
+            "chart_recognition": True,
+            "coordinates": True,
+            "output_formats": '["html"]',
+            "base64_encoding": '["figure"]',
+        }
     
-    def analyze_document(self, file_path: str) -> Dict[str, Any]:
+    def _load(self, source: Union[str, DocumentSource], filename: str = None):
+        """파일 경로, 바이트, 파일 객체를 UploadBuffer로 읽고 (버퍼, 파일명)을 반환합니다."""
+        if isinstance(source, str):
+            with open(source, "rb") as file:
+                return UploadBuffer.from_source(file), filename or os.path.basename(source)
+        return UploadBuffer.from_source(source), filename or getattr(source, "name", None) or "document"
+
+    def _cache_lookup(self, buffer: UploadBuffer):
+        """(캐시 키, 캐시된 결과 또는 None)을 반환합니다."""
+        if self.cache is None:
+            return None, None
+        cache_key = ParseCache.key_from_digest(buffer.digest, self.data)
+        return cache_key, self.cache.get(cache_key)
+
+    def _local_result(self, buffer: UploadBuffer, file_info: Dict[str, Any]):
+        """HWP 5.0 문서는 원격 API 없이 직접 읽습니다. 읽을 수 없는 문서면 None (원격 API로 분석)"""
+        if not self.local_parse or not is_hwp(buffer.data):
+            return None
+        data = read_hwp(buffer.data)
+        if data is None:
+            return None
+        return {
+            "success": True,
+            "data": data,
+            "status_code": 200,
+            "cached": False,
+            "local": True,
+            "file_info": file_info
+        }
+
+    @staticmethod
+    def _file_info(buffer: UploadBuffer, filename: str) -> Dict[str, Any]:
+        return {
+            "filename": filename,
+            "size": buffer.size,
+            "sha256": buffer.digest
+        }
+
+    @staticmethod
+    def _chunk_filename(filename: str, chunk: PageChunk) -> str:
+        stem = os.path.splitext(filename)[0]
+        return f"{stem}_p{chunk.start_page + 1}-{chunk.start_page + chunk.page_count}.pdf"
+
+    @staticmethod
+    def _upstream_failed(error: UpstreamError) -> Dict[str, Any]:
+        """회로 차단/제한 시간 초과를 API 오류와 같은 형식으로 바꿉니다."""
+        circuit_open = isinstance(error, CircuitOpenError)
+        return {
+            "success": False,
+            "error": "Upstage API를 일시적으로 사용할 수 없습니다." if circuit_open else "Upstage API 응답 시간이 초과되었습니다.",
+            "message": str(error),
+            "status_code": 503 if circuit_open else 504,
+            "circuit_open": circuit_open
+        }
+
+    @staticmethod
+    def _chunks_failed(failed: List[PageChunk], results: Dict[int, Dict[str, Any]]) -> Dict[str, Any]:
+        first = results[failed[0].index]
+        return {
+            "success": False,
+            "error": first.get("error", "문서 분석 중 오류가 발생했습니다."),
+            "message": f"{', '.join(chunk.label for chunk in failed)} 분석 실패: {first.get('message', '')}",
+            "status_code": first.get("status_code")
+        }
+
+    def _flight_key(self, buffer: UploadBuffer) -> str:
+        return f"{self.url}|{ParseCache.key_from_digest(buffer.digest, self.data)}"
+
+    def _fetch(self, buffer: UploadBuffer, filename: str, cache_key: Optional[str]) -> Dict[str, Any]:
+        """원격 API로 문서를 분석합니다. 앞서 같은 문서를 분석한 요청이 방금 끝났으면 캐시된 결과를 사용합니다."""
+        if cache_key is not None:
+            # analyze_document에서 이미 미적중으로 센 요청이므로 다시 세지 않음
+            cached = self.cache.get(cache_key, count=False)
+            if cached is not None:
+                return {"success": True, "data": cached, "status_code": 200, "cached": True}
+
+        # multipart 본문을 한 번에 만들지 않고 업로드 버퍼를 조각으로 바로 전송
+        body = MultipartStream(self.data, "document", filename, buffer.data)
+
+        def post(timeout: float) -> requests.Response:
+            # 재시도할 때마다 본문을 처음부터 다시 보냄
+            body.reset()
+            return self.session.post(self.url, headers={**self.headers, **body.headers}, data=body,
+                                     timeout=(CONNECT_TIMEOUT, timeout))
+
+        response = get_upstream("document").call(post)
+
+        if response.status_code == 200:
+            result = response.json()
+            if self.cache is not None:
+                self.cache.set(cache_key, result)
+            return {
+                "success": True,
+                "data": result,
+                "status_code": response.status_code,
+                "cached": False
+            }
+        return {
+            "success": False,
+            "error": f"API 오류: {response.status_code}",
+            "message": response.text,
+            "status_code": response.status_code
+        }
+
+    def analyze_document(self, source: Union[str, DocumentSource], filename: str = None) -> Dict[str, Any]:
         """
         문서를 분석하고 결과를 반환합니다.
+        source: 파일 경로, 바이트(memoryview 포함) 또는 파일 객체 - 임시 파일 없이 메모리에서 바로 전송합니다.
+        같은 파일과 같은 파라미터로 분석한 결과가 캐시에 있으면 API를 호출하지 않습니다.
         """
         try:
-            with open(file_path, "rb") as file:
-                files = {"document": file}
-                data = {
-                    "model": "document-parse-250618",
-                    "ocr": "auto",
-                    "chart_recognition": True,
-                    "coordinates": True,
-                    "output_formats": '["html"]',
-                    "base64_encoding": '["figure"]',
+            buffer, filename = self._load(source, filename)
+            file_info = self._file_info(buffer, filename)
+
+            local = self._local_result(buffer, file_info)
+            if local is not None:
+                return local
+
+            cache_key, cached = self._cache_lookup(buffer)
+            if cached is not None:
+                return {
+                    "success": True,
+                    "data": cached,
+                    "status_code": 200,
+                    "cached": True,
+                    "file_info": file_info
                 }
 
-                response = requests.post(self.url, headers=self.headers, files=files, data=data)
-                
-                if response.status_code == 200:
-                    return {
-                        "success": True,
-                        "data": response.json(),
-                        "status_code": response.status_code
-                    }
-                else:
-                    return {
-                        "success": False,
-                        "error": f"API 오류: {response.status_code}",
-                        "message": response.text,
-                        "status_code": response.status_code
-                    }
-                    
+            # 같은 문서를 동시에 분석하면 (다른 워커 프로세스 포함) 원격 API는 한 번만 호출
+            flight = get_single_flight("document")
+
+            def fetch() -> Dict[str, Any]:
+                return self._fetch(buffer, filename, cache_key)
+
+            result = flight.do(self._flight_key(buffer), fetch) if flight else fetch()
+            return {**result, "file_info": file_info} if result["success"] else result
+
         except FileNotFoundError:
             return {
                 "success": False,
                 "error": "파일을 찾을 수 없습니다.",
-                "message": f"파일 경로: {file_path}"
+                "message": f"파일 경로: {source}"
             }
+        except UpstreamError as e:
+            return self._upstream_failed(e)
         except Exception as e:
             return {
                 "success": False,
@@ -63,6 +196,120 @@ class DocumentAnalyzer:
                 "message": str(e)
             }
     
+    def _analyze_chunk(self, chunk: PageChunk, filename: str) -> Dict[str, Any]:
+        """
+        조각 하나를 분석합니다.
+        일시적인 실패(네트워크 오류, 429, 5xx)는 Upstream.call이 이미 다시 시도했으므로 여기서는 다시 시도하지 않습니다.
+        """
+        return self.analyze_document(chunk.data, self._chunk_filename(filename, chunk))
+
+    def _page_key(self, fingerprint: str) -> str:
+        return ParseCache.key_from_digest(f"page:{fingerprint}", self.data)
+
+    def _plan_pages(self, buffer: UploadBuffer, pages_per_chunk: int = None) -> Optional[PagePlan]:
+        """
+        PDF의 페이지 지문으로 이전에 분석한 페이지를 찾고, 나머지 페이지만 조각으로 나눕니다.
+        PDF가 아니거나 pypdf가 없으면 None (문서 전체를 한 번에 분석)
+        """
+        pages_per_chunk = pages_per_chunk or PDF_PAGES_PER_CHUNK
+        reader = open_pdf(buffer.data)
+        if reader is None:
+            return None
+        total_pages = len(reader.pages)
+        fingerprints = page_fingerprints(reader) if self.cache is not None and PDF_INCREMENTAL else None
+
+        reused = {}
+        for index, fingerprint in enumerate(fingerprints or []):
+            # 페이지마다 세면 문서 하나가 적중률에 수십~수백 번 잡히므로 세지 않음
+            page = self.cache.get(self._page_key(fingerprint), count=False)
+            if page is not None:
+                reused[index] = page
+
+        if not reused and total_pages <= pages_per_chunk:
+            return PagePlan(total_pages, fingerprints, None, reused)
+        missing = [index for index in range(total_pages) if index not in reused]
+        chunks = split_pages(reader, missing, pages_per_chunk)
+        if chunks is None:
+            return PagePlan(total_pages, fingerprints, None, {})
+        return PagePlan(total_pages, fingerprints, chunks, reused)
+
+    def _store_pages(self, plan: PagePlan, results: List[Tuple[PageChunk, Dict[str, Any]]]) -> None:
+        """새로 분석한 조각의 결과를 페이지별로 나누어 페이지 지문으로 캐시합니다."""
+        if self.cache is None or not plan.fingerprints:
+            return
+        for chunk, data in results:
+            pages = split_result_pages(data, chunk.page_count)
+            for offset, page in enumerate(pages or []):
+                self.cache.set(self._page_key(plan.fingerprints[chunk.start_page + offset]), page)
+
+    def analyze_document_chunked(self, source: Union[str, DocumentSource], filename: str = None,
+                                 pages_per_chunk: int = None, max_workers: int = None,
+                                 on_progress: Callable[[int, int], None] = None) -> Dict[str, Any]:
+        """
+        PDF를 페이지 조각으로 나누어 병렬로 분석한 뒤 페이지 순서대로 합친 결과를 반환합니다. (analyze_document와 같은 형식)
+        조각별 결과도 캐시되므로 일부 조각이 실패해도 다시 요청하면 성공한 조각은 API를 호출하지 않습니다.
+        PDF가 아니거나 나눌 필요가 없거나 pypdf가 없으면 analyze_document로 한 번에 분석합니다.
+        다시 올린 PDF는 페이지 지문이 같은 페이지의 이전 결과를 재사용하고 바뀐 페이지만 원격 API로 보냅니다.
+        on_progress: 조각 하나가 끝날 때마다 (끝난 조각 수, 전체 조각 수)로 호출
+        """
+        try:
+            buffer, filename = self._load(source, filename)
+        except FileNotFoundError:
+            return {
+                "success": False,
+                "error": "파일을 찾을 수 없습니다.",
+                "message": f"파일 경로: {source}"
+            }
+
+        cache_key, cached = self._cache_lookup(buffer)
+        plan = None if cached is not None else self._plan_pages(buffer, pages_per_chunk)
+        if plan is None or plan.chunks is None:
+            result = self.analyze_document(buffer.data, filename)
+            if plan is not None and result["success"]:
+                self._store_pages(plan, [(plan.whole, result["data"])])
+            if on_progress:
+                on_progress(1, 1)
+            return result
+        chunks = plan.chunks
+
+        progress_lock = threading.Lock()
+        finished = 0
+        # 조각을 분석하는 스레드에서도 호출한 쪽과 같은 우선순위/세션 대기열을 사용
+        schedule = current_schedule()
+
+        def analyze(chunk: PageChunk) -> Dict[str, Any]:
+            nonlocal finished
+            with scheduled(*schedule):
+                result = self._analyze_chunk(chunk, filename)
+            if on_progress:
+                with progress_lock:
+                    finished += 1
+                    on_progress(finished, len(chunks))
+            return result
+
+        workers = max(1, min(max_workers or PDF_CHUNK_WORKERS, len(chunks)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = dict(zip((chunk.index for chunk in chunks), executor.map(analyze, chunks)))
+
+        failed = [chunk for chunk in chunks if not results[chunk.index]["success"]]
+        if failed:
+            return self._chunks_failed(failed, results)
+
+        fresh = [(chunk, results[chunk.index]["data"]) for chunk in chunks]
+        self._store_pages(plan, fresh)
+        merged = merge_chunk_results(fresh + plan.reused_segments())
+        if self.cache is not None:
+            self.cache.set(cache_key, merged)
+        return {
+            "success": True,
+            "data": merged,
+            "status_code": 200,
+            "cached": all(results[chunk.index]["cached"] for chunk in chunks),
+            "file_info": self._file_info(buffer, filename),
+            "chunks": len(chunks),
+            "reused_pages": len(plan.reused)
+        }
+
     def get_file_info(self, file_path: str) -> Dict[str, Any]:
         """파일 정보를 반환합니다."""
         if not os.path.exists(file_path):
@@ -73,4 +320,4 @@ class DocumentAnalyzer:
             "filename": os.path.basename(file_path),
             "size": stat.st_size,
             "modified": stat.st_mtime
-        }
\ No newline at end of file
+        }
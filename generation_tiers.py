@@ -0,0 +1,83 @@
+import os
+from typing import Dict, Any, Optional, Tuple
+
+# 생성 단계(tier)
+#   draft: 낮은 추론 수준과 작은 토큰 한도로 빨리 받는 초안
+#   full: 높은 추론 수준으로 다듬은 결과 (기존 동작)
+# 환경변수 TIER_<단계>_<항목>으로 변경 가능 (예: TIER_DRAFT_MAX_TOKENS=384)
+#   max_tokens: 0이면 메서드 기본값, 아니면 메서드 기본값과 비교해 작은 값 사용
+TIER_DEFAULTS = {
+    "draft": {"reasoning_effort": "low", "max_tokens": 512},
+    "full": {"reasoning_effort": "high", "max_tokens": 0}
+}
+TIERS = tuple(TIER_DEFAULTS)
+
+# 스트리밍 엔드포인트별 단계 선택 정책 (환경변수 TIER_POLICY_<엔드포인트>_<항목>으로 변경 가능)
+#   draft_max_chars: 입력이 이 글자 수 이하이면 draft로 먼저 응답하고 full로 다듬은 결과를 이어서 보냄 (0이면 항상 full)
+# 일반(JSON) 응답은 다듬은 결과를 이어서 보낼 수 없으므로 tier를 지정하지 않으면 항상 full로 생성
+TIER_POLICY_DEFAULTS = {
+    "text_options": {"draft_max_chars": 200},
+    "evaluation_criteria": {"draft_max_chars": 200}
+}
+
+GENERATION_MODEL = os.getenv("GENERATION_MODEL", "solar-pro2")
+# 0이면 단계 정책을 끄고 항상 full로 생성
+GENERATION_TIERS = os.getenv("GENERATION_TIERS", "true").lower() not in ("0", "false", "no")
+
+
+def _setting(prefix: str, name: str, key: str, default):
+    value = os.getenv(f"{prefix}_{name.upper()}_{key.upper()}")
+    if value is None:
+        return default
+    if isinstance(default, bool):
+        return value.lower() not in ("0", "false", "no")
+    return type(default)(value)
+
+
+# 환경변수를 반영한 단계 설정과 정책 (요청마다 환경변수를 다시 읽지 않도록 불러올 때 한 번만 계산)
+TIER_SETTINGS = {tier: {key: _setting("TIER", tier, key, value) for key, value in defaults.items()}
+                 for tier, defaults in TIER_DEFAULTS.items()}
+TIER_POLICY = {endpoint: {key: _setting("TIER_POLICY", endpoint, key, value) for key, value in defaults.items()}
+               for endpoint, defaults in TIER_POLICY_DEFAULTS.items()}
+NO_DRAFT_POLICY = {"draft_max_chars": 0}
+
+
+def tier_settings(tier: str) -> Dict[str, Any]:
+    return TIER_SETTINGS.get(tier, TIER_SETTINGS["full"])
+
+
+def tier_policy(endpoint: str) -> Dict[str, Any]:
+    return TIER_POLICY.get(endpoint, NO_DRAFT_POLICY)
+
+
+def tier_params(tier: str, max_tokens: int) -> Dict[str, Any]:
+    """단계별 모델 호출 인자 (model, max_tokens, reasoning_effort)"""
+    settings = tier_settings(tier)
+    if settings["max_tokens"]:
+        max_tokens = min(max_tokens, settings["max_tokens"])
+    return {"model": GENERATION_MODEL, "max_tokens": max_tokens, "reasoning_effort": settings["reasoning_effort"]}
+
+
+def choose_tier(endpoint: str, text: str, requested: Optional[str] = None, stream: bool = False) -> Tuple[str, bool]:
+    """
+    (먼저 응답할 단계, full로 다듬은 결과를 이어서 낼지)를 반환합니다.
+    requested가 "draft" 또는 "full"이면 그 단계 하나만 사용합니다. (그 밖의 값은 정책에 따름)
+    draft로 먼저 응답하는 것은 다듬은 결과를 이어서 보낼 수 있는 스트리밍 응답(stream=True)뿐입니다.
+    """
+    if requested in TIERS:
+        return requested, False
+    if not GENERATION_TIERS or not stream:
+        return "full", False
+    if len(text or "") <= tier_policy(endpoint)["draft_max_chars"]:
+        return "draft", True
+    return "full", False
+
+
+def policy_summary() -> Dict[str, Any]:
+    """현재 단계 설정과 엔드포인트별 정책 (상태 확인용)"""
+    return {
+        "enabled": GENERATION_TIERS,
+        "model": GENERATION_MODEL,
+        "tiers": TIER_SETTINGS,
+        "policy": TIER_POLICY
+    }
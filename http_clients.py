@@ -0,0 +1,70 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from openai import OpenAI
+from dotenv import load_dotenv
+
+# .env 파일 로드
+load_dotenv()
+
+# Upstage API 주소 (로컬 스텁 서버로 바꿀 수 있도록 환경변수로 설정 가능)
+UPSTAGE_BASE_URL = os.getenv("UPSTAGE_BASE_URL", "https://api.upstage.ai/v1")
+
+# 연결 풀 크기 (Flask 워커 스레드 수 이상으로 설정)
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", 4))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 32))
+
+_lock = threading.Lock()
+_session = None
+_openai_clients = {}
+
+
+def get_http_session() -> requests.Session:
+    """
+    프로세스 전체에서 공유하는 requests 세션을 반환합니다.
+    연결(TLS 핸드셰이크 포함)을 재사용하므로 요청마다 새로 연결하지 않습니다.
+    """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=HTTP_POOL_CONNECTIONS,
+                    pool_maxsize=HTTP_POOL_MAXSIZE,
+                    pool_block=False
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def get_openai_client(api_key: str, base_url: str = None) -> OpenAI:
+    """
+    API 키/주소별로 하나씩 만들어 두고 재사용하는 OpenAI 클라이언트를 반환합니다.
+    OpenAI 클라이언트는 스레드 간 공유가 가능합니다.
+    """
+    key = (api_key, base_url or UPSTAGE_BASE_URL)
+    client = _openai_clients.get(key)
+    if client is None:
+        with _lock:
+            client = _openai_clients.get(key)
+            if client is None:
+                # 재시도는 resilience 계층에서 처리하므로 SDK 자체 재시도는 끔
+                client = OpenAI(api_key=key[0], base_url=key[1], max_retries=0)
+                _openai_clients[key] = client
+    return client
+
+
+def close_clients() -> None:
+    """공유 클라이언트를 모두 닫습니다. (테스트/종료 시 사용)"""
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+        for client in _openai_clients.values():
+            client.close()
+        _openai_clients.clear()
@@ -0,0 +1,149 @@
+import hashlib
+import os
+import zlib
+from typing import Iterator, List, Optional
+
+try:
+    import brotli
+except ImportError:  # brotli가 없으면 br 압축은 제공하지 않음
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard가 없으면 zstd 압축은 제공하지 않음
+    zstandard = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack이 없으면 항상 JSON으로 응답
+    msgpack = None
+
+# 응답 압축 사용 여부와 압축을 시작하는 본문 크기 (바이트, 작은 응답은 압축 이득보다 비용이 큼)
+RESPONSE_COMPRESSION = os.getenv("RESPONSE_COMPRESSION", "true").lower() not in ("0", "false", "no")
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 1024))
+# 압축기에 한 번에 넣는 본문 조각 크기 (압축된 본문 전체를 메모리에 만들지 않고 조각마다 내보냄)
+COMPRESS_CHUNK_BYTES = int(os.getenv("COMPRESS_CHUNK_BYTES", 64 * 1024))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 5))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", 3))
+
+JSON_MIMETYPE = "application/json"
+MSGPACK_MIMETYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def available_encodings() -> List[str]:
+    """서버가 제공할 수 있는 압축 방식 (같은 품질값이면 앞의 것을 고름)"""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+
+def negotiate_encoding(accept_encodings) -> Optional[str]:
+    """
+    Accept-Encoding(werkzeug Accept)에서 사용할 압축 방식을 고릅니다. 압축하지 않으면 None
+    """
+    if not RESPONSE_COMPRESSION:
+        return None
+    return accept_encodings.best_match(available_encodings())
+
+
+def negotiate_mimetype(accept_mimetypes) -> str:
+    """Accept에서 JSON보다 MessagePack을 원하고 msgpack이 설치되어 있으면 MessagePack MIME 타입, 아니면 JSON"""
+    if msgpack is None:
+        return JSON_MIMETYPE
+    best = accept_mimetypes.best_match((JSON_MIMETYPE,) + MSGPACK_MIMETYPES, default=JSON_MIMETYPE)
+    # */* 처럼 둘 다 허용하면 JSON이 먼저 선택됨
+    return best or JSON_MIMETYPE
+
+
+def pack_msgpack(value) -> bytes:
+    return msgpack.packb(value, use_bin_type=True)
+
+
+def content_etag(body: bytes) -> str:
+    """본문 내용 해시로 만든 강한 ETag 값 (따옴표 제외)"""
+    return hashlib.sha256(body).hexdigest()[:32]
+
+
+def encoded_etag(etag: str, encoding: Optional[str]) -> str:
+    """
+    압축 방식마다 바이트가 다르므로 강한 ETag에 압축 방식을 붙입니다. (예: "abc...-gzip")
+    If-None-Match 비교는 etag_base()로 압축 방식을 떼고 합니다.
+    """
+    return f"{etag}-{encoding}" if encoding else etag
+
+
+def etag_base(etag: str) -> str:
+    for encoding in ("zstd", "br", "gzip"):
+        if etag.endswith(f"-{encoding}"):
+            return etag[:-len(encoding) - 1]
+    return etag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    If-None-Match 헤더 값에 etag(따옴표 포함 또는 제외)가 들어 있는지 확인합니다.
+    태그를 하나씩 나눠 정확히 비교합니다. (부분 문자열로 비교하면 "doc-1-2"가 "doc-1-20"에 맞음)
+    werkzeug의 request.if_none_match가 없는 ASGI 앱에서 사용합니다.
+    """
+    if not if_none_match:
+        return False
+    etag = etag.strip('"')
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag.strip('"') == etag:
+            return True
+    return False
+
+
+def _compressor(encoding: str):
+    if encoding == "gzip":
+        # wbits=31: gzip 헤더/트레일러 포함
+        return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    if encoding == "br":
+        return _BrotliCompressor()
+    raise ValueError(f"지원하지 않는 압축 방식: {encoding}")
+
+
+class _BrotliCompressor:
+    """brotli.Compressor를 zlib compressobj와 같은 compress()/flush() 형태로 감쌈"""
+
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.finish()
+
+
+def compress_chunks(body: bytes, encoding: str, on_bytes=None) -> Iterator[bytes]:
+    """
+    본문을 COMPRESS_CHUNK_BYTES 조각으로 나눠 압축하면서 압축된 조각을 차례로 내보냅니다.
+    on_bytes: 내보낸 압축 바이트 수를 마지막에 받는 콜백 (지표 기록용)
+    """
+    compressor = _compressor(encoding)
+    total = 0
+    view = memoryview(body)
+    for start in range(0, len(body), COMPRESS_CHUNK_BYTES):
+        chunk = compressor.compress(bytes(view[start:start + COMPRESS_CHUNK_BYTES]))
+        if chunk:
+            total += len(chunk)
+            yield chunk
+    tail = compressor.flush()
+    total += len(tail)
+    if tail:
+        yield tail
+    if on_bytes is not None:
+        on_bytes(total)
@@ -0,0 +1,320 @@
+import base64
+import html
+import io
+import os
+import struct
+import zlib
+from typing import Dict, Any, List, Optional, Tuple
+
+try:
+    import olefile
+except ImportError:  # olefile이 없으면 HWP도 원격 API로 분석
+    olefile = None
+
+# HWP 파일을 원격 API 대신 직접 읽을지 여부 (읽을 수 없는 문서는 원격 API로 분석)
+HWP_LOCAL_PARSE = os.getenv("HWP_LOCAL_PARSE", "true").lower() not in ("0", "false", "no")
+
+OLE_SIGNATURE = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+HWP_SIGNATURE = b"HWP Document File"
+LOCAL_MODEL = "hwp-local"
+
+# 레코드 태그 (HWP 5.0 문서 형식)
+TAG_BIN_DATA = 0x12
+TAG_PARA_HEADER = 0x42
+TAG_PARA_TEXT = 0x43
+TAG_CTRL_HEADER = 0x47
+TAG_LIST_HEADER = 0x48
+TAG_TABLE = 0x4D
+TAG_SHAPE_COMPONENT_PICTURE = 0x55
+
+# 문단 나누기 종류 중 쪽/구역 나누기
+BREAK_SECTION = 0x01
+BREAK_PAGE = 0x04
+
+# 본문에서 8글자(16바이트)를 차지하는 컨트롤 문자 (나머지 0~31은 1글자)
+WIDE_CONTROL_CHARS = set(range(1, 10)) | {11, 12} | set(range(14, 24))
+CHAR_REPLACEMENTS = {9: "\t", 10: "\n", 24: "-", 30: " ", 31: " "}
+
+# 머리말/꼬리말 컨트롤은 HTML <header>/<footer>로 표시
+HEADER_CONTROLS = {b"head": "header", b"foot": "footer"}
+
+
+class _Record:
+    __slots__ = ("tag", "level", "payload", "children")
+
+    def __init__(self, tag: int, level: int, payload: bytes):
+        self.tag = tag
+        self.level = level
+        self.payload = payload
+        self.children: List["_Record"] = []
+
+    @property
+    def ctrl_id(self) -> bytes:
+        # 컨트롤 ID는 리틀 엔디언 4글자 ('tbl '이 ' lbt'로 저장됨)
+        return self.payload[:4][::-1]
+
+
+def is_hwp(data: memoryview) -> bool:
+    return bytes(data[:8]) == OLE_SIGNATURE
+
+
+def _records(data: bytes) -> List[_Record]:
+    """레코드 열을 읽어 레벨에 따라 트리로 묶고 최상위 레코드 목록을 반환합니다."""
+    roots, stack = [], []
+    offset = 0
+    while offset + 4 <= len(data):
+        header = struct.unpack_from("<I", data, offset)[0]
+        offset += 4
+        tag, level, size = header & 0x3FF, (header >> 10) & 0x3FF, header >> 20
+        if size == 0xFFF:
+            size = struct.unpack_from("<I", data, offset)[0]
+            offset += 4
+        record = _Record(tag, level, data[offset:offset + size])
+        offset += size
+
+        while stack and stack[-1].level >= level:
+            stack.pop()
+        (stack[-1].children if stack else roots).append(record)
+        stack.append(record)
+    return roots
+
+
+def _walk(records: List[_Record]):
+    """트리의 모든 레코드를 문서 순서대로 돌려줍니다."""
+    for record in records:
+        yield record
+        yield from _walk(record.children)
+
+
+def _paragraph_text(paragraph: _Record) -> str:
+    """PARA_TEXT의 UTF-16 본문에서 컨트롤 문자를 빼고 글자만 꺼냅니다."""
+    text = next((child.payload for child in paragraph.children if child.tag == TAG_PARA_TEXT), b"")
+    units = struct.unpack_from(f"<{len(text) // 2}H", text)
+    kept = []
+    index = 0
+    while index < len(units):
+        code = units[index]
+        if code >= 32:
+            kept.append(code)
+            index += 1
+            continue
+        if code in CHAR_REPLACEMENTS:
+            kept.append(ord(CHAR_REPLACEMENTS[code]))
+        index += 8 if code in WIDE_CONTROL_CHARS else 1
+    # 한자 확장 영역 등 서로게이트 쌍도 올바르게 합쳐지도록 UTF-16으로 다시 디코딩
+    return struct.pack(f"<{len(kept)}H", *kept).decode("utf-16le", "replace").strip()
+
+
+def _break_type(paragraph: _Record) -> int:
+    return paragraph.payload[11] if len(paragraph.payload) > 11 else 0
+
+
+class _HtmlWriter:
+    def __init__(self, bin_data: Dict[int, bytes]):
+        """문단/표/그림을 Upstage Document Parse와 같은 모양의 HTML과 요소 목록으로 만듭니다."""
+        self.bin_data = bin_data
+        self.elements: List[Dict[str, Any]] = []
+        self.parts: List[str] = []
+        self.page = 1
+        self.next_id = 0
+
+    def _element(self, category: str, fragment: str, **extra) -> None:
+        element = {"id": self.next_id, "page": self.page, "category": category, "content": {"html": fragment}}
+        element.update(extra)
+        self.elements.append(element)
+        self.parts.append(fragment)
+        self.next_id += 1
+
+    def section(self, roots: List[_Record], first: bool) -> None:
+        if not first:
+            self.page += 1
+        for paragraph in roots:
+            if paragraph.tag != TAG_PARA_HEADER:
+                continue
+            if _break_type(paragraph) & (BREAK_PAGE | BREAK_SECTION) and self.elements:
+                self.page += 1
+            self.paragraph(paragraph)
+
+    def paragraph(self, paragraph: _Record) -> None:
+        """본문 문단: 글자는 <p>로, 문단에 달린 표/그림/머리말은 글자 다음에 차례로 씁니다."""
+        text = _paragraph_text(paragraph)
+        if text:
+            self._element("paragraph", f"<p id='{self.next_id}' data-category='paragraph'>{self._text_html(text)}</p>")
+        for control in paragraph.children:
+            if control.tag != TAG_CTRL_HEADER:
+                continue
+            if control.ctrl_id == b"tbl ":
+                self.table(control)
+            elif control.ctrl_id in HEADER_CONTROLS:
+                self.header(control, HEADER_CONTROLS[control.ctrl_id])
+            else:
+                # 글상자/그리기 개체 안의 문단과 그림
+                self.drawing(control)
+
+    def table(self, control: _Record) -> None:
+        """표 컨트롤: 셀 목록(LIST_HEADER + 문단)을 행/열 주소에 맞춰 <table>로 씁니다."""
+        cells: List[Tuple[int, int, int, int, List[_Record]]] = []
+        for child in control.children:
+            if child.tag == TAG_LIST_HEADER and len(child.payload) >= 16:
+                col, row, colspan, rowspan = struct.unpack_from("<HHHH", child.payload, 8)
+                cells.append((row, col, colspan, rowspan, []))
+            elif child.tag == TAG_PARA_HEADER and cells:
+                cells[-1][4].append(child)
+
+        table_id = self.next_id
+        self.next_id += 1
+        rows: Dict[int, List[str]] = {}
+        for row, col, colspan, rowspan, paragraphs in sorted(cells, key=lambda cell: (cell[0], cell[1])):
+            inner = self._cell_html(paragraphs)
+            span = (f" colspan='{colspan}'" if colspan > 1 else "") + (f" rowspan='{rowspan}'" if rowspan > 1 else "")
+            rows.setdefault(row, []).append(f"<td{span}>{inner}</td>")
+        body = "".join(f"<tr>{''.join(rows[row])}</tr>" for row in sorted(rows))
+        fragment = f"<table id='{table_id}'>{body}</table>"
+        element = {"id": table_id, "page": self.page, "category": "table", "content": {"html": fragment}}
+        self.elements.append(element)
+        self.parts.append(fragment)
+
+    def _cell_html(self, paragraphs: List[_Record]) -> str:
+        """셀 안의 문단은 <br>로 잇고, 셀 안의 표/그림은 그 자리에 그대로 넣습니다."""
+        outer_parts, outer_elements = self.parts, len(self.elements)
+        self.parts = []
+        lines = []
+        for paragraph in paragraphs:
+            text = _paragraph_text(paragraph)
+            if text:
+                lines.append(self._text_html(text))
+            for control in paragraph.children:
+                if control.tag == TAG_CTRL_HEADER:
+                    self.parts = []
+                    if control.ctrl_id == b"tbl ":
+                        self.table(control)
+                    else:
+                        self.drawing(control)
+                    lines.extend(self.parts)
+        # 셀 안의 요소는 바깥 표의 일부이므로 별도 요소로 남기지 않음 (그림은 URL로 바꿔야 하므로 유지)
+        self.elements[outer_elements:] = [element for element in self.elements[outer_elements:] if element["category"] == "figure"]
+        self.parts = outer_parts
+        return "<br>".join(lines)
+
+    def header(self, control: _Record, category: str) -> None:
+        texts = [self._text_html(text) for text in map(_paragraph_text, self._paragraphs(control)) if text]
+        if texts:
+            self._element(category, f"<{category} id='{self.next_id}' data-category='{category}'>{'<br>'.join(texts)}</{category}>")
+        self._pictures(control)
+
+    def drawing(self, control: _Record) -> None:
+        for paragraph in self._paragraphs(control):
+            self.paragraph(paragraph)
+        self._pictures(control, nested=False)
+
+    def _pictures(self, record: _Record, nested: bool = True) -> None:
+        """그림 개체를 <figure>와 base64 그림 요소로 씁니다. nested=False면 문단 안쪽 그림은 문단에서 처리"""
+        for child in record.children:
+            if child.tag == TAG_SHAPE_COMPONENT_PICTURE and len(child.payload) >= 73:
+                bin_id = struct.unpack_from("<H", child.payload, 71)[0]
+                image = self.bin_data.get(bin_id)
+                if image is not None:
+                    figure_id = self.next_id
+                    self._element("figure", f"<figure id='{figure_id}'><img alt=''/></figure>",
+                                  base64_encoding=base64.b64encode(image).decode("ascii"))
+            elif child.tag == TAG_PARA_HEADER:
+                if nested:
+                    self._pictures(child, nested)
+            else:
+                self._pictures(child, nested)
+
+    @staticmethod
+    def _paragraphs(record: _Record) -> List[_Record]:
+        """컨트롤 안쪽(글상자, 머리말 등)의 문단을 순서대로 찾습니다. 문단 안의 문단은 문단에서 처리"""
+        paragraphs = []
+        for child in record.children:
+            if child.tag == TAG_PARA_HEADER:
+                paragraphs.append(child)
+            else:
+                paragraphs.extend(_HtmlWriter._paragraphs(child))
+        return paragraphs
+
+    @staticmethod
+    def _text_html(text: str) -> str:
+        return html.escape(text, quote=False).replace("\n", "<br>")
+
+
+def _read_stream(ole, path: str, compressed: bool) -> bytes:
+    data = ole.openstream(path).read()
+    if not compressed:
+        return data
+    try:
+        return zlib.decompress(data, -15)
+    except zlib.error:
+        return data
+
+
+def _bin_data(ole, doc_info: bytes, compressed: bool) -> Dict[int, bytes]:
+    """DocInfo의 BIN_DATA 목록에서 문서에 포함된 그림(BinData/BIN0001.jpg 등)을 읽습니다."""
+    images = {}
+    index = 0
+    for record in _walk(_records(doc_info)):
+        if record.tag != TAG_BIN_DATA or len(record.payload) < 6:
+            continue
+        index += 1
+        properties, bin_id, name_length = struct.unpack_from("<HHH", record.payload, 0)
+        if properties & 0x0F != 1:  # 문서 안에 포함된(embedding) 그림만
+            continue
+        extension = record.payload[6:6 + name_length * 2].decode("utf-16le", "ignore")
+        path = f"BinData/BIN{bin_id:04X}.{extension}"
+        if not ole.exists(path):
+            continue
+        # 압축 여부: 0 = 문서 설정을 따름, 1 = 압축, 2 = 압축 안 함
+        compression = (properties >> 4) & 0x03
+        images[index] = _read_stream(ole, path, compressed if compression == 0 else compression == 1)
+    return images
+
+
+def read_hwp(data: memoryview) -> Optional[Dict[str, Any]]:
+    """
+    HWP 5.0 문서를 직접 읽어 Document Parse API 응답과 같은 형식(content.html, elements, usage)으로 반환합니다.
+    olefile이 없거나, HWP 5.0이 아니거나, 암호/배포용 문서거나, 읽은 글자가 없으면 None (원격 API로 분석)
+    쪽 번호는 쪽/구역 나누기로만 셉니다. (자동 쪽 넘김은 알 수 없음)
+    """
+    if olefile is None or not is_hwp(data):
+        return None
+    try:
+        ole = olefile.OleFileIO(io.BytesIO(bytes(data)))
+    except (OSError, ValueError):
+        return None
+
+    try:
+        if not ole.exists("FileHeader"):
+            return None
+        file_header = ole.openstream("FileHeader").read()
+        if not file_header.startswith(HWP_SIGNATURE) or len(file_header) < 40:
+            return None
+        properties = struct.unpack_from("<I", file_header, 36)[0]
+        # bit 0: 압축, bit 1: 암호, bit 2: 배포용 문서
+        if properties & 0x06:
+            return None
+        compressed = bool(properties & 0x01)
+
+        sections = sorted((path for path in ole.listdir() if len(path) == 2 and path[0] == "BodyText"),
+                          key=lambda path: int(path[1].replace("Section", "") or 0))
+        if not sections:
+            return None
+        doc_info = _read_stream(ole, "DocInfo", compressed) if ole.exists("DocInfo") else b""
+
+        writer = _HtmlWriter(_bin_data(ole, doc_info, compressed))
+        for index, path in enumerate(sections):
+            writer.section(_records(_read_stream(ole, "/".join(path), compressed)), first=index == 0)
+    except (OSError, struct.error, zlib.error, ValueError):
+        return None
+    finally:
+        ole.close()
+
+    if not any(element["category"] != "figure" for element in writer.elements):
+        return None
+    return {
+        "api": "2.0",
+        "model": LOCAL_MODEL,
+        "content": {"html": "".join(writer.parts)},
+        "elements": writer.elements,
+        "usage": {"pages": writer.page}
+    }
@@ -0,0 +1,466 @@
+import asyncio
+import json
+import logging
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Any, AsyncIterator, Callable, Iterator, Optional, Tuple
+from document_analyzer import DocumentAnalyzer
+from analysis_response import build_analysis_response, log_api_result
+from upload_buffer import UploadBuffer, DocumentSource
+from prefetch import Prefetcher, get_default_prefetcher
+from scheduler import scheduled
+
+logger = logging.getLogger("upthon.jobs")
+
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join(".cache", "jobs.sqlite3"))
+# 문서 분석 작업을 동시에 처리하는 워커 스레드 수
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+# 끝난 작업을 보관하는 기간 (초)
+JOB_MAX_AGE = int(os.getenv("JOB_MAX_AGE", 24 * 60 * 60))
+# 진행 중인 작업의 임대 시간 (초). 이 시간 동안 하트비트가 없으면 워커가 죽은 것으로 보고 다시 대기 상태로 돌림
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 60))
+# 하트비트 간격 (초, 임대 시간보다 충분히 짧아야 함)
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", JOB_LEASE_SECONDS / 3))
+# 대기 중인 작업을 받은 프로세스가 이 시간(초) 안에 가져가지 않으면 다른 프로세스의 워커도 가져감
+# (작업을 받은 프로세스가 처리 전에 중단된 경우)
+JOB_QUEUED_GRACE = float(os.getenv("JOB_QUEUED_GRACE", JOB_LEASE_SECONDS))
+
+ACTIVE_STATUSES = ("queued", "running")
+FINISHED_STATUSES = ("done", "failed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    status TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0,
+    progress TEXT,
+    result TEXT,
+    error TEXT,
+    message TEXT,
+    session_id TEXT,
+    owner TEXT,
+    heartbeat_at REAL,
+    document BLOB,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_digest ON jobs (digest, filename, status);
+CREATE INDEX IF NOT EXISTS jobs_updated ON jobs (status, updated_at);
+"""
+
+
+class JobStore:
+    def __init__(self, db_path: str = None):
+        """
+        문서 분석 작업을 SQLite에 저장하는 저장소 (서버를 다시 시작해도 작업이 남음)
+        업로드한 문서는 작업이 끝날 때까지 document 열에 보관합니다.
+        """
+        self.db_path = db_path or JOB_DB_PATH
+        if os.path.dirname(self.db_path):
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        # 이전 버전에서 만든 DB에는 없는 열 추가
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "session_id" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN session_id TEXT")
+        if "owner" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        job = {
+            "job_id": row["id"],
+            "filename": row["filename"],
+            "status": row["status"],
+            "version": row["version"],
+            "progress": json.loads(row["progress"]) if row["progress"] else None,
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"]
+        }
+        if row["status"] == "done" and row["result"]:
+            job["result"] = json.loads(row["result"])
+        if row["status"] == "failed":
+            job["error"] = row["error"]
+            job["message"] = row["message"]
+        return job
+
+    def create_or_get(self, digest: str, filename: str, document: bytes, session_id: str = None) -> Tuple[Dict[str, Any], bool]:
+        """
+        같은 문서(내용 해시와 파일명)의 작업이 대기 중이거나 진행 중이면 그 작업을, 아니면 새 작업을 반환합니다.
+        반환값: (작업, 새로 만들었는지 여부)
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE digest = ? AND filename = ? AND status IN (?, ?) ORDER BY created_at LIMIT 1",
+                    (digest, filename, *ACTIVE_STATUSES)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute("COMMIT")
+                    return self._to_dict(row), False
+
+                now = time.time()
+                job_id = uuid.uuid4().hex
+                self._conn.execute(
+                    "INSERT INTO jobs (id, digest, filename, status, session_id, document, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+                    (job_id, digest, filename, session_id, sqlite3.Binary(document), now, now)
+                )
+                row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                self._conn.execute("COMMIT")
+                return self._to_dict(row), True
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def load_document(self, job_id: str) -> Optional[Tuple[str, bytes, Optional[str]]]:
+        """(파일명, 문서 바이트, 세션 ID)를 반환합니다."""
+        with self._lock:
+            row = self._conn.execute("SELECT filename, document, session_id FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or row["document"] is None:
+            return None
+        return row["filename"], bytes(row["document"]), row["session_id"]
+
+    def claim(self, job_id: str, owner: str) -> bool:
+        """
+        대기 중인 작업을 owner의 진행 중 작업으로 바꾸고 임대를 시작합니다.
+        다른 워커(프로세스)가 먼저 가져갔으면 False
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'running', owner = ?, heartbeat_at = ?, version = version + 1, updated_at = ? "
+                "WHERE id = ? AND status = 'queued'",
+                (owner, now, now, job_id)
+            )
+        return cursor.rowcount == 1
+
+    def update(self, job_id: str, owner: str = None, **fields) -> bool:
+        """
+        status, progress, result, error, message 열을 갱신합니다. 작업이 끝나면 보관하던 문서를 지웁니다.
+        owner를 지정하면 그 워커가 임대 중인 작업만 갱신합니다. (임대가 끝나 다른 워커가 가져갔으면 False)
+        """
+        values = {key: json.dumps(value, ensure_ascii=False) if key in ("progress", "result") else value
+                  for key, value in fields.items()}
+        if values.get("status") in FINISHED_STATUSES:
+            values["document"] = None
+        assignments = ", ".join(f"{key} = ?" for key in values)
+        condition, params = ("id = ? AND owner = ? AND status = 'running'", (job_id, owner)) if owner else ("id = ?", (job_id,))
+        with self._lock:
+            cursor = self._conn.execute(
+                f"UPDATE jobs SET {assignments}, version = version + 1, updated_at = ? WHERE {condition}",
+                (*values.values(), time.time(), *params)
+            )
+        return cursor.rowcount == 1
+
+    def heartbeat(self, owner: str) -> int:
+        """owner가 진행 중인 작업들의 임대를 연장하고 연장한 작업 수를 반환합니다."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE owner = ? AND status = 'running'", (time.time(), owner)
+            )
+        return cursor.rowcount
+
+    def requeue_expired(self, lease: float = None) -> list:
+        """
+        임대가 끝난(워커가 중단되어 하트비트가 멈춘) 진행 중 작업을 다시 대기 상태로 돌리고 ID 목록을 반환합니다.
+        다른 워커 프로세스가 처리 중인 작업은 하트비트가 계속되므로 건드리지 않습니다.
+        """
+        cutoff = time.time() - (lease if lease is not None else JOB_LEASE_SECONDS)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = 'running' AND (heartbeat_at IS NULL OR heartbeat_at < ?) ORDER BY created_at",
+                    (cutoff,)
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE jobs SET status = 'queued', owner = NULL, heartbeat_at = NULL, version = version + 1 WHERE id = ?",
+                    [(row["id"],) for row in rows]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [row["id"] for row in rows]
+
+    def queued(self, older_than: float = None) -> list:
+        """대기 중인 작업 ID 목록 (등록 순서). older_than을 지정하면 그 시간(초)보다 오래 대기한 작업만"""
+        cutoff = time.time() - older_than if older_than is not None else float("inf")
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' AND updated_at < ? ORDER BY created_at", (cutoff,)
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def purge(self, max_age: int = None) -> int:
+        """max_age초보다 오래된 끝난 작업을 지웁니다."""
+        cutoff = time.time() - (max_age if max_age is not None else JOB_MAX_AGE)
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (*FINISHED_STATUSES, cutoff)
+            )
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS count FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["count"] for row in rows}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class JobQueue:
+    def __init__(self, store: JobStore = None, workers: int = None, analyzer_factory: Callable[[], DocumentAnalyzer] = DocumentAnalyzer,
+                 prefetcher: Prefetcher = None):
+        """
+        문서 분석 작업 큐
+        submit()은 작업 ID를 바로 반환하고, 워커 스레드가 DocumentAnalyzer로 분석한 결과를 저장소에 기록합니다.
+        prefetcher: 세션 ID가 있는 작업이 끝나면 평가요소 문장을 미리 생성 (지정하지 않으면 프로세스 공용 처리기 사용)
+        """
+        self.store = store or JobStore()
+        self.workers = max(1, workers or JOB_WORKERS)
+        self.analyzer_factory = analyzer_factory
+        self.prefetcher = prefetcher
+        # 이 큐의 워커들이 작업을 임대할 때 쓰는 이름 (여러 워커 프로세스가 같은 DB를 쓰므로 프로세스마다 다름)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._queue = queue.Queue()
+        # 이 프로세스의 큐에 들어 있는(아직 워커가 꺼내지 않은) 작업 ID
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._changed = threading.Condition()
+        # aevents()로 기다리는 (이벤트 루프, asyncio.Event)
+        self._async_waiters = set()
+        self._threads = []
+
+    def start(self) -> "JobQueue":
+        """
+        워커를 시작하고, 대기 중인 작업과 임대가 끝난(중단된 워커의) 작업을 큐에 넣습니다.
+        다른 워커 프로세스가 진행 중인 작업은 임대가 유지되는 동안 다시 처리하지 않습니다.
+        """
+        if self._threads:
+            return self
+        self.store.purge()
+        self.store.requeue_expired()
+        for job_id in self.store.queued():
+            self._enqueue(job_id)
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        return self
+
+    def submit(self, source: DocumentSource, filename: str, session_id: str = None) -> Tuple[Dict[str, Any], bool]:
+        """
+        문서 분석 작업을 등록하고 (작업, 중복 여부)를 반환합니다.
+        같은 문서가 이미 대기 중이거나 진행 중이면 새로 만들지 않고 기존 작업을 반환합니다.
+        """
+        buffer = UploadBuffer.from_source(source)
+        job, created = self.store.create_or_get(buffer.digest, filename, buffer.data, session_id)
+        if created:
+            self._enqueue(job["job_id"])
+        return job, not created
+
+    def _enqueue(self, job_id: str) -> None:
+        """이미 이 프로세스의 큐에 있는 작업은 다시 넣지 않습니다."""
+        with self._pending_lock:
+            if job_id in self._pending:
+                return
+            self._pending.add(job_id)
+        self._queue.put(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(job_id)
+
+    def wait(self, job_id: str, version: int = -1, timeout: float = 15.0) -> Optional[Dict[str, Any]]:
+        """작업이 version 이후로 바뀌거나 timeout초가 지날 때까지 기다린 뒤 작업을 반환합니다."""
+        deadline = time.monotonic() + timeout
+        job = self.store.get(job_id)
+        while job is not None and job["version"] <= version and job["status"] not in FINISHED_STATUSES:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            with self._changed:
+                # 다른 프로세스의 워커가 갱신한 경우도 확인할 수 있도록 최대 1초마다 다시 조회
+                self._changed.wait(min(remaining, 1.0))
+            job = self.store.get(job_id)
+        return job
+
+    async def _await_change(self, job_id: str, version: int = -1, timeout: float = 15.0) -> Optional[Dict[str, Any]]:
+        """
+        wait()의 비동기 버전
+        스레드를 잡아 두지 않고, 이 프로세스의 갱신 알림을 기다리거나 최대 1초마다 (다른 프로세스의 갱신을) 다시 조회합니다.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        waiter = (loop, asyncio.Event())
+        with self._changed:
+            self._async_waiters.add(waiter)
+        try:
+            while True:
+                # 조회 전에 지워서, 조회와 기다림 사이의 알림도 놓치지 않음
+                waiter[1].clear()
+                job = self.store.get(job_id)
+                if job is None or job["version"] > version or job["status"] in FINISHED_STATUSES:
+                    return job
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return job
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), min(remaining, 1.0))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._changed:
+                self._async_waiters.discard(waiter)
+
+    @staticmethod
+    def _job_event(job_id: str, job: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """작업 상태를 SSE 이벤트로 바꿉니다. (type이 status가 아니면 마지막 이벤트)"""
+        if job is None:
+            return {"type": "error", "success": False, "error": "작업을 찾을 수 없습니다."}
+        if job["status"] == "done":
+            return {"type": "done", "success": True, "job_id": job_id, **job["result"]}
+        if job["status"] == "failed":
+            return {"type": "error", "success": False, "job_id": job_id, "error": job["error"], "message": job["message"]}
+        # 바뀐 것이 없어도 주기적으로 보내 프록시가 연결을 끊지 않도록 함
+        return {"type": "status", "job_id": job_id, "status": job["status"], "progress": job["progress"]}
+
+    def events(self, job_id: str, timeout: float = 15.0) -> Iterator[Dict[str, Any]]:
+        """
+        작업 상태를 SSE 이벤트로 내보냅니다.
+        status(대기/진행률) 이벤트를 바뀔 때마다 보내고, 끝나면 done(분석 결과) 또는 error 이벤트로 마칩니다.
+        """
+        version = -1
+        while True:
+            job = self.wait(job_id, version, timeout)
+            event = self._job_event(job_id, job)
+            yield event
+            if event["type"] != "status":
+                return
+            version = job["version"]
+
+    async def aevents(self, job_id: str, timeout: float = 15.0) -> AsyncIterator[Dict[str, Any]]:
+        """events()의 비동기 버전 (구독자마다 스레드를 쓰지 않음)"""
+        version = -1
+        while True:
+            job = await self._await_change(job_id, version, timeout)
+            event = self._job_event(job_id, job)
+            yield event
+            if event["type"] != "status":
+                return
+            version = job["version"]
+
+    def _notify(self) -> None:
+        """작업이 바뀌었음을 wait()/aevents()로 기다리는 쪽에 알립니다."""
+        with self._changed:
+            self._changed.notify_all()
+            for loop, event in self._async_waiters:
+                try:
+                    loop.call_soon_threadsafe(event.set)
+                except RuntimeError:
+                    # 이미 닫힌 이벤트 루프
+                    pass
+
+    def _update(self, job_id: str, **fields) -> None:
+        if not self.store.update(job_id, owner=self.owner, **fields):
+            logger.warning("작업 %s의 임대가 끝나 다른 워커가 가져갔으므로 결과를 기록하지 않습니다.", job_id)
+        self._notify()
+
+    def _heartbeat(self) -> None:
+        """
+        진행 중인 작업의 임대를 연장하고, 중단된 워커가 남긴 작업을 다시 가져옵니다.
+        - 임대가 끝난 진행 중 작업
+        - 받은 프로세스가 가져가기 전에 중단되어 JOB_QUEUED_GRACE초 넘게 대기 중인 작업 (claim()이 원자적이라 여러 프로세스가 넣어도 한 번만 처리)
+        """
+        while True:
+            time.sleep(JOB_HEARTBEAT_INTERVAL)
+            try:
+                self.store.heartbeat(self.owner)
+                for job_id in self.store.requeue_expired():
+                    logger.info("임대가 끝난 작업 %s를 다시 대기 상태로 돌립니다.", job_id)
+                    self._enqueue(job_id)
+                for job_id in self.store.queued(older_than=JOB_QUEUED_GRACE):
+                    self._enqueue(job_id)
+            except Exception:
+                logger.exception("작업 하트비트 중 오류")
+
+    def _work(self) -> None:
+        while True:
+            job_id = self._queue.get()
+            with self._pending_lock:
+                self._pending.discard(job_id)
+            try:
+                if self.store.claim(job_id, self.owner):
+                    self._notify()
+                    self._run(job_id)
+            except Exception as e:
+                logger.exception("작업 %s 처리 중 오류", job_id)
+                self._update(job_id, status="failed", error="작업 처리 중 오류가 발생했습니다.", message=str(e))
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job_id: str) -> None:
+        loaded = self.store.load_document(job_id)
+        if loaded is None:
+            self._update(job_id, status="failed", error="작업 문서를 찾을 수 없습니다.", message="")
+            return
+        filename, document, session_id = loaded
+
+        def on_progress(done: int, total: int):
+            self._update(job_id, progress={"done": done, "total": total})
+
+        # 사용자가 화면에서 결과를 기다리는 작업이므로 올린 세션의 interactive 대기열 사용
+        with scheduled("interactive", session_id):
+            api_result = self.analyzer_factory().analyze_document_chunked(document, filename, on_progress=on_progress)
+        log_api_result(filename, api_result)
+
+        if not api_result.get("success"):
+            self._update(job_id, status="failed",
+                         error=api_result.get("error", "API 분석에 실패했습니다."),
+                         message=str(api_result.get("message", "")))
+            return
+
+        result = build_analysis_response(api_result, filename, api_result["file_info"])
+        self._update(job_id, status="done", result=result)
+        if session_id:
+            (self.prefetcher or get_default_prefetcher()).schedule(session_id, result["tables"])
+
+    def stats(self) -> Dict[str, Any]:
+        return {"workers": self.workers, "pending": self._queue.qsize(), "jobs": self.store.stats()}
+
+
+_default_queue = None
+_default_queue_lock = threading.Lock()
+
+
+def get_default_job_queue() -> JobQueue:
+    """프로세스 전체에서 공유하는 작업 큐를 반환합니다. (처음 사용할 때 워커 시작)"""
+    global _default_queue
+    if _default_queue is None:
+        with _default_queue_lock:
+            if _default_queue is None:
+                _default_queue = JobQueue().start()
+    return _default_queue
@@ -0,0 +1,337 @@
+import bisect
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Iterable, List, Optional, Sequence, Tuple
+
+# Prometheus 텍스트 형식으로 내보내는 가벼운 지표 모음 (외부 의존성 없음)
+# 기록할 때는 잠금 한 번과 이진 탐색만 하고, 문자열 변환은 /metrics 요청 시에만 합니다.
+
+# 초 단위 기본 구간 (업로드/직렬화처럼 짧은 단계부터 원격 분석/LLM처럼 긴 단계까지)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labelvalues: Sequence[Any]) -> Tuple[str, ...]:
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f"{self.name}: 레이블 {self.labelnames}의 값이 필요합니다.")
+        return tuple(str(value) for value in labelvalues)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_items(items))
+        return lines
+
+    def _render_items(self, items) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labelvalues: Any, amount: float = 1) -> None:
+        key = self._key(labelvalues)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render_items(self, items) -> List[str]:
+        return [f"{self.name}{_labels_text(self.labelnames, key)} {_number(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labelvalues: Any) -> None:
+        key = self._key(labelvalues)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [구간별 개수..., +Inf 개수, 합계]
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    @contextmanager
+    def time(self, *labelvalues: Any):
+        """with 블록의 실행 시간을 기록합니다."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labelvalues)
+
+    def _render_items(self, items) -> List[str]:
+        lines = []
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                le = 'le="%s"' % _number(bound)
+                lines.append(f"{self.name}_bucket{_labels_text(self.labelnames, key, le)} {cumulative}")
+            labels = _labels_text(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_number(state[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        """지표와 수집기(조회 시점에 값을 읽어 오는 함수) 목록"""
+        self._metrics: List[_Metric] = []
+        self._collectors: Dict[str, Callable[[], Iterable[str]]] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, name: str, collector: Callable[[], Iterable[str]]) -> None:
+        """캐시 통계처럼 이미 다른 곳에서 세고 있는 값은 /metrics 요청 시 읽어서 내보냅니다."""
+        with self._lock:
+            self._collectors[name] = collector
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collector in collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "upthon_request_seconds", "API 요청 처리 시간(초)", ("route", "method", "status")))
+RESPONSE_BYTES = REGISTRY.register(Counter(
+    "upthon_response_bytes_total", "API 응답 본문 크기 합계(바이트, 스트리밍 응답 제외)", ("route",)))
+COMPRESSED_BYTES = REGISTRY.register(Counter(
+    "upthon_response_compressed_bytes_total", "압축해서 보낸 API 응답 본문 크기 합계(바이트)", ("route", "encoding")))
+SCHEDULER_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "upthon_scheduler_wait_seconds", "업스트림 요청이 대기열에서 차례를 기다린 시간(초)", ("priority",)))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "upthon_stage_seconds", "요청 처리 단계별 시간(초)", ("route", "stage")))
+TEXT_IMPROVER_SECONDS = REGISTRY.register(Histogram(
+    "upthon_text_improver_seconds", "TextImprover 메서드 실행 시간(초, 스트리밍은 마지막 줄까지)", ("method",)))
+UPSTREAM_SECONDS = REGISTRY.register(Histogram(
+    "upthon_upstream_attempt_seconds", "Upstage API 요청 한 번의 응답 시간(초)", ("upstream",)))
+UPSTREAM_RESPONSES = REGISTRY.register(Counter(
+    "upthon_upstream_responses_total", "Upstage API 응답 상태 코드별 횟수 (예외는 예외 이름)", ("upstream", "status")))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "upthon_llm_tokens_total", "LLM 토큰 사용량", ("method", "kind")))
+TIER_SECONDS = REGISTRY.register(Histogram(
+    "upthon_generation_tier_seconds", "생성 단계(draft/full)별 응답 시간(초, 캐시 적중 제외)", ("endpoint", "tier")))
+TIER_TOKENS = REGISTRY.register(Counter(
+    "upthon_generation_tier_tokens_total", "생성 단계(draft/full)별 토큰 사용량", ("endpoint", "tier", "kind")))
+
+# 지금 실행 중인 TextImprover 메서드 이름 (토큰 사용량 레이블용)
+current_method: contextvars.ContextVar[str] = contextvars.ContextVar("upthon_text_improver_method", default="unknown")
+
+
+def timed_method(name: str):
+    """
+    TextImprover 메서드의 실행 시간을 기록하는 데코레이터 (일반/비동기 함수, 제너레이터 모두 지원)
+    실행 중 current_method를 설정해 토큰 사용량에 메서드 이름을 붙입니다.
+    제너레이터는 다음 항목을 만드는 동안에만 설정합니다. (항목을 받은 쪽의 코드는 그 메서드 실행이 아님)
+    """
+    def decorator(func):
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def async_gen_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                generator = func(*args, **kwargs)
+                try:
+                    while True:
+                        token = current_method.set(name)
+                        try:
+                            item = await generator.__anext__()
+                        except StopAsyncIteration:
+                            return
+                        finally:
+                            current_method.reset(token)
+                        yield item
+                finally:
+                    token = current_method.set(name)
+                    try:
+                        await generator.aclose()
+                    finally:
+                        current_method.reset(token)
+                        TEXT_IMPROVER_SECONDS.observe(time.perf_counter() - started, name)
+            return async_gen_wrapper
+
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def gen_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                generator = func(*args, **kwargs)
+                try:
+                    while True:
+                        token = current_method.set(name)
+                        try:
+                            item = next(generator)
+                        except StopIteration:
+                            return
+                        finally:
+                            current_method.reset(token)
+                        yield item
+                finally:
+                    token = current_method.set(name)
+                    try:
+                        generator.close()
+                    finally:
+                        current_method.reset(token)
+                        TEXT_IMPROVER_SECONDS.observe(time.perf_counter() - started, name)
+            return gen_wrapper
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                token = current_method.set(name)
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    TEXT_IMPROVER_SECONDS.observe(time.perf_counter() - started, name)
+                    current_method.reset(token)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            token = current_method.set(name)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                TEXT_IMPROVER_SECONDS.observe(time.perf_counter() - started, name)
+                current_method.reset(token)
+        return wrapper
+    return decorator
+
+
+def record_usage(usage: Any, endpoint: str = None, tier: str = None) -> None:
+    """
+    LLM 응답의 usage(prompt_tokens, completion_tokens)를 현재 메서드 이름으로 기록합니다.
+    endpoint와 tier를 주면 생성 단계별 사용량에도 더합니다.
+    """
+    if usage is None:
+        return
+    method = current_method.get()
+    for kind in ("prompt_tokens", "completion_tokens"):
+        value = getattr(usage, kind, None)
+        if value:
+            LLM_TOKENS.inc(method, kind.split("_")[0], amount=value)
+            if tier:
+                TIER_TOKENS.inc(endpoint or "unknown", tier, kind.split("_")[0], amount=value)
+
+
+def record_upstream(upstream: str, seconds: float, status: Optional[Any]) -> None:
+    UPSTREAM_SECONDS.observe(seconds, upstream)
+    UPSTREAM_RESPONSES.inc(upstream, status)
+
+
+def gauge_lines(name: str, documentation: str, samples: Iterable[Tuple[Dict[str, Any], float]], kind: str = "gauge") -> List[str]:
+    """수집기에서 쓰는 (레이블, 값) 목록을 Prometheus 텍스트 줄로 바꿉니다."""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels_text(list(labels), list(labels.values()))} {_number(value)}")
+    return lines
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+def _text_cache_lines() -> List[str]:
+    from completion_cache import get_default_text_cache
+    methods = get_default_text_cache().stats()["methods"]
+    samples = [({"method": method, "result": field}, metrics[field])
+               for method, metrics in sorted(methods.items())
+               for field in ("exact_hits", "near_hits", "misses", "bypassed")]
+    return gauge_lines("upthon_text_cache_lookups_total", "생성 결과 캐시 조회 결과별 횟수", samples, kind="counter")
+
+
+def _parse_cache_lines() -> List[str]:
+    from parse_cache import get_default_cache
+    stats = get_default_cache().stats()
+    return (gauge_lines("upthon_parse_cache_lookups_total", "문서 분석 캐시 조회 결과별 횟수",
+                        [({"result": "hit"}, stats["hits"]), ({"result": "miss"}, stats["misses"])], kind="counter")
+            + gauge_lines("upthon_parse_cache_bytes", "문서 분석 캐시 디스크 사용량(바이트)", [({}, stats["bytes"])]))
+
+
+def _upstream_lines() -> List[str]:
+    from resilience import upstream_stats
+    upstreams = upstream_stats()
+    return gauge_lines("upthon_upstream_circuit_open", "회로 차단 여부 (1이면 요청을 바로 거절 중)",
+                       [({"upstream": name}, 0 if stats["circuit"] == "closed" else 1) for name, stats in upstreams.items()])
+
+
+def _single_flight_lines() -> List[str]:
+    from single_flight import single_flight_stats
+    flights = single_flight_stats()
+    samples = [({"name": name, "role": role}, stats[role])
+               for name, stats in sorted(flights.items())
+               for role in ("leaders", "followers", "shared_followers")]
+    return gauge_lines("upthon_single_flight_calls_total",
+                       "동시 요청 합치기 결과별 횟수 (leaders: 실제 호출, followers/shared_followers: 같은/다른 프로세스의 결과를 받음)",
+                       samples, kind="counter")
+
+
+def _scheduler_lines() -> List[str]:
+    from scheduler import get_scheduler
+    scheduler = get_scheduler()
+    if scheduler is None:
+        return []
+    stats = scheduler.stats()
+    return (gauge_lines("upthon_scheduler_queued", "우선순위별로 차례를 기다리는 업스트림 요청 수",
+                        [({"priority": priority}, values["queued"]) for priority, values in stats["priorities"].items()])
+            + gauge_lines("upthon_scheduler_running", "지금 보내고 있는 업스트림 요청 수", [({}, stats["running"])]))
+
+
+def install_default_collectors() -> None:
+    """캐시 적중률, 회로 상태, 동시 요청 합치기, 대기열 통계를 /metrics에 포함합니다. (이미 등록되어 있으면 덮어씀)"""
+    REGISTRY.add_collector("text_cache", _text_cache_lines)
+    REGISTRY.add_collector("parse_cache", _parse_cache_lines)
+    REGISTRY.add_collector("upstreams", _upstream_lines)
+    REGISTRY.add_collector("single_flight", _single_flight_lines)
+    REGISTRY.add_collector("scheduler", _scheduler_lines)
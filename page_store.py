@@ -0,0 +1,267 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from html.parser import HTMLParser
+from typing import Dict, Any, List, Optional, Tuple
+from table_extractor import VOID_ELEMENTS
+from disk_budget import DiskBudget
+
+DEFAULT_PAGE_DIR = os.getenv("PAGE_STORE_DIR", os.path.join(".cache", "pages"))
+DEFAULT_PAGE_MAX_BYTES = int(os.getenv("PAGE_STORE_MAX_BYTES", 1024 * 1024 * 1024))  # 1GB
+# 마지막으로 저장(같은 문서를 다시 분석)된 뒤 보관하는 기간 (초)
+DEFAULT_PAGE_MAX_AGE = int(os.getenv("PAGE_STORE_MAX_AGE", 7 * 24 * 60 * 60))  # 7일
+# 페이지 나눠 보내기를 자동으로 켜는 기준 (둘 중 하나라도 넘으면 페이지 목록만 먼저 보냄)
+PAGED_MIN_PAGES = int(os.getenv("PAGED_MIN_PAGES", 20))
+PAGED_MIN_BYTES = int(os.getenv("PAGED_MIN_BYTES", 2 * 1024 * 1024))  # 2MB
+# 페이지 조각 API 한 번에 돌려주는 최대 페이지 수
+PAGE_RANGE_MAX = int(os.getenv("PAGE_RANGE_MAX", 20))
+
+TABLE_TAG_RE = re.compile(r'<table\b', re.IGNORECASE)
+FIGURE_TAG_RE = re.compile(r'<figure\b', re.IGNORECASE)
+DOC_ID_RE = re.compile(r'[0-9a-f]{32}')
+
+
+class _TopLevelScanner(HTMLParser):
+    """HTML 최상위 요소마다 (시작 위치, id 속성)을 수집합니다."""
+
+    def __init__(self, html: str):
+        super().__init__(convert_charrefs=True)
+        # getpos()의 (줄, 열)을 문자 위치로 바꾸기 위한 줄 시작 위치
+        self.line_starts = [0] + [match.end() for match in re.finditer(r'\n', html)]
+        self.depth = 0
+        self.nodes: List[Tuple[int, Optional[str]]] = []
+
+    def _offset(self) -> int:
+        line, column = self.getpos()
+        return self.line_starts[line - 1] + column
+
+    def handle_starttag(self, tag, attrs):
+        if self.depth == 0:
+            self.nodes.append((self._offset(), dict(attrs).get('id')))
+        if tag not in VOID_ELEMENTS:
+            self.depth += 1
+
+    def handle_startendtag(self, tag, attrs):
+        if self.depth == 0:
+            self.nodes.append((self._offset(), dict(attrs).get('id')))
+
+    def handle_endtag(self, tag):
+        if tag not in VOID_ELEMENTS and self.depth > 0:
+            self.depth -= 1
+
+
+def split_html_pages(data: Dict[str, Any]) -> Optional[List[str]]:
+    """
+    분석 결과의 HTML을 페이지별 조각으로 나눕니다.
+    최상위 요소의 id를 elements[*].page와 맞춰 페이지가 바뀌는 곳에서 자르므로, 조각을 이어 붙이면 원래 HTML이 됩니다.
+    (표 순서가 그대로라 전체 HTML 기준 table_index를 페이지별로 나눠 쓸 수 있음)
+    요소에 페이지 번호가 없거나 최상위 요소를 찾지 못하면 None
+    """
+    html = (data.get("content") or {}).get("html") or ""
+    pages_by_id = {str(element.get("id")): element.get("page") for element in data.get("elements") or []
+                   if isinstance(element.get("page"), int) and element.get("page") >= 1}
+    if not html or not pages_by_id:
+        return None
+
+    scanner = _TopLevelScanner(html)
+    scanner.feed(html)
+    scanner.close()
+    if not scanner.nodes:
+        return None
+
+    # 페이지가 바뀌는 최상위 요소의 시작 위치 (id가 없거나 모르는 요소는 앞 요소와 같은 페이지)
+    starts = {1: 0}
+    current = 1
+    for offset, element_id in scanner.nodes:
+        page = pages_by_id.get(element_id)
+        if page is not None and page > current:
+            current = page
+            starts[page] = offset
+    page_count = max(current, (data.get("usage") or {}).get("pages") or 0)
+
+    cuts = sorted(starts.items())
+    bounds = {page: (offset, cuts[i + 1][1] if i + 1 < len(cuts) else len(html)) for i, (page, offset) in enumerate(cuts)}
+    return [html[slice(*bounds[page])] if page in bounds else "" for page in range(1, page_count + 1)]
+
+
+def should_page(data: Dict[str, Any]) -> bool:
+    """페이지 수나 HTML 크기가 기준을 넘으면 True"""
+    html = (data.get("content") or {}).get("html") or ""
+    pages = (data.get("usage") or {}).get("pages") or 0
+    return pages >= PAGED_MIN_PAGES or len(html.encode("utf-8")) >= PAGED_MIN_BYTES
+
+
+def parse_page_range(value: str, page_count: int) -> Optional[Tuple[int, int]]:
+    """
+    "3-7", "3-", "5" 형태의 페이지 범위(1부터, 끝 포함)를 (시작, 끝)으로 바꿉니다.
+    범위를 벗어나면 끝을 잘라 내고, 형식이 틀렸거나 시작이 페이지 수보다 크면 None
+    """
+    match = re.fullmatch(r'\s*(\d+)\s*(?:-\s*(\d*)\s*)?', value or "")
+    if not match:
+        return None
+    start = int(match.group(1))
+    if match.group(2) is None:
+        end = start
+    else:
+        end = int(match.group(2)) if match.group(2) else page_count
+    if start < 1 or start > page_count or end < start:
+        return None
+    return start, min(end, page_count, start + PAGE_RANGE_MAX - 1)
+
+
+def parse_paged_flag(value: Optional[str]) -> Optional[bool]:
+    """?paged= 값: 1/true면 True, 0/false면 False, 없으면 None(크기 기준으로 자동)"""
+    if value is None or value == "":
+        return None
+    return value.lower() not in ("0", "false", "no")
+
+
+def read_page_range(doc_id: str, range_header: Optional[str], range_param: Optional[str]) -> Tuple[Dict[str, Any], int, Dict[str, str]]:
+    """
+    페이지 조각 API의 (응답 본문, 상태 코드, 헤더)를 만듭니다.
+    범위는 "Range: pages=3-7" 헤더(206 응답) 또는 ?range=3-7 로 받고, 둘 다 없으면 첫 페이지부터 PAGE_RANGE_MAX개
+    조각은 내용 해시로 저장되어 바뀌지 않으므로 오래 캐시할 수 있게 표시합니다.
+    """
+    store = get_default_page_store()
+    index = store.index(doc_id)
+    if index is None:
+        return {"success": False, "error": "문서를 찾을 수 없습니다."}, 404, {}
+
+    use_header = bool(range_header and range_header.startswith("pages="))
+    spec = range_header[len("pages="):] if use_header else (range_param or "1-")
+    page_range = parse_page_range(spec, index["page_count"])
+    if page_range is None:
+        return ({"success": False, "error": "페이지 범위가 잘못되었습니다."}, 416,
+                {"Content-Range": f"pages */{index['page_count']}"})
+
+    start, end = page_range
+    pages = store.read(doc_id, start, end)
+    if pages is None:
+        return {"success": False, "error": "문서를 찾을 수 없습니다."}, 404, {}
+    headers = {
+        "Content-Range": f"pages {start}-{end}/{index['page_count']}",
+        "ETag": f'"{doc_id}-{start}-{end}"',
+        "Cache-Control": "public, max-age=31536000, immutable"
+    }
+    body = {"success": True, "doc_id": doc_id, "page_count": index["page_count"], "start": start, "end": end, "pages": pages}
+    return body, 206 if use_header else 200, headers
+
+
+class PageStore:
+    def __init__(self, page_dir: str = None, max_bytes: int = DEFAULT_PAGE_MAX_BYTES, max_age: int = DEFAULT_PAGE_MAX_AGE):
+        """
+        페이지별 HTML 조각을 문서 내용 해시로 저장하는 저장소
+        문서마다 조각을 이어 붙인 파일(.html)과 바이트 위치를 담은 목록 파일(.json)을 두고, 요청한 페이지만 읽습니다.
+        max_bytes: 전체 용량 상한 (넘으면 오래 안 읽은 문서부터 삭제), max_age: 마지막으로 저장된 뒤 보관하는 기간(초)
+        """
+        self.page_dir = page_dir or DEFAULT_PAGE_DIR
+        # 목록 파일을 기준으로 나이/최근 사용을 판단하고 조각 파일과 함께 지움
+        self.budget = DiskBudget(self.page_dir, max_bytes, max_age, suffixes=(".json",), companions=(".html",))
+        os.makedirs(self.page_dir, exist_ok=True)
+
+    def _path(self, doc_id: str, extension: str) -> str:
+        return os.path.join(self.page_dir, doc_id[:2], f"{doc_id}.{extension}")
+
+    def put(self, fragments: List[str]) -> Dict[str, Any]:
+        """
+        페이지 조각을 저장하고 페이지 목록을 반환합니다. 같은 내용이면 다시 쓰지 않고 보관 기간만 새로 시작합니다.
+        목록의 각 페이지: page(1부터), bytes, table_start(앞 페이지까지의 표 개수), tables, figures
+        """
+        hasher = hashlib.sha256()
+        encoded = []
+        for fragment in fragments:
+            raw = fragment.encode("utf-8")
+            hasher.update(len(raw).to_bytes(8, "big"))
+            hasher.update(raw)
+            encoded.append(raw)
+        doc_id = hasher.hexdigest()[:32]
+
+        pages = []
+        offset = 0
+        table_start = 0
+        for page, (fragment, raw) in enumerate(zip(fragments, encoded), start=1):
+            tables = len(TABLE_TAG_RE.findall(fragment))
+            pages.append({"page": page, "offset": offset, "bytes": len(raw), "table_start": table_start,
+                          "tables": tables, "figures": len(FIGURE_TAG_RE.findall(fragment))})
+            offset += len(raw)
+            table_start += tables
+        index = {"doc_id": doc_id, "page_count": len(pages), "pages": pages}
+
+        index_path = self._path(doc_id, "json")
+        try:
+            os.utime(index_path)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(index_path), exist_ok=True)
+            suffix = f"{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(f"{self._path(doc_id, 'html')}.{suffix}", "wb") as f:
+                f.writelines(encoded)
+            os.replace(f"{self._path(doc_id, 'html')}.{suffix}", self._path(doc_id, "html"))
+            # 목록 파일을 나중에 써서, 목록이 있으면 조각 파일도 있도록 함
+            with open(f"{index_path}.{suffix}", "w", encoding="utf-8") as f:
+                json.dump(index, f)
+            index_bytes = os.path.getsize(f"{index_path}.{suffix}")
+            os.replace(f"{index_path}.{suffix}", index_path)
+            self.budget.added(offset + index_bytes)
+        return public_index(index)
+
+    def index(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """저장된 페이지 목록 (바이트 위치 포함). 없거나 id가 잘못되었으면 None"""
+        if not DOC_ID_RE.fullmatch(doc_id or ""):
+            return None
+        path = self._path(doc_id, "json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            # 최근 사용 시각 갱신 (용량 초과 시 오래 안 읽은 문서부터 삭제)
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+        except (FileNotFoundError, ValueError):
+            return None
+        return index
+
+    def read(self, doc_id: str, start: int, end: int) -> Optional[List[Dict[str, Any]]]:
+        """start~end 페이지(1부터, 끝 포함)의 조각을 [{page, html}]로 반환합니다. 문서가 없으면 None"""
+        index = self.index(doc_id)
+        if index is None:
+            return None
+        pages = index["pages"][start - 1:end]
+        if not pages:
+            return []
+        try:
+            with open(self._path(doc_id, "html"), "rb") as f:
+                f.seek(pages[0]["offset"])
+                raw = f.read(pages[-1]["offset"] + pages[-1]["bytes"] - pages[0]["offset"])
+        except FileNotFoundError:
+            return None
+        base = pages[0]["offset"]
+        return [
+            {"page": page["page"], "table_start": page["table_start"],
+             "html": raw[page["offset"] - base:page["offset"] - base + page["bytes"]].decode("utf-8")}
+            for page in pages
+        ]
+
+
+    def stats(self) -> Dict[str, Any]:
+        """저장된 문서 수와 용량(추정치)을 반환합니다."""
+        return self.budget.usage()
+
+
+def public_index(index: Dict[str, Any]) -> Dict[str, Any]:
+    """클라이언트에 보내는 페이지 목록 (파일 안 바이트 위치는 뺌)"""
+    return dict(index, pages=[{key: value for key, value in page.items() if key != "offset"} for page in index["pages"]])
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_default_page_store() -> PageStore:
+    """프로세스 전체에서 공유하는 기본 페이지 저장소를 반환합니다."""
+    global _default_store
+    if _default_store is None:
+        with _default_store_lock:
+            if _default_store is None:
+                _default_store = PageStore()
+    return _default_store
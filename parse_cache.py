@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Any, Optional
+from disk_budget import DiskBudget
+
+# 기본 캐시 설정 (환경변수로 변경 가능)
+DEFAULT_CACHE_DIR = os.getenv("PARSE_CACHE_DIR", os.path.join(".cache", "parse"))
+DEFAULT_MAX_BYTES = int(os.getenv("PARSE_CACHE_MAX_BYTES", 512 * 1024 * 1024))  # 512MB
+DEFAULT_MAX_AGE = int(os.getenv("PARSE_CACHE_MAX_AGE", 7 * 24 * 60 * 60))  # 7일
+
+
+class ParseCache:
+    def __init__(self, cache_dir: str = None, max_bytes: int = DEFAULT_MAX_BYTES, max_age: int = DEFAULT_MAX_AGE):
+        """
+        문서 분석 결과를 파일 내용 해시로 저장하는 디스크 캐시
+        max_bytes: 전체 캐시 용량 상한, max_age: 항목 유효 시간(초)
+        """
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # 쓸 때마다 디렉터리를 훑지 않도록 용량은 메모리에서 추정하고 가끔만 정리
+        self.budget = DiskBudget(self.cache_dir, max_bytes, max_age)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(file_bytes: bytes, params: Dict[str, Any]) -> str:
+        """파일 바이트와 요청 파라미터로 캐시 키를 만듭니다."""
+        digest = hashlib.sha256(file_bytes).hexdigest()
+        return ParseCache.key_from_digest(digest, params)
+
+    @staticmethod
+    def key_from_digest(digest: str, params: Dict[str, Any]) -> str:
+        """이미 계산된 파일 해시와 요청 파라미터로 캐시 키를 만듭니다."""
+        hasher = hashlib.sha256(digest.encode("ascii"))
+        hasher.update(json.dumps(params, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        return hasher.hexdigest()
+
+    def _path(self, key: str) -> str:
+        # 한 디렉터리에 파일이 너무 많아지지 않도록 앞 2글자로 분산
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str, count: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        캐시된 결과를 반환합니다. 없거나 만료되었으면 None
+        count: False이면 적중/미적중 횟수에 넣지 않음 (문서 단위 적중률을 흐리는 페이지별 조회, 같은 요청의 재확인 등)
+        """
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+            if time.time() - stat.st_mtime > self.max_age:
+                os.unlink(path)
+                self.budget.discarded(stat.st_size)
+                raise FileNotFoundError(path)
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            # 최근 사용 시각 갱신 (용량 초과 시 오래 안 쓴 항목부터 삭제)
+            os.utime(path, (time.time(), stat.st_mtime))
+        except (FileNotFoundError, ValueError):
+            if count:
+                with self._lock:
+                    self.misses += 1
+            return None
+
+        if count:
+            with self._lock:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        """결과를 캐시에 저장하고 필요하면 오래된 항목을 정리합니다."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        size = os.path.getsize(tmp_path)
+        try:
+            previous = os.path.getsize(path)
+        except FileNotFoundError:
+            previous = None
+        # 다른 워커가 읽는 중에도 깨진 파일이 보이지 않도록 원자적으로 교체
+        os.replace(tmp_path, path)
+        self.budget.added(size - (previous or 0), new=previous is None)
+
+    def evict(self) -> int:
+        """만료 항목과 용량 초과분을 삭제하고 삭제된 개수를 반환합니다."""
+        return self.budget.evict()
+
+    def stats(self) -> Dict[str, Any]:
+        """캐시 적중/미적중 횟수와 현재 용량(추정치)을 반환합니다."""
+        usage = self.budget.usage()
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+            "entries": usage["entries"],
+            "bytes": usage["bytes"],
+            "max_bytes": self.max_bytes,
+            "max_age": self.max_age
+        }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> ParseCache:
+    """프로세스 전체에서 공유하는 기본 캐시를 반환합니다."""
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = ParseCache()
+    return _default_cache
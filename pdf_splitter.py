@@ -0,0 +1,233 @@
+import hashlib
+import io
+import os
+import re
+from typing import Dict, Any, List, Optional, Tuple
+
+try:
+    from pypdf import PdfReader, PdfWriter
+    from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
+except ImportError:  # pypdf가 없으면 나누지 않고 문서 전체를 한 번에 분석
+    PdfReader = PdfWriter = None
+
+# 한 번에 분석할 페이지 수
+PDF_PAGES_PER_CHUNK = int(os.getenv("PDF_PAGES_PER_CHUNK", 10))
+# 동시에 분석할 조각 수
+PDF_CHUNK_WORKERS = int(os.getenv("PDF_CHUNK_WORKERS", 4))
+# 다시 올린 PDF에서 바뀌지 않은 페이지는 이전 분석 결과를 재사용할지 여부
+PDF_INCREMENTAL = os.getenv("PDF_INCREMENTAL", "true").lower() not in ("0", "false", "no")
+
+# HTML 요소의 숫자 id (예: <table id='3'>)
+HTML_ID_RE = re.compile(r'(\bid=[\'"]?)(\d+)')
+
+
+class PageChunk:
+    def __init__(self, index: int, start_page: int, page_count: int, data: bytes):
+        """
+        PDF에서 잘라낸 연속된 페이지 묶음
+        start_page: 원본 문서에서 첫 페이지의 위치 (0부터 시작)
+        """
+        self.index = index
+        self.start_page = start_page
+        self.page_count = page_count
+        self.data = data
+
+    @property
+    def label(self) -> str:
+        return f"{self.start_page + 1}-{self.start_page + self.page_count}쪽"
+
+
+def is_pdf(data: memoryview) -> bool:
+    return bytes(data[:5]) == b"%PDF-"
+
+
+def open_pdf(data: memoryview) -> Optional["PdfReader"]:
+    """PDF를 엽니다. pypdf가 없거나, PDF가 아니거나, 읽을 수 없거나, 암호가 걸려 있으면 None"""
+    if PdfReader is None or not is_pdf(data):
+        return None
+    try:
+        reader = PdfReader(io.BytesIO(data))
+        if reader.is_encrypted and not reader.decrypt(""):
+            return None
+        len(reader.pages)
+        return reader
+    except Exception:
+        return None
+
+
+def split_pages(reader: "PdfReader", page_indices: List[int], pages_per_chunk: int = None) -> Optional[List[PageChunk]]:
+    """
+    page_indices(0부터)의 페이지를 연속된 구간별로, 최대 pages_per_chunk 페이지씩 묶은 조각 목록을 반환합니다.
+    분할에 실패하면 None
+    """
+    pages_per_chunk = max(1, pages_per_chunk or PDF_PAGES_PER_CHUNK)
+    runs: List[List[int]] = []
+    for index in sorted(page_indices):
+        if runs and runs[-1][-1] == index - 1 and len(runs[-1]) < pages_per_chunk:
+            runs[-1].append(index)
+        else:
+            runs.append([index])
+
+    try:
+        chunks = []
+        for run in runs:
+            writer = PdfWriter()
+            for index in run:
+                writer.add_page(reader.pages[index])
+            out = io.BytesIO()
+            writer.write(out)
+            chunks.append(PageChunk(len(chunks), run[0], len(run), out.getvalue()))
+        return chunks
+    except Exception:
+        # 분할에 실패하면 원본을 그대로 분석하도록 넘김
+        return None
+
+
+def split_pdf(data: memoryview, pages_per_chunk: int = None) -> Optional[List[PageChunk]]:
+    """
+    PDF를 pages_per_chunk 페이지씩 나눈 조각 목록을 반환합니다.
+    pypdf가 없거나, PDF가 아니거나, 읽을 수 없거나, 나눌 필요가 없으면 None
+    """
+    pages_per_chunk = pages_per_chunk or PDF_PAGES_PER_CHUNK
+    reader = open_pdf(data) if pages_per_chunk >= 1 else None
+    if reader is None or len(reader.pages) <= pages_per_chunk:
+        return None
+    return split_pages(reader, list(range(len(reader.pages))), pages_per_chunk)
+
+
+def _hash_object(obj, hasher, seen: set, depth: int = 0) -> None:
+    """페이지 리소스(글꼴, 그림 등)를 내용 기준으로 해시에 더합니다. (객체 번호가 바뀌어도 같은 값)"""
+    if isinstance(obj, IndirectObject):
+        if obj.idnum in seen or depth > 8:
+            return
+        seen.add(obj.idnum)
+        obj = obj.get_object()
+    if isinstance(obj, StreamObject):
+        try:
+            hasher.update(obj.get_data())
+        except Exception:
+            hasher.update(bytes(getattr(obj, "_data", b"") or b""))
+    if isinstance(obj, DictionaryObject):
+        for key in sorted(obj.keys()):
+            if key == "/Parent":
+                continue
+            hasher.update(key.encode("latin-1", "replace"))
+            _hash_object(obj.raw_get(key), hasher, seen, depth + 1)
+    elif isinstance(obj, ArrayObject):
+        for item in obj:
+            _hash_object(item, hasher, seen, depth + 1)
+    elif not isinstance(obj, StreamObject):
+        hasher.update(repr(obj).encode("utf-8", "replace"))
+
+
+def page_fingerprints(reader: "PdfReader") -> Optional[List[str]]:
+    """페이지마다 내용(본문 스트림, 리소스, 크기, 회전)의 해시를 반환합니다. 계산할 수 없으면 None"""
+    try:
+        fingerprints = []
+        for page in reader.pages:
+            hasher = hashlib.sha256()
+            hasher.update(repr([float(value) for value in page.mediabox]).encode("ascii"))
+            hasher.update(str(page.get("/Rotate", 0)).encode("ascii"))
+            contents = page.get_contents()
+            hasher.update(contents.get_data() if contents is not None else b"")
+            _hash_object(page.get("/Resources"), hasher, set())
+            fingerprints.append(hasher.hexdigest())
+        return fingerprints
+    except Exception:
+        return None
+
+
+class PagePlan:
+    def __init__(self, total_pages: int, fingerprints: Optional[List[str]], chunks: Optional[List[PageChunk]],
+                 reused: Dict[int, Dict[str, Any]]):
+        """
+        다시 올린 PDF를 어떻게 분석할지에 대한 계획
+        chunks: 원격 API로 분석할 조각 (None이면 문서 전체를 한 번에 분석)
+        reused: 바뀌지 않아 캐시에서 가져온 페이지 결과 {페이지 번호(0부터): 페이지 하나의 분석 결과}
+        """
+        self.total_pages = total_pages
+        self.fingerprints = fingerprints
+        self.chunks = chunks
+        self.reused = reused
+
+    @property
+    def whole(self) -> PageChunk:
+        return PageChunk(0, 0, self.total_pages, b"")
+
+    def reused_segments(self) -> List[Tuple[PageChunk, Dict[str, Any]]]:
+        return [(PageChunk(-1, index, 1, b""), data) for index, data in sorted(self.reused.items())]
+
+
+def split_result_pages(data: Dict[str, Any], page_count: int) -> Optional[List[Dict[str, Any]]]:
+    """
+    여러 페이지의 분석 결과를 페이지별 결과로 나눕니다. (페이지 재사용 캐시용)
+    페이지 HTML은 그 페이지 요소들의 HTML을 이어 붙여 만들고, id는 페이지마다 0부터 다시 매깁니다.
+    요소에 페이지 번호나 HTML이 없으면 나눌 수 없으므로 None
+    """
+    pages: List[List[Dict[str, Any]]] = [[] for _ in range(page_count)]
+    for element in data.get("elements") or []:
+        page = element.get("page")
+        html = (element.get("content") or {}).get("html") if isinstance(element.get("content"), dict) else None
+        if not isinstance(page, int) or not 1 <= page <= page_count or html is None or not isinstance(element.get("id"), int):
+            return None
+        pages[page - 1].append(element)
+
+    base = {key: value for key, value in data.items() if key not in ("content", "elements", "usage")}
+    results = []
+    for elements in pages:
+        offset = -min((element["id"] for element in elements), default=0)
+        renumbered = [
+            dict(element, id=element["id"] + offset, page=1,
+                 content=dict(element["content"], html=_shift_html_ids(element["content"]["html"], offset)))
+            for element in elements
+        ]
+        results.append(dict(base, content={"html": "\n".join(element["content"]["html"] for element in renumbered)},
+                            elements=renumbered, usage={"pages": 1}))
+    return results
+
+
+def _shift_html_ids(html: str, offset: int) -> str:
+    if not offset or not html:
+        return html
+    return HTML_ID_RE.sub(lambda m: f"{m.group(1)}{int(m.group(2)) + offset}", html)
+
+
+def merge_chunk_results(results: List[Tuple[PageChunk, Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    조각별 분석 결과를 페이지 순서대로 하나의 결과로 합칩니다.
+    - elements[*].page에 조각의 시작 페이지를 더함 (좌표는 페이지 기준 비율이므로 그대로 유지)
+    - elements[*].id와 HTML의 id가 겹치지 않도록 앞 조각의 id 개수만큼 밀어냄
+    - content의 각 형식(html 등)은 순서대로 이어 붙이고 usage.pages는 합산
+    """
+    results = sorted(results, key=lambda item: item[0].start_page)
+    merged = {key: value for key, value in results[0][1].items() if key not in ("content", "elements", "usage")}
+    contents = {}
+    elements = []
+    total_pages = 0
+    id_offset = 0
+
+    for chunk, data in results:
+        chunk_elements = data.get("elements") or []
+        for element in chunk_elements:
+            element = dict(element)
+            if isinstance(element.get("page"), int):
+                element["page"] += chunk.start_page
+            if isinstance(element.get("id"), int):
+                element["id"] += id_offset
+            if isinstance(element.get("content"), dict) and element["content"].get("html"):
+                element["content"] = dict(element["content"], html=_shift_html_ids(element["content"]["html"], id_offset))
+            elements.append(element)
+
+        for key, value in (data.get("content") or {}).items():
+            if isinstance(value, str):
+                contents.setdefault(key, []).append(_shift_html_ids(value, id_offset) if key == "html" else value)
+
+        total_pages += (data.get("usage") or {}).get("pages") or chunk.page_count
+        ids = [element["id"] for element in chunk_elements if isinstance(element.get("id"), int)]
+        if ids:
+            id_offset += max(ids) + 1
+
+    merged["content"] = {key: "\n".join(values) for key, values in contents.items()}
+    merged["elements"] = elements
+    merged["usage"] = {"pages": total_pages}
+    return merged
@@ -0,0 +1,140 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Any, Callable, List
+from text_improver import TextImprover
+from scheduler import scheduled
+
+logger = logging.getLogger("upthon.prefetch")
+
+# 문서 분석 직후 미리 생성할 평가요소 표 개수 (0이면 사용하지 않음)
+PREFETCH_TABLES = int(os.getenv("PREFETCH_TABLES", 3))
+# 미리 생성에 쓰는 동시 LLM 요청 수 (사용자가 직접 누른 요청보다 적게 유지)
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", 2))
+
+
+class PrefetchRun:
+    def __init__(self):
+        """한 문서(세션)에 대해 예약된 미리 생성 작업 묶음"""
+        self.cancelled = threading.Event()
+        self.futures: List[Future] = []
+
+    def cancel(self) -> int:
+        """아직 시작하지 않은 작업은 취소하고, 진행 중인 작업은 다음 단계로 넘어가지 않게 합니다."""
+        self.cancelled.set()
+        return sum(1 for future in self.futures if future.cancel())
+
+
+class Prefetcher:
+    def __init__(self, improver_factory: Callable[[], TextImprover] = TextImprover, max_tables: int = None, concurrency: int = None):
+        """
+        문서 분석이 끝나면 앞쪽 평가요소 표의 문장 옵션과 평가기준을 미리 생성하는 처리기
+        결과는 TextImprover의 생성 결과 캐시에 저장되므로 사용자가 버튼을 누르면 바로 응답합니다.
+        같은 세션에서 새 문서를 올리면 이전 문서의 남은 작업은 취소합니다.
+        """
+        self.improver_factory = improver_factory
+        self.max_tables = PREFETCH_TABLES if max_tables is None else max_tables
+        self.concurrency = max(1, concurrency or PREFETCH_CONCURRENCY)
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="prefetch")
+        self._runs: Dict[str, PrefetchRun] = {}
+        self._lock = threading.Lock()
+        self._stats = {"scheduled": 0, "completed": 0, "cancelled": 0, "failed": 0}
+
+    @staticmethod
+    def items_from_tables(tables: List[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+        """추출한 표 구조에서 평가요소가 있는 앞쪽 limit개를 미리 생성할 항목으로 만듭니다."""
+        items = []
+        for table in tables:
+            if len(items) >= limit:
+                break
+            if table.get("evaluation_element"):
+                items.append({
+                    "id": table.get("table_index"),
+                    "evaluationElement": table["evaluation_element"],
+                    "originalCriteria": table.get("criteria") or {},
+                    "context": table.get("context")
+                })
+        return items
+
+    def _count(self, field: str, amount: int = 1) -> None:
+        with self._lock:
+            self._stats[field] += amount
+
+    def schedule(self, session_id: str, tables: List[Dict[str, Any]], num_options: int = 3) -> int:
+        """
+        세션의 이전 미리 생성 작업을 취소하고 새 문서의 표들을 예약합니다.
+        반환값: 예약한 항목 수
+        """
+        items = self.items_from_tables(tables, self.max_tables) if self.max_tables > 0 else []
+        run = PrefetchRun()
+        with self._lock:
+            previous = self._runs.pop(session_id, None)
+            if items:
+                self._runs[session_id] = run
+        if previous is not None:
+            self._count("cancelled", previous.cancel())
+        if not items:
+            return 0
+
+        run.futures = [self._executor.submit(self._prefetch, run, session_id, item, num_options) for item in items]
+        for future in run.futures:
+            future.add_done_callback(lambda _: self._finish(session_id, run))
+        self._count("scheduled", len(items))
+        return len(items)
+
+    def _finish(self, session_id: str, run: PrefetchRun) -> None:
+        # 모든 작업이 끝난 세션은 목록에서 제거
+        if all(future.done() for future in run.futures):
+            with self._lock:
+                if self._runs.get(session_id) is run:
+                    del self._runs[session_id]
+
+    def cancel(self, session_id: str) -> int:
+        """세션의 남은 미리 생성 작업을 취소하고 취소한 개수를 반환합니다."""
+        with self._lock:
+            run = self._runs.pop(session_id, None)
+        cancelled = run.cancel() if run is not None else 0
+        self._count("cancelled", cancelled)
+        return cancelled
+
+    def _prefetch(self, run: PrefetchRun, session_id: str, item: Dict[str, Any], num_options: int) -> None:
+        """
+        화면의 '새로운 문장 생성' 버튼과 같은 요청(문장 옵션 → 첫 옵션의 평가기준)을 미리 보내 캐시를 채웁니다.
+        full 단계로 생성해 두므로 화면에서 요청하면 초안 없이 캐시된 결과를 바로 받습니다.
+        업스트림 요청은 가장 낮은 prefetch 우선순위로 보내 사용자가 누른 요청을 늦추지 않습니다.
+        """
+        if run.cancelled.is_set():
+            return
+        with scheduled("prefetch", session_id):
+            try:
+                improver = self.improver_factory()
+                options_result = improver.generate_text_options(item["evaluationElement"], item["context"], num_options, tier="full")
+                if not options_result.get("success"):
+                    self._count("failed")
+                    return
+                if run.cancelled.is_set():
+                    return
+                improver.generate_evaluation_criteria(options_result["options"][0], item["originalCriteria"], item["context"], tier="full")
+                self._count("completed")
+            except Exception:
+                logger.exception("미리 생성 실패: %s", item.get("evaluationElement"))
+                self._count("failed")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, max_tables=self.max_tables, concurrency=self.concurrency, sessions=len(self._runs))
+
+
+_default_prefetcher = None
+_default_prefetcher_lock = threading.Lock()
+
+
+def get_default_prefetcher() -> Prefetcher:
+    """프로세스 전체에서 공유하는 미리 생성 처리기를 반환합니다."""
+    global _default_prefetcher
+    if _default_prefetcher is None:
+        with _default_prefetcher_lock:
+            if _default_prefetcher is None:
+                _default_prefetcher = Prefetcher()
+    return _default_prefetcher
@@ -0,0 +1,471 @@
+import asyncio
+import contextlib
+import email.utils
+import logging
+import os
+import random
+import threading
+import time
+from typing import Dict, Any, Awaitable, Callable, Optional, Tuple, TypeVar
+from metrics import record_upstream
+from scheduler import scheduler_slot, async_scheduler_slot
+
+logger = logging.getLogger("upthon.upstream")
+
+T = TypeVar("T")
+
+# 다시 시도하는 HTTP 상태 코드
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+# 회로 차단기 실패로 세지 않는 상태 코드 (속도 제한은 대기 후 재시도만 함)
+THROTTLE_STATUS = {429}
+
+# 업스트림별 기본값 (환경변수 UPSTREAM_<이름>_<항목>으로 변경 가능)
+#   rate: 초당 요청 수, burst: 한 번에 보낼 수 있는 최대 요청 수
+#   timeout: 시도 한 번의 응답 대기 시간(초), deadline: 재시도를 포함한 전체 제한 시간(초)
+#   retries: 최대 재시도 횟수, failure_threshold: 연속 실패 몇 번에 차단할지, reset_timeout: 차단 후 다시 시도할 때까지(초)
+UPSTREAM_DEFAULTS = {
+    "document": {"rate": 2.0, "burst": 4, "timeout": 180.0, "deadline": 300.0, "retries": 3,
+                 "failure_threshold": 5, "reset_timeout": 30.0},
+    "chat": {"rate": 5.0, "burst": 10, "timeout": 120.0, "deadline": 240.0, "retries": 3,
+             "failure_threshold": 5, "reset_timeout": 30.0}
+}
+
+CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", 10.0))
+BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", 0.5))
+BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", 20.0))
+
+
+# 여러 프로세스가 함께 쓰는 동시 요청 제한 (예: 일괄 변환기의 multiprocessing 세마포어, 없으면 제한 없음)
+_concurrency_limit = None
+
+
+def set_concurrency_limit(limit) -> None:
+    """
+    모든 업스트림 요청 시도를 limit(acquire/release가 있는 세마포어) 안에서 보냅니다.
+    토큰 버킷은 프로세스마다 따로이므로, 여러 프로세스의 동시 요청 수를 묶을 때 사용합니다.
+    """
+    global _concurrency_limit
+    _concurrency_limit = limit
+
+
+@contextlib.contextmanager
+def _attempt_slot():
+    # 프로세스 안의 우선순위/세션별 대기열에서 차례를 받은 뒤, 프로세스 간 제한이 있으면 그 자리도 받음
+    with scheduler_slot():
+        limit = _concurrency_limit
+        if limit is None:
+            yield
+            return
+        limit.acquire()
+        try:
+            yield
+        finally:
+            limit.release()
+
+
+@contextlib.asynccontextmanager
+async def _async_attempt_slot():
+    async with async_scheduler_slot():
+        limit = _concurrency_limit
+        if limit is None:
+            yield
+            return
+        # 프로세스 간 세마포어는 이벤트 루프를 막지 않도록 스레드에서 기다림
+        await asyncio.to_thread(limit.acquire)
+        try:
+            yield
+        finally:
+            limit.release()
+
+
+class SlotStream:
+    """
+    스트리밍 응답을 감싸, 끝까지 읽거나 닫을 때까지 요청 자리(대기열/동시 요청 제한)를 잡아 둡니다.
+    (자리를 응답 시작까지만 잡으면 스트리밍 요청이 동시 요청 수와 interactive 예약 자리를 벗어남)
+    """
+
+    def __init__(self, stream, slot: contextlib.ExitStack):
+        self._stream = stream
+        self._slot = slot
+
+    def __iter__(self):
+        try:
+            yield from self._stream
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        try:
+            close = getattr(self._stream, "close", None)
+            if close is not None:
+                close()
+        finally:
+            # 여러 번 닫아도 자리는 한 번만 돌려줌
+            self._slot.close()
+
+
+class AsyncSlotStream:
+    """SlotStream의 비동기 버전"""
+
+    def __init__(self, stream, slot: contextlib.AsyncExitStack):
+        self._stream = stream
+        self._slot = slot
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self._stream:
+                yield chunk
+        finally:
+            await self.aclose()
+
+    async def aclose(self) -> None:
+        try:
+            close = getattr(self._stream, "aclose", None) or getattr(self._stream, "close", None)
+            if close is not None:
+                result = close()
+                if asyncio.iscoroutine(result):
+                    await result
+        finally:
+            await self._slot.aclose()
+
+
+class UpstreamError(Exception):
+    """업스트림 호출을 보내지 못했거나 제한 시간 안에 끝내지 못한 경우"""
+
+
+class CircuitOpenError(UpstreamError):
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"Upstage API({name})가 일시적으로 불안정하여 요청을 보내지 않았습니다. {retry_in:.0f}초 후 다시 시도해 주세요.")
+        self.retry_in = retry_in
+
+
+class DeadlineExceeded(UpstreamError):
+    def __init__(self, name: str, deadline: float):
+        super().__init__(f"Upstage API({name}) 응답 대기 시간({deadline:.0f}초)을 초과했습니다.")
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        """
+        초당 rate개씩 채워지고 최대 burst개까지 모이는 토큰 버킷
+        토큰이 없으면 미리 예약하고 채워질 때까지 기다립니다. (먼저 온 요청이 먼저 나감)
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, max_wait: float) -> Optional[float]:
+        """토큰 하나를 예약하고 기다려야 할 시간(초)을 반환합니다. max_wait보다 오래 기다려야 하면 예약하지 않고 None"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill(time.monotonic())
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if wait > max_wait:
+                return None
+            self._tokens -= 1
+            return wait
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        """
+        연속 실패가 failure_threshold번 쌓이면 reset_timeout초 동안 요청을 바로 거절하는 회로 차단기
+        그 뒤 한 번 시험 삼아 보내고(half_open) 성공하면 다시 열어 줍니다.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self) -> Optional[float]:
+        """요청을 보내도 되면 None, 차단 중이면 다시 시도할 수 있을 때까지 남은 시간(초)"""
+        with self._lock:
+            if self.state == "closed":
+                return None
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if self.state == "open" and remaining <= 0:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return None
+            return max(remaining, 1.0)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning("🚧 회로 차단: 연속 실패 %d회", self.failures)
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """실패로 세지 않는 결과(요청 오류, 속도 제한 등)로 시험 요청이 끝난 경우"""
+        with self._lock:
+            self._trial_running = False
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After 헤더(초 또는 HTTP 날짜)를 초 단위로 바꿉니다."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def classify_response(response: Any) -> Tuple[Optional[int], Optional[float]]:
+    """requests/httpx 응답의 (상태 코드, Retry-After 초)"""
+    status_code = getattr(response, "status_code", None)
+    headers = getattr(response, "headers", None) or {}
+    return status_code, parse_retry_after(headers.get("retry-after"))
+
+
+def classify_exception(error: Exception) -> Tuple[bool, Optional[int], Optional[float]]:
+    """예외의 (재시도 가능 여부, 상태 코드, Retry-After 초)"""
+    status_code = getattr(error, "status_code", None)
+    response = getattr(error, "response", None)
+    if status_code is None and response is not None:
+        status_code = getattr(response, "status_code", None)
+    retry_after = None
+    if response is not None:
+        retry_after = parse_retry_after((getattr(response, "headers", None) or {}).get("retry-after"))
+
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS, status_code, retry_after
+    # 상태 코드가 없는 예외는 연결 실패/시간 초과(requests, httpx, openai)인지 이름으로 판단
+    name = type(error).__name__
+    retryable = any(word in name for word in ("Timeout", "Connection", "ConnectError", "ReadError", "RemoteProtocolError"))
+    return retryable, None, None
+
+
+class Upstream:
+    def __init__(self, name: str, rate: float, burst: int, timeout: float, deadline: float, retries: int,
+                 failure_threshold: int, reset_timeout: float):
+        """
+        업스트림 엔드포인트 하나에 대한 속도 제한, 재시도, 제한 시간, 회로 차단 설정
+        call()/acall()에 시도 한 번의 제한 시간(초)을 받아 요청하는 함수를 넘기면 됩니다.
+        """
+        self.name = name
+        self.timeout = timeout
+        self.deadline = deadline
+        self.retries = retries
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._counters = {"calls": 0, "succeeded": 0, "failed": 0, "retries": 0, "rejected": 0, "throttled": 0, "deadline_exceeded": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, field: str) -> None:
+        with self._lock:
+            self._counters[field] += 1
+
+    @staticmethod
+    def backoff(attempt: int, retry_after: Optional[float] = None) -> float:
+        """지수 백오프에 지터(0~100%)를 더한 대기 시간. Retry-After가 있으면 그보다 짧게 기다리지 않음"""
+        delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+        return max(delay, retry_after or 0.0)
+
+    def _admit(self, deadline_at: float) -> Tuple[float, float]:
+        """회로 차단기와 토큰 버킷을 통과시키고 (대기 시간, 시도 제한 시간)을 반환합니다."""
+        retry_in = self.breaker.before_call()
+        if retry_in is not None:
+            self._count("rejected")
+            raise CircuitOpenError(self.name, retry_in)
+        remaining = deadline_at - time.monotonic()
+        wait = self.bucket.reserve(max(0.0, remaining)) if remaining > 0 else None
+        if wait is None:
+            self.breaker.release()
+            self._count("deadline_exceeded")
+            raise DeadlineExceeded(self.name, self.deadline)
+        if wait > 0:
+            self._count("throttled")
+        return wait, max(0.1, min(self.timeout, remaining - wait))
+
+    def _outcome(self, status_code: Optional[int], error: Optional[Exception]) -> bool:
+        """시도 결과를 회로 차단기에 기록하고 다시 시도할지 반환합니다."""
+        if error is not None:
+            retryable, status_code, _ = classify_exception(error)
+        else:
+            retryable = status_code in RETRYABLE_STATUS
+
+        if not retryable:
+            if error is None:
+                self.breaker.record_success()
+            else:
+                self.breaker.release()
+        elif status_code in THROTTLE_STATUS:
+            self.breaker.release()
+        else:
+            self.breaker.record_failure()
+        return retryable
+
+    def _next_delay(self, attempt: int, retry_after: Optional[float], deadline_at: float) -> Optional[float]:
+        if attempt >= self.retries:
+            return None
+        delay = self.backoff(attempt, retry_after)
+        if time.monotonic() + delay >= deadline_at:
+            return None
+        self._count("retries")
+        return delay
+
+    def call(self, request: Callable[[float], T], stream: bool = False) -> T:
+        """
+        request(timeout)을 속도 제한/회로 차단 아래에서 호출하고, 일시적인 실패는 재시도합니다.
+        재시도해도 실패한 HTTP 응답은 그대로 반환하고, 예외는 다시 발생시킵니다.
+        stream=True이면 응답을 SlotStream으로 감싸, 끝까지 읽거나 닫을 때까지 요청 자리를 잡아 둡니다.
+        """
+        self._count("calls")
+        deadline_at = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            wait, timeout = self._admit(deadline_at)
+            if wait:
+                time.sleep(wait)
+            started = time.perf_counter()
+            try:
+                with contextlib.ExitStack() as slot:
+                    slot.enter_context(_attempt_slot())
+                    # 동시 요청 제한을 기다린 시간은 응답 시간에서 제외
+                    started = time.perf_counter()
+                    response = request(timeout)
+                    if stream:
+                        response = SlotStream(response, slot.pop_all())
+            except Exception as e:
+                record_upstream(self.name, time.perf_counter() - started, classify_exception(e)[1] or type(e).__name__)
+                if not self._outcome(None, e):
+                    self._count("failed")
+                    raise
+                delay = self._next_delay(attempt, classify_exception(e)[2], deadline_at)
+                if delay is None:
+                    self._count("failed")
+                    raise
+                logger.info("🔁 %s 재시도 %d/%d (%.1f초 후): %s", self.name, attempt + 1, self.retries, delay, e)
+            else:
+                status_code, retry_after = classify_response(response)
+                # SDK 응답 객체처럼 상태 코드가 없는 결과는 성공(200)으로 기록
+                record_upstream(self.name, time.perf_counter() - started, status_code or 200)
+                if not self._outcome(status_code, None):
+                    self._count("succeeded" if status_code is None or status_code < 400 else "failed")
+                    return response
+                delay = self._next_delay(attempt, retry_after, deadline_at)
+                if delay is None:
+                    self._count("failed")
+                    return response
+                logger.info("🔁 %s 재시도 %d/%d (%.1f초 후): HTTP %s", self.name, attempt + 1, self.retries, delay, status_code)
+            time.sleep(delay)
+            attempt += 1
+
+    async def acall(self, request: Callable[[float], Awaitable[T]], stream: bool = False) -> T:
+        """call()의 비동기 버전 (stream=True이면 AsyncSlotStream으로 감싸 반환)"""
+        self._count("calls")
+        deadline_at = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            wait, timeout = self._admit(deadline_at)
+            if wait:
+                await asyncio.sleep(wait)
+            started = time.perf_counter()
+            try:
+                async with contextlib.AsyncExitStack() as slot:
+                    await slot.enter_async_context(_async_attempt_slot())
+                    started = time.perf_counter()
+                    response = await request(timeout)
+                    if stream:
+                        response = AsyncSlotStream(response, slot.pop_all())
+            except Exception as e:
+                record_upstream(self.name, time.perf_counter() - started, classify_exception(e)[1] or type(e).__name__)
+                if not self._outcome(None, e):
+                    self._count("failed")
+                    raise
+                delay = self._next_delay(attempt, classify_exception(e)[2], deadline_at)
+                if delay is None:
+                    self._count("failed")
+                    raise
+                logger.info("🔁 %s 재시도 %d/%d (%.1f초 후): %s", self.name, attempt + 1, self.retries, delay, e)
+            else:
+                status_code, retry_after = classify_response(response)
+                # SDK 응답 객체처럼 상태 코드가 없는 결과는 성공(200)으로 기록
+                record_upstream(self.name, time.perf_counter() - started, status_code or 200)
+                if not self._outcome(status_code, None):
+                    self._count("succeeded" if status_code is None or status_code < 400 else "failed")
+                    return response
+                delay = self._next_delay(attempt, retry_after, deadline_at)
+                if delay is None:
+                    self._count("failed")
+                    return response
+                logger.info("🔁 %s 재시도 %d/%d (%.1f초 후): HTTP %s", self.name, attempt + 1, self.retries, delay, status_code)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+        return dict(
+            counters,
+            circuit=self.breaker.state,
+            consecutive_failures=self.breaker.failures,
+            tokens=round(self.bucket.tokens, 2),
+            rate=self.bucket.rate,
+            burst=self.bucket.burst,
+            timeout=self.timeout,
+            deadline=self.deadline
+        )
+
+
+def _setting(name: str, key: str, default):
+    value = os.getenv(f"UPSTREAM_{name.upper()}_{key.upper()}")
+    return type(default)(value) if value is not None else default
+
+
+_upstreams: Dict[str, Upstream] = {}
+_upstreams_lock = threading.Lock()
+
+
+def get_upstream(name: str) -> Upstream:
+    """프로세스 전체에서 공유하는 업스트림 설정을 반환합니다. ("document", "chat")"""
+    upstream = _upstreams.get(name)
+    if upstream is None:
+        with _upstreams_lock:
+            upstream = _upstreams.get(name)
+            if upstream is None:
+                defaults = UPSTREAM_DEFAULTS.get(name, UPSTREAM_DEFAULTS["chat"])
+                upstream = Upstream(name, **{key: _setting(name, key, value) for key, value in defaults.items()})
+                _upstreams[name] = upstream
+    return upstream
+
+
+def upstream_stats() -> Dict[str, Any]:
+    """모든 업스트림의 회로 상태, 토큰 수, 호출/재시도/거절 횟수"""
+    for name in UPSTREAM_DEFAULTS:
+        get_upstream(name)
+    with _upstreams_lock:
+        upstreams = list(_upstreams.values())
+    return {upstream.name: upstream.stats() for upstream in upstreams}
@@ -0,0 +1,254 @@
+import asyncio
+import contextlib
+import contextvars
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Any, Callable, Deque, Iterator, AsyncIterator, Optional, Tuple
+from metrics import SCHEDULER_WAIT_SECONDS
+
+# 우선순위 (앞일수록 먼저): interactive(화면에서 누른 요청) > bulk(일괄 생성/변환) > prefetch(미리 생성)
+PRIORITIES = ("interactive", "bulk", "prefetch")
+
+# 업스트림 요청 순서 조정 사용 여부 (0이면 끄기)
+SCHEDULER = os.getenv("SCHEDULER", "true").lower() not in ("0", "false", "no")
+# 문서 분석/LLM 요청을 합쳐 동시에 보낼 수 있는 최대 개수 (스트리밍 응답은 끝까지 받을 때까지 자리를 차지)
+# 지정하지 않으면 서버마다 정함: Flask(스레드 서버)는 DEFAULT_SCHEDULER_CONCURRENCY,
+# ASGI 서버는 configure_scheduler()로 비동기 HTTP 연결 풀 크기(ASYNC_MAX_CONNECTIONS)를 사용
+# (값을 지정하면 ASGI 서버에서도 그 값이 연결 풀보다 먼저 동시 요청 수를 제한함)
+SCHEDULER_CONCURRENCY = int(os.getenv("SCHEDULER_CONCURRENCY", 0))
+DEFAULT_SCHEDULER_CONCURRENCY = 8
+# interactive 요청만 쓸 수 있도록 남겨 두는 자리 수 (bulk/prefetch는 나머지 자리만 사용)
+# 지정하지 않으면 전체 자리의 1/4 (최소 2)
+SCHEDULER_INTERACTIVE_RESERVE = os.getenv("SCHEDULER_INTERACTIVE_RESERVE")
+
+# configure_scheduler()로 정한 서버 기본 동시 요청 수
+_server_concurrency = None
+
+# 현재 코드가 어떤 (우선순위, 세션)의 작업인지 (스레드/비동기 태스크마다 따로)
+_current: contextvars.ContextVar[Tuple[str, str]] = contextvars.ContextVar(
+    "upthon_schedule", default=("interactive", "anonymous"))
+
+
+@contextlib.contextmanager
+def scheduled(priority: str, session_id: Optional[str] = None) -> Iterator[None]:
+    """
+    이 블록 안에서 보내는 업스트림 요청을 priority/session_id의 대기열에 넣습니다.
+    session_id를 지정하지 않으면 바깥 블록의 세션을 그대로 씁니다.
+    """
+    if priority not in PRIORITIES:
+        priority = "interactive"
+    token = _current.set((priority, session_id or _current.get()[1]))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def set_schedule(priority: str, session_id: str) -> None:
+    """
+    현재 스레드(또는 태스크)의 이후 업스트림 요청을 priority/session_id의 대기열에 넣습니다.
+    블록으로 감쌀 수 없는 곳(요청마다 처음에 다시 정하는 Flask before_request)에서 사용합니다.
+    """
+    _current.set((priority if priority in PRIORITIES else "interactive", session_id or "anonymous"))
+
+
+def current_schedule() -> Tuple[str, str]:
+    """현재 (우선순위, 세션)"""
+    return _current.get()
+
+
+class _Waiter:
+    __slots__ = ("priority", "session_id", "enqueued", "wake", "granted")
+
+    def __init__(self, priority: str, session_id: str, wake: Callable[[], None]):
+        self.priority = priority
+        self.session_id = session_id
+        self.enqueued = time.perf_counter()
+        self.wake = wake
+        self.granted = False
+
+
+class FairScheduler:
+    def __init__(self, concurrency: int = None, interactive_reserve: int = None):
+        """
+        업스트림 요청 시도마다 자리를 나눠 주는 우선순위 + 세션별 공정 대기열
+        - 자리가 비면 높은 우선순위부터, 같은 우선순위 안에서는 세션을 돌아가며 하나씩 내보냄
+          (한 사용자의 큰 일괄 작업이 다른 사용자의 요청을 밀어내지 않음)
+        - bulk/prefetch는 interactive_reserve만큼의 자리를 쓰지 않으므로 클릭 요청은 거의 기다리지 않음
+        """
+        self.concurrency = max(1, concurrency or SCHEDULER_CONCURRENCY or _server_concurrency or DEFAULT_SCHEDULER_CONCURRENCY)
+        if interactive_reserve is not None:
+            reserve = interactive_reserve
+        elif SCHEDULER_INTERACTIVE_RESERVE is not None:
+            reserve = int(SCHEDULER_INTERACTIVE_RESERVE)
+        else:
+            reserve = max(2, self.concurrency // 4)
+        self.background_limit = max(1, self.concurrency - max(0, reserve))
+        self._queues: Dict[str, "OrderedDict[str, Deque[_Waiter]]"] = {priority: OrderedDict() for priority in PRIORITIES}
+        self._running = 0
+        self._running_background = 0
+        self._lock = threading.Lock()
+        self._stats = {priority: {"granted": 0, "cancelled": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+                       for priority in PRIORITIES}
+
+    def _enqueue(self, waiter: _Waiter) -> None:
+        self._queues[waiter.priority].setdefault(waiter.session_id, deque()).append(waiter)
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """빈 자리만큼 대기열에서 차례를 골라 깨웁니다. (_lock 안에서 호출)"""
+        while self._running < self.concurrency:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            waiter.granted = True
+            self._running += 1
+            if waiter.priority != "interactive":
+                self._running_background += 1
+            waited = time.perf_counter() - waiter.enqueued
+            stats = self._stats[waiter.priority]
+            stats["granted"] += 1
+            stats["wait_seconds"] += waited
+            stats["max_wait_seconds"] = max(stats["max_wait_seconds"], waited)
+            SCHEDULER_WAIT_SECONDS.observe(waited, waiter.priority)
+            waiter.wake()
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        for priority in PRIORITIES:
+            if priority != "interactive" and self._running_background >= self.background_limit:
+                return None
+            sessions = self._queues[priority]
+            if not sessions:
+                continue
+            # 맨 앞 세션의 요청 하나를 꺼내고 그 세션은 맨 뒤로 보냄 (라운드 로빈)
+            session_id, waiters = next(iter(sessions.items()))
+            waiter = waiters.popleft()
+            if waiters:
+                sessions.move_to_end(session_id)
+            else:
+                del sessions[session_id]
+            return waiter
+        return None
+
+    def _remove(self, waiter: _Waiter) -> None:
+        """차례를 받기 전에 포기한 요청을 대기열에서 뺍니다. (_lock 안에서 호출)"""
+        waiters = self._queues[waiter.priority].get(waiter.session_id)
+        if waiters is not None and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del self._queues[waiter.priority][waiter.session_id]
+        self._stats[waiter.priority]["cancelled"] += 1
+
+    def release(self, waiter: _Waiter) -> None:
+        with self._lock:
+            self._running -= 1
+            if waiter.priority != "interactive":
+                self._running_background -= 1
+            self._dispatch()
+
+    @contextlib.contextmanager
+    def slot(self) -> Iterator[None]:
+        """현재 (우선순위, 세션)의 차례가 올 때까지 기다린 뒤 블록을 실행합니다."""
+        priority, session_id = current_schedule()
+        event = threading.Event()
+        waiter = _Waiter(priority, session_id, event.set)
+        with self._lock:
+            self._enqueue(waiter)
+        try:
+            event.wait()
+        except BaseException:
+            with self._lock:
+                if not waiter.granted:
+                    self._remove(waiter)
+                    raise
+            self.release(waiter)
+            raise
+        try:
+            yield
+        finally:
+            self.release(waiter)
+
+    @contextlib.asynccontextmanager
+    async def aslot(self) -> AsyncIterator[None]:
+        """slot()의 비동기 버전 (다른 스레드에서 자리가 나도 이벤트 루프에서 깨어남)"""
+        priority, session_id = current_schedule()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        waiter = _Waiter(priority, session_id, wake)
+        with self._lock:
+            self._enqueue(waiter)
+        try:
+            await future
+        except BaseException:
+            with self._lock:
+                if not waiter.granted:
+                    self._remove(waiter)
+                    raise
+            self.release(waiter)
+            raise
+        try:
+            yield
+        finally:
+            self.release(waiter)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            priorities = {
+                priority: {
+                    "queued": sum(len(waiters) for waiters in self._queues[priority].values()),
+                    "sessions": len(self._queues[priority]),
+                    "granted": stats["granted"],
+                    "cancelled": stats["cancelled"],
+                    "avg_wait_seconds": round(stats["wait_seconds"] / stats["granted"], 4) if stats["granted"] else 0.0,
+                    "max_wait_seconds": round(stats["max_wait_seconds"], 4)
+                }
+                for priority, stats in self._stats.items()
+            }
+            return {
+                "concurrency": self.concurrency,
+                "background_limit": self.background_limit,
+                "running": self._running,
+                "running_background": self._running_background,
+                "priorities": priorities
+            }
+
+
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+
+def configure_scheduler(concurrency: int) -> None:
+    """
+    이 서버의 기본 동시 요청 수를 정합니다. SCHEDULER_CONCURRENCY를 지정했으면 그 값이 우선합니다.
+    대기열을 처음 만들기 전(서버 모듈을 불러올 때)에 호출해야 합니다.
+    """
+    global _server_concurrency
+    _server_concurrency = concurrency
+
+
+def get_scheduler() -> Optional[FairScheduler]:
+    """프로세스 전체에서 공유하는 업스트림 요청 대기열. SCHEDULER=0이면 None"""
+    global _default_scheduler
+    if not SCHEDULER:
+        return None
+    if _default_scheduler is None:
+        with _default_scheduler_lock:
+            if _default_scheduler is None:
+                _default_scheduler = FairScheduler()
+    return _default_scheduler
+
+
+def scheduler_slot():
+    scheduler = get_scheduler()
+    return scheduler.slot() if scheduler is not None else contextlib.nullcontext()
+
+
+def async_scheduler_slot():
+    scheduler = get_scheduler()
+    return scheduler.aslot() if scheduler is not None else contextlib.nullcontext()
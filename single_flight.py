@@ -0,0 +1,267 @@
+import asyncio
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+from typing import Dict, Any, Awaitable, Callable, Optional, Tuple, TypeVar
+
+try:
+    import fcntl
+except ImportError:  # Windows: 프로세스 간 공유 없이 프로세스 안에서만 합침
+    fcntl = None
+
+logger = logging.getLogger("upthon.single_flight")
+
+T = TypeVar("T")
+
+# 같은 요청을 동시에 보내면 한 번만 보내고 결과를 나눠 가짐 (0이면 끄기)
+SINGLE_FLIGHT = os.getenv("SINGLE_FLIGHT", "true").lower() not in ("0", "false", "no")
+# 다른 워커 프로세스와도 잠금 파일로 합칠지 여부
+SINGLE_FLIGHT_SHARED = os.getenv("SINGLE_FLIGHT_SHARED", "true").lower() not in ("0", "false", "no")
+SINGLE_FLIGHT_DIR = os.getenv("SINGLE_FLIGHT_DIR", os.path.join(".cache", "flights"))
+# 다른 프로세스가 기다리다 가져갈 수 있도록 결과 파일을 유효하게 보는 시간 (초)
+SINGLE_FLIGHT_RESULT_TTL = float(os.getenv("SINGLE_FLIGHT_RESULT_TTL", 10.0))
+# 결과 파일 정리 주기 (요청 몇 번마다)
+SWEEP_EVERY = 200
+
+
+class SharedFlightError(Exception):
+    """다른 프로세스에서 보낸 같은 요청이 실패했고, 그 예외를 그대로 옮길 수 없는 경우"""
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, name: str, shared: bool = None, lock_dir: str = None, result_ttl: float = None):
+        """
+        입력이 같은 업스트림 호출이 동시에 들어오면 한 번만 보내고, 기다리던 모두에게 같은 결과나 예외를 돌려줍니다.
+        프로세스 안에서는 스레드/코루틴끼리, 프로세스 사이에서는 키별 잠금 파일(flock)과 결과 파일로 합칩니다.
+        shared: 프로세스 간에도 합칠지 여부 (지정하지 않으면 SINGLE_FLIGHT_SHARED, fcntl이 없으면 항상 False)
+        """
+        self.name = name
+        self.shared = (SINGLE_FLIGHT_SHARED if shared is None else shared) and fcntl is not None
+        self.lock_dir = lock_dir or SINGLE_FLIGHT_DIR
+        self.result_ttl = SINGLE_FLIGHT_RESULT_TTL if result_ttl is None else result_ttl
+        if self.shared:
+            os.makedirs(self.lock_dir, exist_ok=True)
+        self._calls: Dict[str, _Call] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._lock = threading.Lock()
+        self._counters = {"leaders": 0, "followers": 0, "shared_followers": 0}
+
+    def _count(self, field: str) -> None:
+        with self._lock:
+            self._counters[field] += 1
+            sweep = field == "leaders" and self.shared and self._counters["leaders"] % SWEEP_EVERY == 0
+        if sweep:
+            self.sweep()
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.lock_dir, f"{self.name}-{digest}")
+
+    def do(self, key: str, fn: Callable[[], T]) -> T:
+        """key가 같은 호출이 진행 중이면 그 결과를 기다리고, 아니면 fn()을 호출합니다."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            self._count("followers")
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._shared_do(key, fn) if self.shared else self._lead(fn)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        do()의 비동기 버전. 실제 호출은 별도 태스크에서 하므로 먼저 온 요청이 취소되어도 기다리는 다른 요청은 결과를 받습니다.
+        """
+        loop = asyncio.get_running_loop()
+        task = self._tasks.get(key)
+        if task is not None and not task.done() and task.get_loop() is loop:
+            self._count("followers")
+        else:
+            task = loop.create_task(self._shared_ado(key, fn) if self.shared else self._alead(fn))
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._task_done(key, done))
+        return await asyncio.shield(task)
+
+    def _task_done(self, key: str, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # 기다리던 요청이 모두 취소된 경우 "예외를 꺼내지 않았다"는 경고가 나오지 않도록 꺼내 둠
+        if not task.cancelled():
+            task.exception()
+
+    def _lead(self, fn: Callable[[], T]) -> T:
+        self._count("leaders")
+        return fn()
+
+    async def _alead(self, fn: Callable[[], Awaitable[T]]) -> T:
+        self._count("leaders")
+        return await fn()
+
+    def _acquire(self, path: str) -> Tuple[int, bool]:
+        """잠금 파일을 잠그고 (파일 디스크립터, 바로 잠갔는지)를 반환합니다. 다른 프로세스가 잠갔으면 풀릴 때까지 기다림"""
+        fd = os.open(f"{path}.lock", os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return fd, True
+        except BlockingIOError:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            return fd, False
+        except BaseException:
+            os.close(fd)
+            raise
+
+    @staticmethod
+    def _release(fd: int) -> None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def _read_result(self, path: str) -> Optional[Tuple[str, Any]]:
+        """방금 끝난 다른 프로세스의 결과 ("value"|"error", 값). 없거나 오래되었거나 읽을 수 없으면 None"""
+        try:
+            if time.time() - os.path.getmtime(f"{path}.result") > self.result_ttl:
+                return None
+            with open(f"{path}.result", "rb") as f:
+                return pickle.load(f)
+        except (OSError, pickle.PickleError, EOFError, AttributeError, ImportError, TypeError):
+            return None
+
+    def _write_result(self, path: str, kind: str, value: Any) -> None:
+        try:
+            payload = pickle.dumps((kind, value))
+        except Exception:
+            if kind != "error":
+                return
+            payload = pickle.dumps((kind, SharedFlightError(f"{type(value).__name__}: {value}")))
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, f"{path}.result")
+
+    def _discard_result(self, path: str) -> None:
+        try:
+            os.remove(f"{path}.result")
+        except FileNotFoundError:
+            pass
+
+    def _shared_outcome(self, outcome: Tuple[str, Any]) -> Any:
+        self._count("shared_followers")
+        kind, value = outcome
+        if kind == "error":
+            raise value
+        return value
+
+    def _shared_do(self, key: str, fn: Callable[[], T]) -> T:
+        path = self._path(key)
+        fd, first = self._acquire(path)
+        try:
+            if not first:
+                # 다른 프로세스가 같은 요청을 보내는 동안 기다렸으면 그 결과를 사용
+                outcome = self._read_result(path)
+                if outcome is not None:
+                    return self._shared_outcome(outcome)
+            self._discard_result(path)
+            try:
+                result = self._lead(fn)
+            except Exception as e:
+                self._write_result(path, "error", e)
+                raise
+            self._write_result(path, "value", result)
+            return result
+        finally:
+            self._release(fd)
+
+    async def _shared_ado(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        path = self._path(key)
+        # 다른 프로세스의 잠금을 기다리는 동안 이벤트 루프를 막지 않도록 스레드에서 잠금
+        fd, first = await asyncio.to_thread(self._acquire, path)
+        try:
+            if not first:
+                outcome = await asyncio.to_thread(self._read_result, path)
+                if outcome is not None:
+                    return self._shared_outcome(outcome)
+            self._discard_result(path)
+            try:
+                result = await self._alead(fn)
+            except Exception as e:
+                await asyncio.to_thread(self._write_result, path, "error", e)
+                raise
+            await asyncio.to_thread(self._write_result, path, "value", result)
+            return result
+        finally:
+            self._release(fd)
+
+    def sweep(self) -> int:
+        """유효 시간이 지난 결과 파일을 지우고 지운 개수를 반환합니다. (잠금 파일은 빈 파일이라 그대로 둠)"""
+        removed = 0
+        prefix = f"{self.name}-"
+        now = time.time()
+        try:
+            names = os.listdir(self.lock_dir)
+        except OSError:
+            return 0
+        for name in names:
+            if not (name.startswith(prefix) and name.endswith(".result")):
+                continue
+            path = os.path.join(self.lock_dir, name)
+            try:
+                if now - os.path.getmtime(path) > self.result_ttl:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            counters["in_flight"] = len(self._calls) + len(self._tasks)
+        counters["shared"] = self.shared
+        return counters
+
+
+_flights: Dict[str, SingleFlight] = {}
+_flights_lock = threading.Lock()
+
+
+def get_single_flight(name: str) -> Optional[SingleFlight]:
+    """프로세스 전체에서 공유하는 이름별("document", "chat") 합치기 계층. SINGLE_FLIGHT=0이면 None"""
+    if not SINGLE_FLIGHT:
+        return None
+    flight = _flights.get(name)
+    if flight is None:
+        with _flights_lock:
+            flight = _flights.get(name)
+            if flight is None:
+                flight = SingleFlight(name)
+                _flights[name] = flight
+    return flight
+
+
+def single_flight_stats() -> Dict[str, Any]:
+    return {name: flight.stats() for name, flight in list(_flights.items())}
@@ -0,0 +1,14 @@
+import json
+from typing import Dict, Any
+
+
+def sse_event(event: Dict[str, Any]) -> str:
+    """이벤트 딕셔너리를 Server-Sent Events 형식 문자열로 변환"""
+    return f"event: {event.get('type', 'message')}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+# 프록시 버퍼링 없이 이벤트가 바로 전달되도록 하는 응답 헤더
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no'
+}
@@ -0,0 +1,210 @@
+import hashlib
+import re
+from collections import deque
+from html.parser import HTMLParser
+from typing import Dict, Any, List, Optional
+
+CRITERIA_LEVELS = ['매우잘함', '잘함', '보통', '노력요함']
+
+# 표 바로 앞에서 학년/학기/과목 정보를 찾을 형제 요소 개수
+CONTEXT_SIBLINGS = 5
+
+# 닫는 태그가 없는 요소
+VOID_ELEMENTS = {'br', 'img', 'hr', 'input', 'meta', 'link', 'col', 'wbr', 'source', 'area', 'base', 'embed', 'param', 'track'}
+
+# 줄바꿈으로 취급하는 요소 (브라우저 innerText와 비슷하게)
+LINE_BREAK_ELEMENTS = {'br', 'p', 'div', 'li', 'tr', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'footer'}
+
+
+def empty_context() -> Dict[str, str]:
+    return {
+        'grade': '',
+        'semester': '',
+        'subject': '',
+        'unit': '',
+        'criteria': '',
+        'domain': ''
+    }
+
+
+def normalize_text(text: str) -> str:
+    """줄 안의 연속 공백을 하나로 합치고 앞뒤 공백을 제거합니다."""
+    lines = [re.sub(r'[ \t\r\f\v]+', ' ', line).strip() for line in text.split('\n')]
+    return '\n'.join(line for line in lines if line)
+
+
+class _Node:
+    __slots__ = ('tag', 'text', 'sibling_texts')
+
+    def __init__(self, tag: str):
+        self.tag = tag
+        self.text = []
+        # 이 요소 안에서 마지막으로 닫힌 자식 요소들의 텍스트
+        self.sibling_texts = deque(maxlen=CONTEXT_SIBLINGS)
+
+
+class _TableState:
+    def __init__(self, table_index: int, preceding_texts: List[str]):
+        self.table_index = table_index
+        self.preceding_texts = preceding_texts
+        self.rows = []
+        self.current_row = None
+        self.current_cell = None
+
+
+class AssessmentTableParser(HTMLParser):
+    """
+    Upstage HTML을 한 번만 훑으면서 표 구조와 표 앞 형제 요소의 텍스트를 수집하는 스트리밍 파서
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack = [_Node('#root')]
+        self.tables = []
+        self.table_stack = []
+        self.table_count = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in LINE_BREAK_ELEMENTS:
+            self._append_text('\n')
+        if tag in VOID_ELEMENTS:
+            return
+
+        if tag == 'table':
+            preceding = list(self.stack[-1].sibling_texts)
+            self.table_stack.append(_TableState(self.table_count, preceding))
+            self.table_count += 1
+        elif self.table_stack:
+            table = self.table_stack[-1]
+            if tag == 'tr':
+                table.current_row = []
+                table.rows.append(table.current_row)
+            elif tag in ('td', 'th') and table.current_row is not None:
+                table.current_cell = []
+                table.current_row.append(table.current_cell)
+
+        self.stack.append(_Node(tag))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        if tag in VOID_ELEMENTS:
+            return
+        # 닫히지 않은 요소가 있어도 가장 가까운 같은 태그까지 정리
+        if not any(node.tag == tag for node in self.stack[1:]):
+            return
+        while True:
+            node = self.stack.pop()
+            self._close_node(node)
+            if node.tag == tag:
+                break
+
+    def _close_node(self, node: _Node):
+        text = ''.join(node.text)
+        parent = self.stack[-1]
+        parent.text.append(text)
+        parent.sibling_texts.append(normalize_text(text))
+
+        if self.table_stack:
+            table = self.table_stack[-1]
+            if node.tag in ('td', 'th'):
+                table.current_cell = None
+            elif node.tag == 'tr':
+                table.current_row = None
+            elif node.tag == 'table':
+                self.tables.append(self.table_stack.pop())
+
+        if node.tag in LINE_BREAK_ELEMENTS:
+            self._append_text('\n')
+
+    def _append_text(self, data: str):
+        self.stack[-1].text.append(data)
+        if self.table_stack and self.table_stack[-1].current_cell is not None:
+            self.table_stack[-1].current_cell.append(data)
+
+    def handle_data(self, data):
+        self._append_text(data)
+
+    def close(self):
+        super().close()
+        while len(self.stack) > 1:
+            self._close_node(self.stack.pop())
+
+
+def table_fingerprint(rows: List[List[str]]) -> str:
+    """표 내용(정규화한 셀 텍스트)의 지문. 다시 올린 문서에서 같은 표를 찾는 데 사용합니다."""
+    text = '\n'.join('\t'.join(row) for row in rows)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def _context_from_table(rows: List[List[str]], preceding_texts: List[str]) -> Dict[str, str]:
+    context = empty_context()
+
+    # 테이블 내 정보 수집
+    for row in rows:
+        first_cell = row[0] if len(row) > 0 else None
+        second_cell = row[1] if len(row) > 1 else None
+        if first_cell == '단원명':
+            context['unit'] = second_cell
+        elif first_cell == '성취기준':
+            context['criteria'] = second_cell
+        elif first_cell in ('영 역', '영역'):
+            context['domain'] = second_cell
+
+    # 학년/학기, 과목 정보 (표 위의 텍스트에서)
+    for text in preceding_texts:
+        if '학년' in text and '학기' in text:
+            grade_match = re.search(r'(\d+)학년', text)
+            semester_match = re.search(r'(\d+)학기', text)
+            if grade_match:
+                context['grade'] = grade_match.group(1)
+            if semester_match:
+                context['semester'] = semester_match.group(1)
+        if '과' in text and '평가' in text:
+            context['subject'] = text.replace('평가 기준안', '').strip()
+
+    return context
+
+
+def extract_assessment_tables(html: str) -> List[Dict[str, Any]]:
+    """
+    문서 HTML에서 평가요소/평가기준이 있는 표를 찾아 구조화된 목록으로 반환합니다.
+    table_index는 문서 안의 모든 <table> 중 몇 번째인지를, row/col은 표 안의 셀 위치를 나타냅니다.
+    fingerprint는 표 내용의 지문으로, 문서를 다시 올렸을 때 이전에 고른 문장을 되살리는 데 씁니다.
+    """
+    parser = AssessmentTableParser()
+    parser.feed(html or '')
+    parser.close()
+
+    results = []
+    for table in sorted(parser.tables, key=lambda t: t.table_index):
+        rows = [[normalize_text(''.join(cell)) for cell in row] for row in table.rows]
+
+        evaluation_element: Optional[str] = None
+        evaluation_cell = None
+        criteria = {}
+        criteria_cells = {}
+        for row_index, row in enumerate(rows):
+            if len(row) < 2:
+                continue
+            if row[0] == '평가요소' and evaluation_cell is None:
+                evaluation_element = row[1]
+                evaluation_cell = {'row': row_index, 'col': 1}
+            elif row[0] in CRITERIA_LEVELS and row[0] not in criteria:
+                criteria[row[0]] = row[1]
+                criteria_cells[row[0]] = {'row': row_index, 'col': 1}
+
+        if evaluation_cell is None and not criteria:
+            continue
+
+        results.append({
+            'table_index': table.table_index,
+            'fingerprint': table_fingerprint(rows),
+            'context': _context_from_table(rows, table.preceding_texts),
+            'evaluation_element': evaluation_element,
+            'evaluation_element_cell': evaluation_cell,
+            'criteria': criteria,
+            'criteria_cells': criteria_cells
+        })
+    return results
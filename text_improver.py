@@ -1,45 +1,134 @@
-from openai import OpenAI
 from dotenv import load_dotenv
+import json
 import os
-from typing import Dict, Any
+import re
+import time
+from typing import Dict, Any, Callable, Generator, Iterator, List, Optional, Tuple
+from http_clients import get_openai_client
+from completion_cache import CompletionCache, CompletionKey, get_default_text_cache
+from resilience import get_upstream
+from metrics import timed_method, record_usage, TIER_SECONDS
+from generation_tiers import choose_tier, tier_params
+from single_flight import get_single_flight
 
 # .env 로드
 load_dotenv()
 
+CRITERIA_LEVELS = ['매우잘함', '잘함', '보통', '노력요함']
+
+# 구조화 출력에서 빠진 항목만 다시 요청하는 최대 횟수
+STRUCTURED_MAX_REPAIRS = int(os.getenv("STRUCTURED_MAX_REPAIRS", 1))
+
+CRITERIA_SCHEMA = {
+    "type": "object",
+    "properties": {level: {"type": "string"} for level in CRITERIA_LEVELS},
+    "required": CRITERIA_LEVELS,
+    "additionalProperties": False
+}
+
+OPTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "text": {"type": "string"},
+        "criteria": CRITERIA_SCHEMA
+    },
+    "required": ["text", "criteria"],
+    "additionalProperties": False
+}
+
+
+def build_context_str(context: Dict[str, str] = None, include_criteria: bool = True) -> str:
+    """학년, 학기, 과목, 단원명, 영역, 성취기준 정보를 프롬프트용 문자열로 만듭니다."""
+    context_str = ""
+    if not context:
+        return context_str
+    if context.get('grade') and context.get('semester'):
+        context_str += f"- 대상: {context['grade']}학년 {context['semester']}학기\n"
+    if context.get('subject'):
+        context_str += f"- 과목: {context['subject']}\n"
+    if context.get('unit'):
+        context_str += f"- 단원: {context['unit']}\n"
+    if context.get('domain'):
+        context_str += f"- 영역: {context['domain']}\n"
+    if include_criteria and context.get('criteria'):
+        context_str += f"- 성취기준: {context['criteria']}\n"
+    return context_str
+
+
+def structured_schema(num_options: int) -> Dict[str, Any]:
+    """문장 옵션과 옵션별 4단계 평가기준을 한 번에 받는 JSON 스키마"""
+    return {
+        "type": "object",
+        "properties": {
+            "options": {"type": "array", "items": OPTION_SCHEMA, "minItems": num_options, "maxItems": num_options}
+        },
+        "required": ["options"],
+        "additionalProperties": False
+    }
+
+
+def repair_schema(missing_levels: Dict[int, List[str]], missing_options: int) -> Dict[str, Any]:
+    """빠진 항목(옵션별 평가기준 수준, 부족한 옵션)만 받는 JSON 스키마"""
+    properties = {}
+    for index, levels in missing_levels.items():
+        properties[f"option_{index + 1}"] = {
+            "type": "object",
+            "properties": {level: {"type": "string"} for level in levels},
+            "required": levels,
+            "additionalProperties": False
+        }
+    if missing_options:
+        properties["new_options"] = {"type": "array", "items": OPTION_SCHEMA, "minItems": missing_options, "maxItems": missing_options}
+    return {"type": "object", "properties": properties, "required": list(properties), "additionalProperties": False}
+
+
+def load_json_object(text: str) -> Dict[str, Any]:
+    """응답에서 JSON 객체를 읽습니다. 코드 블록(```json)으로 감싼 경우도 처리하며 실패하면 빈 딕셔너리"""
+    text = (text or "").strip()
+    fenced = re.search(r"```(?:json)?\s*(.*?)```", text, re.S)
+    if fenced:
+        text = fenced.group(1).strip()
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        return {}
+    try:
+        value = json.loads(text[start:end + 1])
+    except ValueError:
+        return {}
+    return value if isinstance(value, dict) else {}
+
+
+def completion_flight_key(base_url: Any, kwargs: Dict[str, Any]) -> str:
+    """같은 채팅 요청인지 판단하는 키 (엔드포인트와 요청 인자 전체)"""
+    return f"{base_url}|{json.dumps(kwargs, sort_keys=True, ensure_ascii=False)}"
+
+
+def parse_criteria_line(line: str):
+    """'매우잘함: ...' 형식의 한 줄을 (수준, 내용)으로 분리합니다. 해당 없으면 None"""
+    line = line.strip()
+    for level in CRITERIA_LEVELS:
+        if line.startswith(f"{level}:"):
+            return level, line.replace(f"{level}:", "").strip()
+    return None
+
+
 class TextImprover:
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, cache: CompletionCache = None, use_cache: bool = True):
         """
         Upstage solar-pro2 모델을 사용하는 문장 개선기
+        cache: 생성 결과 캐시 (지정하지 않으면 프로세스 공용 캐시 사용)
         """
         self.api_key = api_key or os.getenv("UPSTAGE_API_KEY")
         if not self.api_key:
             raise ValueError("UPSTAGE_API_KEY가 설정되지 않았습니다.")
 
-        self.client = OpenAI(
-            api_key=self.api_key,
-            base_url="https://api.upstage.ai/v1"
-        )
+        # 프로세스 공용 클라이언트를 재사용 (연결 풀 공유)
+        self.client = get_openai_client(self.api_key)
+        self.cache = (cache or get_default_text_cache()) if use_cache else None
 
-    def generate_text_options(self, original_text: str, context: Dict[str, str] = None, num_options: int = 3) -> Dict[str, Any]:
-        """
-        원문을 받아서 여러 개의 개선된 문장 옵션들을 반환
-        """
-        try:
-            # 컨텍스트 정보가 있으면 더 구체적인 프롬프트 생성
-            if context:
-                context_str = ""
-                if context.get('grade') and context.get('semester'):
-                    context_str += f"- 대상: {context['grade']}학년 {context['semester']}학기\n"
-                if context.get('subject'):
-                    context_str += f"- 과목: {context['subject']}\n"
-                if context.get('unit'):
-                    context_str += f"- 단원: {context['unit']}\n"
-                if context.get('domain'):
-                    context_str += f"- 영역: {context['domain']}\n"
-                if context.get('criteria'):
-                    context_str += f"- 성취기준: {context['criteria']}\n"
-
-                prompt = f"""다음은 초등학교 교육과정 평가요소 문장입니다.
+    def _text_options_prompt(self, original_text: str, context: Dict[str, str], num_options: int) -> str:
+        context_str = build_context_str(context)
+        return f"""다음은 초등학교 교육과정 평가요소 문장입니다.
 
 아래 문장을 더 명확하고 간결하게 다듬어서 {num_options}가지 서로 다른 버전으로 제시해 주세요.
 
@@ -57,64 +146,45 @@ class TextImprover:
 {original_text}
 """
 
-            response = self.client.chat.completions.create(
-                model="solar-pro2",
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.8,  # 다양성을 위해 조금 높임
-                max_tokens=1024,
-                stream=False,
-                reasoning_effort="high"
-            )
-
-            improved_text = response.choices[0].message.content.strip()
-            
-            # 줄바꿈으로 분리하여 옵션들 추출
-            options = [line.strip() for line in improved_text.split('\n') if line.strip()]
-            
-            # 정확히 num_options 개수만큼 반환 (부족하면 원문 기반으로 추가 생성)
-            if len(options) < num_options:
-                # 부족한 경우 간단한 변형 추가
-                while len(options) < num_options:
-                    options.append(original_text)
-            elif len(options) > num_options:
-                # 너무 많은 경우 처음 num_options개만 선택
-                options = options[:num_options]
+    def _evaluation_criteria_prompt(self, evaluation_element: str, original_criteria: Dict[str, str], context: Dict[str, str]) -> str:
+        context_str = build_context_str(context)
+        context = context or {}
 
-            return {
-                "success": True,
-                "original": original_text,
-                "options": options
-            }
+        # 기존 평가기준 분석을 위한 정보
+        original_str = ""
+        for level in CRITERIA_LEVELS:
+            if original_criteria.get(level):
+                original_str += f"- {level}: {original_criteria[level]}\n"
 
-        except Exception as e:
-            return {
-                "success": False,
-                "error": str(e)
-            }
+        return f"""다음은 초등학교 교육과정 평가기준을 생성하는 작업입니다.
 
-    def improve_text(self, original_text: str, context: Dict[str, str] = None) -> Dict[str, Any]:
-        """
-        원문을 받아서 더 명확하고 자연스럽게 개선된 문장 반환
-        context: 학년, 학기, 과목, 단원명, 성취기준, 영역 정보
-        """
-        try:
-            # 컨텍스트 정보가 있으면 더 구체적인 프롬프트 생성
-            if context:
-                context_str = ""
-                if context.get('grade') and context.get('semester'):
-                    context_str += f"- 대상: {context['grade']}학년 {context['semester']}학기\n"
-                if context.get('subject'):
-                    context_str += f"- 과목: {context['subject']}\n"
-                if context.get('unit'):
-                    context_str += f"- 단원: {context['unit']}\n"
-                if context.get('domain'):
-                    context_str += f"- 영역: {context['domain']}\n"
-                if context.get('criteria'):
-                    context_str += f"- 성취기준: {context['criteria']}\n"
-
-                prompt = f"""다음은 초등학교 교육과정 평가요소 문장입니다.
+교육과정 정보:
+{context_str}
+
+평가요소: {evaluation_element}
+
+기존 평가기준 (참고용 - 정도와 스타일 참조):
+{original_str}
+
+위 정보를 바탕으로 새로운 평가요소에 맞는 4단계 평가기준을 생성해 주세요.
+
+요구사항:
+1. 기존 평가기준의 난이도 정도와 문체를 유지해 주세요
+2. 새로운 평가요소의 내용에 맞게 구체적으로 작성해 주세요
+3. 각 단계별로 명확한 차이가 있도록 해주세요
+4. {context.get('grade', '')}학년 {context.get('semester', '')}학기 수준에 맞는 평가 내용으로 작성해 주세요
+5. 각 기준은 한 문장으로 작성해 주세요
+
+출력 형식 (정확히 이 형식으로):
+매우잘함: [평가기준 내용]
+잘함: [평가기준 내용]  
+보통: [평가기준 내용]
+노력요함: [평가기준 내용]"""
+
+    def _improve_text_prompt(self, original_text: str, context: Dict[str, str]) -> str:
+        context_str = build_context_str(context)
+
+        return f"""다음은 초등학교 교육과정 평가요소 문장입니다.
 
 아래 문장을 더 명확하고 간결하게 다듬어 주세요.
 
@@ -130,23 +200,480 @@ class TextImprover:
 {original_text}
 """
 
-            response = self.client.chat.completions.create(
-                model="solar-pro2",
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=1024,
-                stream=False,
-                reasoning_effort="high"
-            )
+    def _single_criteria_prompt(self, level: str, evaluation_element: str, original_text: str, context: Dict[str, str]) -> str:
+        # 컨텍스트 정보 구성
+        context_str = build_context_str(context, include_criteria=False)
+
+        return f"""다음은 초등학교 교육과정 평가기준을 생성하는 작업입니다.
+
+교육과정 정보:
+{context_str}
+
+평가요소: {evaluation_element}
+평가 수준: {level}
+기존 {level} 기준 (참고용): {original_text}
+
+위 정보를 바탕으로 새로운 평가요소에 맞는 '{level}' 수준의 평가기준을 생성해 주세요.
+
+요구사항:
+1. 기존 평가기준의 난이도 정도와 문체를 유지해 주세요
+2. 새로운 평가요소의 내용에 맞게 구체적으로 작성해 주세요
+3. '{level}' 수준에 적합한 내용으로 작성해 주세요
+4. 초등학생 수준에 맞는 평가 내용으로 작성해 주세요
+5. 한 문장으로 작성해 주세요
+6. 평가기준 내용만 출력하고 다른 설명은 포함하지 마세요
+
+{level} 평가기준:"""
+
+    def _structured_prompt(self, original_text: str, original_criteria: Dict[str, str], context: Dict[str, str], num_options: int) -> str:
+        context_str = build_context_str(context)
+        context = context or {}
+
+        original_str = ""
+        for level in CRITERIA_LEVELS:
+            if original_criteria.get(level):
+                original_str += f"- {level}: {original_criteria[level]}\n"
+
+        return f"""다음은 초등학교 교육과정 평가요소 문장과 평가기준입니다.
+
+아래 평가요소 문장을 더 명확하고 간결하게 다듬어서 {num_options}가지 서로 다른 버전으로 제시하고, 각 버전에 맞는 4단계 평가기준(매우잘함, 잘함, 보통, 노력요함)을 함께 작성해 주세요.
+
+평가요소 문장 기준:
+1. 말투는 그대로 유지해 주세요. (예: '~을 실천하기', '~을 기르기', '~을 이해하기' 등의 형태로 끝나야 합니다.)
+2. 각 옵션은 한 문장으로만 작성해 주세요.
+3. 각 옵션은 서로 다른 관점이나 표현으로 작성해 주세요.
+
+평가기준 기준:
+1. 기존 평가기준의 난이도 정도와 문체를 유지해 주세요
+2. 각 옵션의 내용에 맞게 구체적으로 작성해 주세요
+3. 각 단계별로 명확한 차이가 있도록 해주세요
+4. {context.get('grade', '')}학년 {context.get('semester', '')}학기 수준에 맞는 평가 내용으로 작성해 주세요
+5. 각 기준은 한 문장으로 작성해 주세요
+
+교육과정 정보:
+{context_str}
+
+원문 문장:
+{original_text}
+
+기존 평가기준 (참고용 - 정도와 스타일 참조):
+{original_str}
+
+JSON 형식으로만 응답해 주세요: {{"options": [{{"text": "문장", "criteria": {{"매우잘함": "...", "잘함": "...", "보통": "...", "노력요함": "..."}}}}]}}"""
+
+    @staticmethod
+    def _repair_prompt(prompt: str, options: List[Dict[str, Any]], missing_levels: Dict[int, List[str]], missing_options: int) -> str:
+        missing_str = ""
+        for index, levels in missing_levels.items():
+            missing_str += f"- option_{index + 1} (\"{options[index]['text']}\")의 평가기준: {', '.join(levels)}\n"
+        if missing_options:
+            missing_str += f"- new_options: 기존과 겹치지 않는 새 옵션 {missing_options}개와 각 옵션의 4단계 평가기준\n"
+
+        return f"""{prompt}
+
+이미 받은 결과:
+{json.dumps({"options": options}, ensure_ascii=False)}
+
+위 결과에서 빠진 항목만 작성해 주세요. 이미 있는 항목은 다시 쓰지 마세요.
+{missing_str}"""
+
+    @staticmethod
+    def _validate_structured(data: Dict[str, Any], num_options: int) -> Tuple[List[Dict[str, Any]], Dict[int, List[str]], int]:
+        """
+        구조화 응답을 검사해 (올바른 옵션 목록, 옵션별 빠진 평가기준 수준, 부족한 옵션 수)를 반환합니다.
+        문장이 비어 있거나 앞 옵션과 같은 옵션은 버리고, 비어 있는 평가기준 수준은 빠진 것으로 봅니다.
+        """
+        options = []
+        seen = set()
+        for raw in data.get("options") or []:
+            if not isinstance(raw, dict) or not isinstance(raw.get("text"), str) or not raw["text"].strip() or raw["text"].strip() in seen:
+                continue
+            seen.add(raw["text"].strip())
+            raw_criteria = raw.get("criteria") if isinstance(raw.get("criteria"), dict) else {}
+            criteria = {level: raw_criteria[level].strip() for level in CRITERIA_LEVELS
+                        if isinstance(raw_criteria.get(level), str) and raw_criteria[level].strip()}
+            options.append({"text": raw["text"].strip(), "criteria": criteria})
+        options = options[:num_options]
+
+        missing_levels = {}
+        for index, option in enumerate(options):
+            levels = [level for level in CRITERIA_LEVELS if level not in option["criteria"]]
+            if levels:
+                missing_levels[index] = levels
+        return options, missing_levels, num_options - len(options)
+
+    @staticmethod
+    def _apply_repair(options: List[Dict[str, Any]], repair: Dict[str, Any], num_options: int) -> List[Dict[str, Any]]:
+        """보완 응답의 항목을 빈 자리에만 채워 넣습니다."""
+        options = [{"text": option["text"], "criteria": dict(option["criteria"])} for option in options]
+        for index, option in enumerate(options):
+            filled = repair.get(f"option_{index + 1}")
+            if not isinstance(filled, dict):
+                continue
+            for level in CRITERIA_LEVELS:
+                if level not in option["criteria"] and isinstance(filled.get(level), str) and filled[level].strip():
+                    option["criteria"][level] = filled[level].strip()
+        new_options, _, _ = TextImprover._validate_structured({"options": repair.get("new_options")}, num_options)
+        known = {option["text"] for option in options}
+        for option in new_options:
+            if len(options) < num_options and option["text"] not in known:
+                options.append(option)
+                known.add(option["text"])
+        return options
+
+    @staticmethod
+    def _add_usage(total: Dict[str, int], usage) -> None:
+        if usage is None:
+            return
+        for field in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            total[field] += getattr(usage, field, 0) or 0
+
+    @staticmethod
+    def _structured_result(original_text: str, options: List[Dict[str, Any]], missing_levels: Dict[int, List[str]], missing_options: int,
+                           usage: Dict[str, int], calls: int, cached: bool) -> Dict[str, Any]:
+        if not options:
+            return {
+                "success": False,
+                "error": "구조화 응답에서 문장 옵션을 찾을 수 없습니다.",
+                "usage": usage,
+                "calls": calls
+            }
+        result = {
+            "success": True,
+            "original": original_text,
+            "options": [option["text"] for option in options],
+            "criteria_for": options[0]["text"],
+            "criteria": options[0]["criteria"],
+            "criteria_by_option": {option["text"]: option["criteria"] for option in options},
+            "usage": usage,
+            "calls": calls,
+            "cached": cached
+        }
+        if missing_levels or missing_options:
+            # 보완 요청 후에도 빠진 항목 (화면에서 단일 평가기준 생성으로 채울 수 있음)
+            result["missing"] = {
+                "criteria": {options[index]["text"]: levels for index, levels in missing_levels.items()},
+                "options": missing_options
+            }
+        return result
+
+    def _cache_key(self, method: str, prompt: str, temperature: float, max_tokens: int = 1024,
+                   similar_text: str = None, scope: str = None, tier: str = "full") -> Optional[CompletionKey]:
+        if self.cache is None:
+            return None
+        # 단계별 호출 인자가 다르므로 draft와 full 결과는 따로 캐시됨
+        params = dict(tier_params(tier, max_tokens), temperature=temperature)
+        return self.cache.make_key(method, prompt, params, similar_text, scope)
+
+    # 유사 문장 단계는 입력 문장만 비교하고, 나머지 프롬프트(교육과정 정보, 수준 등)는 띄어쓰기만 무시하고 같아야 적중
+    def _text_options_key(self, prompt: str, original_text: str, context: Dict[str, str], num_options: int,
+                          tier: str = "full") -> Optional[CompletionKey]:
+        return self._cache_key("text_options", prompt, 0.8, similar_text=original_text,
+                               scope=self._text_options_prompt("", context, num_options), tier=tier)
+
+    def _improve_text_key(self, prompt: str, original_text: str, context: Dict[str, str], tier: str = "full") -> Optional[CompletionKey]:
+        return self._cache_key("improve_text", prompt, 0.7, similar_text=original_text,
+                               scope=self._improve_text_prompt("", context), tier=tier)
+
+    def _evaluation_criteria_key(self, prompt: str, evaluation_element: str, original_criteria: Dict[str, str], context: Dict[str, str],
+                                 tier: str = "full") -> Optional[CompletionKey]:
+        return self._cache_key("evaluation_criteria", prompt, 0.7, similar_text=evaluation_element,
+                               scope=self._evaluation_criteria_prompt("", original_criteria, context), tier=tier)
+
+    def _single_criteria_key(self, prompt: str, level: str, evaluation_element: str, original_text: str, context: Dict[str, str],
+                             tier: str = "full") -> Optional[CompletionKey]:
+        return self._cache_key("single_criteria", prompt, 0.7, max_tokens=512,
+                               similar_text=f"{evaluation_element}\n{original_text}",
+                               scope=self._single_criteria_prompt(level, "", "", context), tier=tier)
+
+    def _cached(self, cache_key: Optional[CompletionKey], regenerate: bool) -> Optional[str]:
+        """캐시된 응답을 반환합니다. regenerate이면 캐시를 건너뛰고 새로 생성한 결과로 덮어씁니다."""
+        if cache_key is None:
+            return None
+        if regenerate:
+            self.cache.bypass(cache_key)
+            return None
+        return self.cache.get(cache_key)
+
+    def _store(self, cache_key: Optional[CompletionKey], text: str) -> None:
+        if cache_key is not None and text:
+            self.cache.set(cache_key, text)
+
+    @staticmethod
+    def _parse_options(text: str, original_text: str, num_options: int) -> List[str]:
+        # 줄바꿈으로 분리하여 옵션들 추출
+        options = [line.strip() for line in text.split('\n') if line.strip()]
+        return TextImprover._fit_options(options, original_text, num_options)
+
+    @staticmethod
+    def _parse_criteria(text: str) -> Dict[str, str]:
+        criteria = {}
+        for line in text.split('\n'):
+            parsed = parse_criteria_line(line)
+            if parsed:
+                criteria[parsed[0]] = parsed[1]
+        return criteria
+
+    @staticmethod
+    def _fit_options(options: List[str], original_text: str, num_options: int) -> List[str]:
+        # 정확히 num_options 개수만큼 반환 (부족하면 원문 기반으로 추가 생성)
+        if len(options) < num_options:
+            # 부족한 경우 간단한 변형 추가
+            options = options + [original_text] * (num_options - len(options))
+        elif len(options) > num_options:
+            # 너무 많은 경우 처음 num_options개만 선택
+            options = options[:num_options]
+        return options
+
+    def _create(self, endpoint: str = "unknown", tier: str = "full", **kwargs):
+        """
+        채팅 API 호출을 속도 제한/재시도/회로 차단 아래에서 보냅니다.
+        스트리밍이 아닌 같은 요청이 동시에 들어오면 (다른 워커 프로세스 포함) 한 번만 보내고 응답을 함께 사용합니다.
+        endpoint, tier: 단계별 토큰 사용량 기록용
+        """
+        def create():
+            response = get_upstream("chat").call(lambda timeout: self.client.chat.completions.create(timeout=timeout, **kwargs),
+                                                 stream=bool(kwargs.get("stream")))
+            record_usage(getattr(response, "usage", None), endpoint, tier)
+            return response
+
+        flight = None if kwargs.get("stream") else get_single_flight("chat")
+        return flight.do(completion_flight_key(self.client.base_url, kwargs), create) if flight else create()
+
+    def _complete(self, prompt: str, temperature: float, max_tokens: int = 1024,
+                  cache_key: CompletionKey = None, regenerate: bool = False,
+                  endpoint: str = "unknown", tier: str = "full") -> str:
+        cached = self._cached(cache_key, regenerate)
+        if cached is not None:
+            return cached
+
+        started = time.perf_counter()
+        response = self._create(
+            endpoint, tier,
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            temperature=temperature,
+            stream=False,
+            **tier_params(tier, max_tokens)
+        )
+        TIER_SECONDS.observe(time.perf_counter() - started, endpoint, tier)
+        text = response.choices[0].message.content.strip()
+        self._store(cache_key, text)
+        return text
+
+    def _complete_json(self, prompt: str, schema: Dict[str, Any], temperature: float, max_tokens: int = 2048):
+        """JSON 스키마를 지정해 응답을 받고 (응답 문자열, 토큰 사용량)을 반환합니다."""
+        started = time.perf_counter()
+        response = self._create(
+            "structured", "full",
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            temperature=temperature,
+            stream=False,
+            response_format={
+                "type": "json_schema",
+                "json_schema": {"name": "evaluation_element", "strict": True, "schema": schema}
+            },
+            **tier_params("full", max_tokens)
+        )
+        TIER_SECONDS.observe(time.perf_counter() - started, "structured", "full")
+        return response.choices[0].message.content or "", response.usage
+
+    def _stream_lines(self, prompt: str, temperature: float, max_tokens: int = 1024,
+                      cache_key: CompletionKey = None, regenerate: bool = False,
+                      endpoint: str = "unknown", tier: str = "full") -> Iterator[str]:
+        """스트리밍 응답을 받아 완성된 줄 단위로 돌려줍니다. 캐시에 있으면 저장된 응답을 줄 단위로 돌려줍니다."""
+        cached = self._cached(cache_key, regenerate)
+        if cached is not None:
+            for line in cached.split("\n"):
+                if line.strip():
+                    yield line.strip()
+            return
+
+        started = time.perf_counter()
+        stream = self._create(
+            endpoint, tier,
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            temperature=temperature,
+            stream=True,
+            **tier_params(tier, max_tokens)
+        )
 
-            improved = response.choices[0].message.content.strip()
+        buffer = ""
+        lines = []
+        # 중간에 연결이 끊겨도 스트림을 닫아 요청 자리를 바로 돌려줌
+        try:
+            for chunk in stream:
+                # 사용량을 함께 보내는 경우 마지막 조각에 usage가 있음
+                record_usage(getattr(chunk, "usage", None), endpoint, tier)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content or ""
+                buffer += delta
+                while "\n" in buffer:
+                    line, buffer = buffer.split("\n", 1)
+                    if line.strip():
+                        lines.append(line.strip())
+                        yield line.strip()
+        finally:
+            stream.close()
+        if buffer.strip():
+            lines.append(buffer.strip())
+            yield buffer.strip()
+        TIER_SECONDS.observe(time.perf_counter() - started, endpoint, tier)
+        # 끝까지 받은 응답만 저장
+        self._store(cache_key, "\n".join(lines))
+
+    def _tiered(self, endpoint: str, text: str, tier: Optional[str], regenerate: bool,
+                make_key: Callable[[str], Optional[CompletionKey]],
+                stream: bool = False) -> Tuple[str, bool, Optional[CompletionKey], Optional[CompletionKey]]:
+        """
+        (먼저 응답할 단계, full 결과를 이어서 낼지, 그 단계의 캐시 키, full 캐시 키)를 반환합니다.
+        정책상 draft는 스트리밍 응답(stream=True)에서만 고르며, full 결과가 이미 캐시에 있으면 (미리 생성/일괄 생성 등) 바로 full을 사용합니다.
+        (이 확인은 캐시 적중률에 세지 않고, 실제 조회는 _cached에서 한 번만 셈)
+        """
+        full_key = make_key("full")
+        selected, refine = choose_tier(endpoint, text, tier, stream)
+        if selected == "draft" and tier is None and not regenerate and full_key is not None and self.cache.get(full_key, count=False) is not None:
+            selected, refine = "full", False
+        return selected, refine, full_key if selected == "full" else make_key(selected), full_key
+
+    @staticmethod
+    def _refined_event(refine: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """full 단계로 다시 생성한 결과 이벤트 (실패해도 이미 보낸 초안은 그대로 사용할 수 있도록 오류만 알림)"""
+        try:
+            return {"type": "refined", "success": True, "tier": "full", **refine()}
+        except Exception as e:
+            return {"type": "refined", "success": False, "tier": "full", "error": str(e)}
 
+    def _request(self, endpoint: str, text: str, prompt: str, temperature: float, tier: Optional[str], regenerate: bool,
+                 make_key: Callable[[str], Optional[CompletionKey]], max_tokens: int = 1024,
+                 stream: bool = False) -> Tuple[str, bool, Dict[str, Any], Dict[str, Any]]:
+        """
+        (먼저 응답할 단계, full 결과를 이어서 낼지, _complete/_stream_lines 인자, full 단계로 다시 생성할 때의 인자)를 반환합니다.
+        동기/비동기 메서드가 같은 프롬프트와 캐시 키로 요청하도록, 호출 방식만 다르고 인자는 여기서 만듭니다.
+        """
+        selected, refine, cache_key, full_key = self._tiered(endpoint, text, tier, regenerate, make_key, stream)
+        request = {"prompt": prompt, "temperature": temperature, "max_tokens": max_tokens, "regenerate": regenerate, "endpoint": endpoint}
+        return selected, refine, {**request, "cache_key": cache_key, "tier": selected}, {**request, "cache_key": full_key, "tier": "full"}
+
+    def _text_options_request(self, original_text: str, context: Dict[str, str], num_options: int, tier: Optional[str], regenerate: bool,
+                              stream: bool = False) -> Tuple[str, bool, Dict[str, Any], Dict[str, Any]]:
+        prompt = self._text_options_prompt(original_text, context, num_options)
+        # 다양성을 위해 temperature를 조금 높임
+        return self._request("text_options", original_text, prompt, 0.8, tier, regenerate,
+                             lambda t: self._text_options_key(prompt, original_text, context, num_options, t), stream=stream)
+
+    def _improve_text_request(self, original_text: str, context: Dict[str, str], tier: Optional[str],
+                              regenerate: bool) -> Tuple[str, bool, Dict[str, Any], Dict[str, Any]]:
+        prompt = self._improve_text_prompt(original_text, context)
+        return self._request("improve_text", original_text, prompt, 0.7, tier, regenerate,
+                             lambda t: self._improve_text_key(prompt, original_text, context, t))
+
+    def _evaluation_criteria_request(self, evaluation_element: str, original_criteria: Dict[str, str], context: Dict[str, str],
+                                     tier: Optional[str], regenerate: bool,
+                                     stream: bool = False) -> Tuple[str, bool, Dict[str, Any], Dict[str, Any]]:
+        prompt = self._evaluation_criteria_prompt(evaluation_element, original_criteria, context)
+        return self._request("evaluation_criteria", evaluation_element, prompt, 0.7, tier, regenerate,
+                             lambda t: self._evaluation_criteria_key(prompt, evaluation_element, original_criteria, context, t),
+                             stream=stream)
+
+    def _single_criteria_request(self, level: str, evaluation_element: str, original_text: str, context: Dict[str, str],
+                                 tier: Optional[str], regenerate: bool) -> Tuple[str, bool, Dict[str, Any], Dict[str, Any]]:
+        prompt = self._single_criteria_prompt(level, evaluation_element, original_text, context)
+        return self._request("single_criteria", f"{evaluation_element}\n{original_text}", prompt, 0.7, tier, regenerate,
+                             lambda t: self._single_criteria_key(prompt, level, evaluation_element, original_text, context, t),
+                             max_tokens=512)
+
+    @staticmethod
+    def _option_event(options: List[str], line: str, num_options: int) -> Optional[Dict[str, Any]]:
+        """스트리밍으로 받은 줄을 옵션에 더하고 보낼 이벤트를 반환합니다. (num_options개를 넘는 줄은 None)"""
+        if len(options) >= num_options:
+            return None
+        options.append(line)
+        return {"type": "option", "index": len(options) - 1, "text": line}
+
+    def _options_done_event(self, original_text: str, options: List[str], num_options: int, selected: str, refine: bool) -> Dict[str, Any]:
+        return {
+            "type": "done",
+            "success": True,
+            "original": original_text,
+            "options": self._fit_options(options, original_text, num_options),
+            "tier": selected,
+            "refining": refine
+        }
+
+    @staticmethod
+    def _criteria_event(criteria: Dict[str, str], line: str) -> Optional[Dict[str, Any]]:
+        """스트리밍으로 받은 줄이 아직 받지 않은 수준의 기준이면 기준에 더하고 보낼 이벤트를 반환합니다."""
+        parsed = parse_criteria_line(line)
+        if not parsed or parsed[0] in criteria:
+            return None
+        criteria[parsed[0]] = parsed[1]
+        return {"type": "criteria", "level": parsed[0], "text": parsed[1]}
+
+    def _structured_request(self, original_text: str, original_criteria: Dict[str, str], context: Dict[str, str],
+                            num_options: int) -> Tuple[str, Optional[CompletionKey]]:
+        prompt = self._structured_prompt(original_text, original_criteria, context, num_options)
+        cache_key = self._cache_key("structured", prompt, 0.7, max_tokens=2048, similar_text=original_text,
+                                    scope=self._structured_prompt("", original_criteria, context, num_options))
+        return prompt, cache_key
+
+    def _structured_cached(self, original_text: str, cache_key: Optional[CompletionKey], regenerate: bool,
+                           num_options: int) -> Optional[Dict[str, Any]]:
+        cached = self._cached(cache_key, regenerate)
+        if cached is None:
+            return None
+        options, missing_levels, missing_options = self._validate_structured(json.loads(cached), num_options)
+        usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        return self._structured_result(original_text, options, missing_levels, missing_options, usage, 0, True)
+
+    def _structured_calls(self, original_text: str, prompt: str, cache_key: Optional[CompletionKey],
+                          num_options: int) -> Generator[Tuple[str, Dict[str, Any]], Tuple[str, Any], Dict[str, Any]]:
+        """
+        구조화 생성의 요청/검사/보완 순서
+        보낼 (프롬프트, 스키마)를 yield하고 _complete_json의 (응답 문자열, 토큰 사용량)을 send로 받으며, 끝나면 결과를 반환합니다.
+        (동기/비동기 메서드는 요청을 보내는 방식만 다르게 이 순서를 따름)
+        """
+        usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        text, response_usage = yield prompt, structured_schema(num_options)
+        self._add_usage(usage, response_usage)
+        calls = 1
+        options, missing_levels, missing_options = self._validate_structured(load_json_object(text), num_options)
+
+        for _ in range(STRUCTURED_MAX_REPAIRS):
+            if not missing_levels and not missing_options:
+                break
+            text, response_usage = yield (self._repair_prompt(prompt, options, missing_levels, missing_options),
+                                          repair_schema(missing_levels, missing_options))
+            self._add_usage(usage, response_usage)
+            calls += 1
+            options = self._apply_repair(options, load_json_object(text), num_options)
+            options, missing_levels, missing_options = self._validate_structured({"options": options}, num_options)
+
+        if not missing_levels and not missing_options:
+            self._store(cache_key, json.dumps({"options": options}, ensure_ascii=False))
+        return self._structured_result(original_text, options, missing_levels, missing_options, usage, calls, False)
+
+    @timed_method("generate_text_options")
+    def generate_text_options(self, original_text: str, context: Dict[str, str] = None, num_options: int = 3, regenerate: bool = False,
+                              tier: str = None) -> Dict[str, Any]:
+        """
+        원문을 받아서 여러 개의 개선된 문장 옵션들을 반환
+        regenerate: True이면 캐시를 건너뛰고 새로 생성
+        tier: "draft" 또는 "full"이면 그 단계로 생성 (지정하지 않으면 full)
+        """
+        try:
+            selected, _, request, _ = self._text_options_request(original_text, context, num_options, tier, regenerate)
             return {
                 "success": True,
                 "original": original_text,
-                "improved": improved
+                "options": self._parse_options(self._complete(**request), original_text, num_options),
+                "tier": selected
             }
 
         except Exception as e:
@@ -155,83 +682,47 @@ class TextImprover:
                 "error": str(e)
             }
 
-    def generate_evaluation_criteria(self, evaluation_element: str, original_criteria: Dict[str, str], context: Dict[str, str] = None) -> Dict[str, Any]:
+    @timed_method("stream_text_options")
+    def stream_text_options(self, original_text: str, context: Dict[str, str] = None, num_options: int = 3, regenerate: bool = False,
+                            tier: str = None) -> Iterator[Dict[str, Any]]:
         """
-        평가요소를 기반으로 4단계 평가기준(매우잘함, 잘함, 보통, 노력요함)을 생성
+        generate_text_options의 스트리밍 버전
+        옵션이 한 줄 완성될 때마다 {"type": "option"} 이벤트를, 마지막에 {"type": "done"} 이벤트를 보냅니다.
+        draft로 먼저 응답한 경우 done 뒤에 full로 다듬은 옵션을 {"type": "refined"} 이벤트로 보냅니다.
         """
         try:
-            # 컨텍스트 정보 구성
-            context_str = ""
-            if context:
-                if context.get('grade') and context.get('semester'):
-                    context_str += f"- 대상: {context['grade']}학년 {context['semester']}학기\n"
-                if context.get('subject'):
-                    context_str += f"- 과목: {context['subject']}\n"
-                if context.get('unit'):
-                    context_str += f"- 단원: {context['unit']}\n"
-                if context.get('domain'):
-                    context_str += f"- 영역: {context['domain']}\n"
-                if context.get('criteria'):
-                    context_str += f"- 성취기준: {context['criteria']}\n"
-
-            # 기존 평가기준 분석을 위한 정보
-            original_str = ""
-            levels = ['매우잘함', '잘함', '보통', '노력요함']
-            for level in levels:
-                if original_criteria.get(level):
-                    original_str += f"- {level}: {original_criteria[level]}\n"
-
-            prompt = f"""다음은 초등학교 교육과정 평가기준을 생성하는 작업입니다.
-
-교육과정 정보:
-{context_str}
+            selected, refine, request, full_request = self._text_options_request(original_text, context, num_options, tier, regenerate,
+                                                                                 stream=True)
+            options = []
+            for line in self._stream_lines(**request):
+                event = self._option_event(options, line, num_options)
+                if event:
+                    yield event
 
-평가요소: {evaluation_element}
-
-기존 평가기준 (참고용 - 정도와 스타일 참조):
-{original_str}
-
-위 정보를 바탕으로 새로운 평가요소에 맞는 4단계 평가기준을 생성해 주세요.
-
-요구사항:
-1. 기존 평가기준의 난이도 정도와 문체를 유지해 주세요
-2. 새로운 평가요소의 내용에 맞게 구체적으로 작성해 주세요
-3. 각 단계별로 명확한 차이가 있도록 해주세요
-4. {context['grade']}학년 {context['semester']}학기 수준에 맞는 평가 내용으로 작성해 주세요
-5. 각 기준은 한 문장으로 작성해 주세요
+            yield self._options_done_event(original_text, options, num_options, selected, refine)
 
-출력 형식 (정확히 이 형식으로):
-매우잘함: [평가기준 내용]
-잘함: [평가기준 내용]  
-보통: [평가기준 내용]
-노력요함: [평가기준 내용]"""
+            if refine:
+                yield self._refined_event(lambda: {"options": self._parse_options(self._complete(**full_request), original_text, num_options)})
 
-            response = self.client.chat.completions.create(
-                model="solar-pro2",
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=1024,
-                stream=False,
-                reasoning_effort="high"
-            )
-
-            result_text = response.choices[0].message.content.strip()
-            
-            # 결과 파싱
-            criteria = {}
-            lines = result_text.split('\n')
-            for line in lines:
-                line = line.strip()
-                for level in levels:
-                    if line.startswith(f"{level}:"):
-                        criteria[level] = line.replace(f"{level}:", "").strip()
-                        break
+        except Exception as e:
+            yield {"type": "error", "success": False, "error": str(e)}
 
+    @timed_method("improve_text")
+    def improve_text(self, original_text: str, context: Dict[str, str] = None, regenerate: bool = False,
+                     tier: str = None) -> Dict[str, Any]:
+        """
+        원문을 받아서 더 명확하고 자연스럽게 개선된 문장 반환
+        context: 학년, 학기, 과목, 단원명, 성취기준, 영역 정보
+        regenerate: True이면 캐시를 건너뛰고 새로 생성
+        tier: 생성 단계 ("draft", "full", 지정하지 않으면 full)
+        """
+        try:
+            selected, _, request, _ = self._improve_text_request(original_text, context, tier, regenerate)
             return {
                 "success": True,
-                "criteria": criteria
+                "original": original_text,
+                "improved": self._complete(**request),
+                "tier": selected
             }
 
         except Exception as e:
@@ -240,64 +731,98 @@ class TextImprover:
                 "error": str(e)
             }
 
-    def generate_single_criteria(self, level: str, evaluation_element: str, original_text: str, context: Dict[str, str] = None) -> Dict[str, Any]:
+    @timed_method("generate_evaluation_criteria")
+    def generate_evaluation_criteria(self, evaluation_element: str, original_criteria: Dict[str, str], context: Dict[str, str] = None,
+                                     regenerate: bool = False, tier: str = None) -> Dict[str, Any]:
         """
-        특정 평가 수준(매우잘함, 잘함 등)에 대한 단일 평가기준 생성
+        평가요소를 기반으로 4단계 평가기준(매우잘함, 잘함, 보통, 노력요함)을 생성
+        regenerate: True이면 캐시를 건너뛰고 새로 생성
+        tier: 생성 단계 ("draft", "full", 지정하지 않으면 full)
         """
         try:
-            # 컨텍스트 정보 구성
-            context_str = ""
-            if context:
-                if context.get('grade') and context.get('semester'):
-                    context_str += f"- 대상: {context['grade']}학년 {context['semester']}학기\n"
-                if context.get('subject'):
-                    context_str += f"- 과목: {context['subject']}\n"
-                if context.get('unit'):
-                    context_str += f"- 단원: {context['unit']}\n"
-                if context.get('domain'):
-                    context_str += f"- 영역: {context['domain']}\n"
-
-            prompt = f"""다음은 초등학교 교육과정 평가기준을 생성하는 작업입니다.
-
-교육과정 정보:
-{context_str}
-
-평가요소: {evaluation_element}
-평가 수준: {level}
-기존 {level} 기준 (참고용): {original_text}
+            selected, _, request, _ = self._evaluation_criteria_request(evaluation_element, original_criteria, context, tier, regenerate)
+            return {
+                "success": True,
+                "criteria": self._parse_criteria(self._complete(**request)),
+                "tier": selected
+            }
 
-위 정보를 바탕으로 새로운 평가요소에 맞는 '{level}' 수준의 평가기준을 생성해 주세요.
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
 
-요구사항:
-1. 기존 평가기준의 난이도 정도와 문체를 유지해 주세요
-2. 새로운 평가요소의 내용에 맞게 구체적으로 작성해 주세요
-3. '{level}' 수준에 적합한 내용으로 작성해 주세요
-4. 초등학생 수준에 맞는 평가 내용으로 작성해 주세요
-5. 한 문장으로 작성해 주세요
-6. 평가기준 내용만 출력하고 다른 설명은 포함하지 마세요
+    @timed_method("stream_evaluation_criteria")
+    def stream_evaluation_criteria(self, evaluation_element: str, original_criteria: Dict[str, str], context: Dict[str, str] = None,
+                                   regenerate: bool = False, tier: str = None) -> Iterator[Dict[str, Any]]:
+        """
+        generate_evaluation_criteria의 스트리밍 버전
+        각 수준의 줄이 파싱되는 즉시 {"type": "criteria"} 이벤트를, 마지막에 {"type": "done"} 이벤트를 보냅니다.
+        draft로 먼저 응답한 경우 done 뒤에 full로 다듬은 기준을 {"type": "refined"} 이벤트로 보냅니다.
+        """
+        try:
+            selected, refine, request, full_request = self._evaluation_criteria_request(evaluation_element, original_criteria, context,
+                                                                                        tier, regenerate, stream=True)
+            criteria = {}
+            for line in self._stream_lines(**request):
+                event = self._criteria_event(criteria, line)
+                if event:
+                    yield event
 
-{level} 평가기준:"""
+            yield {"type": "done", "success": True, "criteria": criteria, "tier": selected, "refining": refine}
 
-            response = self.client.chat.completions.create(
-                model="solar-pro2",
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=512,
-                stream=False,
-                reasoning_effort="high"
-            )
+            if refine:
+                yield self._refined_event(lambda: {"criteria": self._parse_criteria(self._complete(**full_request))})
 
-            criteria = response.choices[0].message.content.strip()
+        except Exception as e:
+            yield {"type": "error", "success": False, "error": str(e)}
 
+    @timed_method("generate_single_criteria")
+    def generate_single_criteria(self, level: str, evaluation_element: str, original_text: str, context: Dict[str, str] = None,
+                                 regenerate: bool = False, tier: str = None) -> Dict[str, Any]:
+        """
+        특정 평가 수준(매우잘함, 잘함 등)에 대한 단일 평가기준 생성
+        regenerate: True이면 캐시를 건너뛰고 새로 생성
+        tier: 생성 단계 ("draft", "full", 지정하지 않으면 full)
+        """
+        try:
+            selected, _, request, _ = self._single_criteria_request(level, evaluation_element, original_text, context, tier, regenerate)
             return {
                 "success": True,
-                "criteria": criteria
+                "criteria": self._complete(**request),
+                "tier": selected
             }
 
         except Exception as e:
             return {
                 "success": False,
                 "error": str(e)
-            }
\ No newline at end of file
+            }
+
+    @timed_method("generate_structured")
+    def generate_structured(self, original_text: str, original_criteria: Dict[str, str] = None, context: Dict[str, str] = None,
+                            num_options: int = 3, regenerate: bool = False) -> Dict[str, Any]:
+        """
+        문장 옵션과 옵션별 4단계 평가기준을 JSON 스키마로 한 번에 생성
+        응답을 검사해 빠진 항목만 다시 요청하고(STRUCTURED_MAX_REPAIRS회), 토큰 사용량을 함께 반환합니다.
+        """
+        try:
+            prompt, cache_key = self._structured_request(original_text, original_criteria or {}, context, num_options)
+            cached = self._structured_cached(original_text, cache_key, regenerate, num_options)
+            if cached is not None:
+                return cached
+
+            calls = self._structured_calls(original_text, prompt, cache_key, num_options)
+            request = next(calls)
+            while True:
+                try:
+                    request = calls.send(self._complete_json(*request, temperature=0.7))
+                except StopIteration as done:
+                    return done.value
+
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
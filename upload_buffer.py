@@ -0,0 +1,114 @@
+import hashlib
+import io
+import mimetypes
+import uuid
+from typing import Dict, Any, Iterator, AsyncIterator, Union, BinaryIO
+
+# 파일 객체에서 한 번에 읽는 크기
+READ_CHUNK_SIZE = 1024 * 1024
+
+# 전송 시 한 번에 내보내는 크기
+SEND_CHUNK_SIZE = 64 * 1024
+
+DocumentSource = Union[bytes, bytearray, memoryview, BinaryIO]
+
+
+class UploadBuffer:
+    def __init__(self, data: memoryview, digest: str):
+        """
+        업로드된 문서의 바이트(memoryview)와 SHA-256 해시
+        """
+        self.data = data
+        self.digest = digest
+        self.size = data.nbytes
+
+    @classmethod
+    def from_source(cls, source: DocumentSource) -> "UploadBuffer":
+        """
+        바이트나 파일 객체에서 버퍼를 만듭니다.
+        해시와 크기는 바이트를 한 번 훑으면서 함께 계산하고, 메모리에 있는 데이터는 복사하지 않습니다.
+        """
+        hasher = hashlib.sha256()
+
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            data = memoryview(source)
+        elif isinstance(source, io.BytesIO):
+            # BytesIO는 내부 버퍼를 그대로 참조
+            data = source.getbuffer()
+        else:
+            chunks = bytearray()
+            while True:
+                chunk = source.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                chunks += chunk
+            return cls(memoryview(chunks), hasher.hexdigest())
+
+        hasher.update(data)
+        return cls(data, hasher.hexdigest())
+
+
+class MultipartStream:
+    """
+    multipart/form-data 본문을 한 번에 만들지 않고 조각(memoryview)으로 내보내는 파일형 객체
+    requests에는 data=로, httpx.AsyncClient에는 content=aiter_chunks()로 넘길 수 있으며 Content-Length를 미리 알 수 있습니다.
+    """
+
+    def __init__(self, fields: Dict[str, Any], file_field: str, filename: str, payload: memoryview, content_type: str = None):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+
+        parts = []
+        for name, value in fields.items():
+            parts.append(
+                f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode("utf-8")
+            )
+        file_type = content_type or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        parts.append(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+            f'Content-Type: {file_type}\r\n\r\n'.encode("utf-8")
+        )
+        parts.append(payload)
+        parts.append(f'\r\n--{self.boundary}--\r\n'.encode("utf-8"))
+
+        self._parts = [memoryview(part) for part in parts]
+        self._length = sum(part.nbytes for part in self._parts)
+        self.reset()
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Content-Type": self.content_type, "Content-Length": str(self._length)}
+
+    def reset(self) -> None:
+        """처음부터 다시 읽을 수 있도록 위치를 되돌립니다. (재시도 시 사용)"""
+        self._part_index = 0
+        self._offset = 0
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self._length
+        out = []
+        while size > 0 and self._part_index < len(self._parts):
+            part = self._parts[self._part_index]
+            chunk = part[self._offset:self._offset + size]
+            out.append(chunk)
+            size -= chunk.nbytes
+            self._offset += chunk.nbytes
+            if self._offset >= part.nbytes:
+                self._part_index += 1
+                self._offset = 0
+        return b"".join(out)
+
+    def __iter__(self) -> Iterator[bytes]:
+        for part in self._parts:
+            for start in range(0, part.nbytes, SEND_CHUNK_SIZE):
+                yield bytes(part[start:start + SEND_CHUNK_SIZE])
+
+    async def aiter_chunks(self) -> AsyncIterator[bytes]:
+        """비동기 클라이언트(httpx.AsyncClient)용 조각 이터레이터"""
+        for chunk in self:
+            yield chunk